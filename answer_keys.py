@@ -0,0 +1,165 @@
+"""
+Versioned answer keys, reloaded without restarting the process.
+
+A key directory (ANSWER_KEY_DIR) holds one file per version: <name>.json as
+written by calculate_score.save_answer_key, or <name>.pdf, an official
+answer-key PDF read with parse_answer_key_text. A file named CURRENT holds
+the name of the version to score with; without it the last name in sort
+order is used. OFFICIAL_ANSWERS is always available as version "builtin",
+and is the only version without a directory.
+
+AnswerKeyRegistry.start() polls the directory from a daemon thread. When
+anything in it changes, every version is loaded, checked and compiled on
+that thread, and the registry's snapshot is replaced in a single
+assignment - a request always sees one complete, compiled set of keys. A
+file that fails to load is skipped and reported; a bad CURRENT keeps the
+previous snapshot.
+"""
+import os
+import re
+import threading
+import time
+
+from calculate_score import OFFICIAL_ANSWERS, QUESTION_PATTERNS, compile_answer_key, load_answer_key
+from pdf_extraction import extract_pages
+
+BUILTIN = "builtin"
+
+def parse_answer_key_text(pdf_text):
+    """Parse the text of an official CEED answer-key PDF into an answer key"""
+    answers = {}
+
+    # NAT section
+    nat_section = re.search(r'SECTION – I \(NAT\)(.*?)SECTION – II', pdf_text, re.DOTALL)
+    if nat_section:
+        lines = nat_section.group(1).strip().split('\n')
+        for line in lines:
+            matches = re.findall(r'(\d+)\s+([\d.]+(?:\s+to\s+[\d.]+)?)', line)
+            for q, ans in matches:
+                if 'to' in ans:
+                    parts = ans.split(' to ')
+                    answers[int(q)] = {"type": "NAT", "range": [float(parts[0]), float(parts[1])]}
+                else:
+                    answers[int(q)] = {"type": "NAT", "value": float(ans)}
+
+    # MSQ section
+    msq_section = re.search(r'SECTION – II \(MSQ\)(.*?)SECTION – III', pdf_text, re.DOTALL)
+    if msq_section:
+        text = msq_section.group(1)
+        matches = re.findall(r'(\d+)\s+([A-D,\s]+?)(?=\d+\s+[A-D]|\Z)', text)
+        for q, ans in matches:
+            keys = [x.strip() for x in ans.replace(',', ' ').split() if x.strip() in ['A','B','C','D']]
+            answers[int(q)] = {"type": "MSQ", "keys": keys}
+
+    # MCQ section
+    mcq_section = re.search(r'SECTION – III \(MCQ\)(.*?)$', pdf_text, re.DOTALL)
+    if mcq_section:
+        text = mcq_section.group(1)
+        matches = re.findall(r'(\d+)\s+([A-D])\s', text)
+        for q, ans in matches:
+            answers[int(q)] = {"type": "MCQ", "key": ans}
+
+    return answers
+
+def load_key_file(path):
+    """Load an answer key from a .json or an official answer-key .pdf"""
+    if path.lower().endswith(".pdf"):
+        # The section regexes follow pypdf's layout of the answer-key table
+        return parse_answer_key_text("\n".join(extract_pages(path, backend="pypdf")))
+    return load_answer_key(path)
+
+def check_answer_key(answers):
+    """Raise ValueError unless the key covers exactly the paper's questions"""
+    missing = sorted(set(QUESTION_PATTERNS) - set(answers))
+    extra = sorted(set(answers) - set(QUESTION_PATTERNS))
+    if missing or extra:
+        raise ValueError(f"missing questions {missing}, unknown questions {extra}")
+    for q_num, official in answers.items():
+        if official.get("type") not in ["NAT", "MSQ", "MCQ"]:
+            raise ValueError(f"Q{q_num} has unknown type {official.get('type')!r}")
+
+def _compile_version(name, answers):
+    check_answer_key(answers)
+    return dict(compile_answer_key(answers), name=name)
+
+class AnswerKeyRegistry:
+    def __init__(self, directory=None, poll_seconds=5.0):
+        self.directory = directory
+        self.poll_seconds = poll_seconds
+        self._signature = None
+        self._snapshot = {"active": BUILTIN, "versions": {BUILTIN: _compile_version(BUILTIN, OFFICIAL_ANSWERS)}}
+        self._thread = None
+        if directory:
+            self.reload()
+
+    def active(self):
+        """The compiled key to score with: {"name", "version", "answers", "questions"}"""
+        snapshot = self._snapshot
+        return snapshot["versions"][snapshot["active"]]
+
+    def get(self, name):
+        return self._snapshot["versions"].get(name)
+
+    def versions(self):
+        snapshot = self._snapshot
+        return [
+            {"name": name, "version": key["version"], "active": name == snapshot["active"]}
+            for name, key in sorted(snapshot["versions"].items())
+        ]
+
+    def reload(self):
+        """Load the directory again if anything in it changed. Returns True on a swap."""
+        signature = self._directory_signature()
+        if signature == self._signature:
+            return False
+
+        versions = {}
+        for filename in sorted(os.listdir(self.directory)):
+            name, ext = os.path.splitext(filename)
+            if ext.lower() not in [".json", ".pdf"]:
+                continue
+            try:
+                versions[name] = _compile_version(name, load_key_file(os.path.join(self.directory, filename)))
+            except Exception as e:
+                print(f"Answer key {filename} skipped: {e}")
+
+        current_path = os.path.join(self.directory, "CURRENT")
+        if os.path.exists(current_path):
+            with open(current_path, "r", encoding="utf-8") as f:
+                active = f.read().strip()
+        else:
+            active = max(versions, default=None)
+        # The key built into calculate_score.py stays available for comparison
+        versions.setdefault(BUILTIN, self._snapshot["versions"][BUILTIN])
+        if active not in versions:
+            # Keep scoring with what we have rather than with nothing
+            print(f"Answer key version {active!r} not available; keeping {self._snapshot['active']}")
+            self._signature = signature
+            return False
+
+        self._snapshot = {"active": active, "versions": versions}
+        self._signature = signature
+        print(f"Answer keys loaded: {', '.join(versions)}; scoring with {active} ({versions[active]['version']})")
+        return True
+
+    def start(self):
+        """Poll the key directory in the background"""
+        if not self.directory or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._poll, name="answer-key-reload", daemon=True)
+        self._thread.start()
+
+    def _poll(self):
+        while True:
+            time.sleep(self.poll_seconds)
+            try:
+                self.reload()
+            except Exception as e:
+                print(f"Answer key reload failed: {e}")
+
+    def _directory_signature(self):
+        entries = []
+        for filename in sorted(os.listdir(self.directory)):
+            stat = os.stat(os.path.join(self.directory, filename))
+            entries.append((filename, stat.st_mtime_ns, stat.st_size))
+        return tuple(entries)
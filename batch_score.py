@@ -0,0 +1,414 @@
+#!/usr/bin/env python
+"""
+Score a directory (or glob) of response-sheet PDFs over a pool of worker
+processes.
+
+Each worker extracts a sheet (stopping once every question is found),
+parses, maps and scores it, and sends back one flat row. Only a bounded
+number of sheets are in flight at a time, so memory stays flat however many
+sheets there are.
+
+Runs are resumable. Every row is appended, with the SHA-256 of the sheet,
+to a shard in <out>.manifest/ as soon as it arrives - one shard per run, so
+a run killed mid-write can only tear the last line of its own shard, which
+is ignored. A rerun skips every sheet whose content was already scored
+against the same answer key and retries the ones that failed. A worker
+that dies (out of memory, a pathological PDF) fails only the sheets it had
+in flight; the pool is restarted and the run carries on.
+
+The reports - CSV, JSONL and, when pyarrow is installed, Parquet - are
+rebuilt from the manifest at the end of each run: written to temporary
+files and renamed over the previous reports, so an interrupted run leaves
+the last complete reports in place. They hold one row per distinct sheet
+among the inputs; the "file" column says which sheet each one is.
+
+Usage:
+    python batch_score.py sheets/ [more.pdf "batch2/*.pdf" ...] [--out results]
+                          [--format csv,jsonl,parquet] [--workers N] [--key final.pdf]
+                          [--no-resume]
+
+A sheet that cannot be read or has no answers gets a row with "error" set
+and the run carries on. Progress goes to the console every --progress
+seconds, followed by a throughput summary.
+"""
+import argparse
+import csv
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from answer_keys import load_key_file
+from calculate_score import (
+    OFFICIAL_ANSWERS,
+    compile_answer_key,
+    extract_student_info_from_pages,
+    map_questions,
+    mapped_responses,
+    parse_response_content,
+    read_needed_pages,
+    score_responses
+)
+from pdf_extraction import format_pages, open_pages
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+SUMMARY_COLUMNS = [
+    "file", "sha256", "student_id", "name", "total_score", "nat_score", "msq_score", "mcq_score",
+    "correct", "wrong", "unattempted", "pages", "pages_skipped", "answer_key_version", "error"
+]
+PARQUET_BATCH_ROWS = 1000
+SHARD_SYNC_ROWS = 100
+
+def sheet_paths(inputs):
+    """PDF paths from directories, globs and files, each once, in sorted order"""
+    paths = []
+    for arg in inputs:
+        if os.path.isdir(arg):
+            paths.extend(glob.glob(os.path.join(arg, "*.pdf")))
+        elif glob.has_magic(arg):
+            paths.extend(glob.glob(arg))
+        else:
+            paths.append(arg)
+    return sorted(set(paths))
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Each worker compiles the answer key once, in init_worker
+_key = None
+
+def init_worker(answers):
+    global _key
+    _key = compile_answer_key(answers)
+
+def score_sheet(path):
+    """Worker: score one PDF into a flat row (question scores as q1..q44)"""
+    row = {"file": path, "answer_key_version": _key["version"], "error": ""}
+    try:
+        # One process per sheet already; no nested extraction pool
+        page_count, pages = open_pages(path, workers=1)
+        page_texts = read_needed_pages(pages)
+        # Closes the document, which read_needed_pages may have left part-read
+        pages.close()
+        name, student_id = extract_student_info_from_pages(page_texts)
+        questions = [q for section in parse_response_content(format_pages(page_texts)) for q in section]
+        mapping, _ = map_questions(questions)
+        score_data = score_responses(mapped_responses(mapping), _key["answers"], _key)
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+        return row
+
+    sections = score_data["section_scores"]
+    row.update({
+        "student_id": student_id or "",
+        "name": name,
+        "total_score": score_data["total_score"],
+        "nat_score": sections["NAT"]["total"],
+        "msq_score": sections["MSQ"]["total"],
+        "mcq_score": sections["MCQ"]["total"],
+        "correct": sum(s["correct"] for s in sections.values()),
+        "wrong": sum(s["wrong"] for s in sections.values()),
+        "unattempted": sum(s["unattempted"] for s in sections.values()),
+        "pages": len(page_texts),
+        "pages_skipped": page_count - len(page_texts)
+    })
+    for r in score_data["results"]:
+        row[f"q{r['q_num']}"] = r["score"]
+        row[f"a{r['q_num']}"] = r["user_ans"]
+    if all(r["user_ans"] in ["N/A", "--", None, ""] for r in score_data["results"]):
+        row["error"] = "no answers found (scanned or image-only PDF?)"
+    return row
+
+class ResultWriters:
+    """Write rows to every requested report format, via temporary files that
+    commit() renames into place"""
+
+    def __init__(self, out, formats, q_nums):
+        self.q_nums = q_nums
+        self.score_columns = [f"q{q}" for q in q_nums]
+        self.paths = []
+        self.csv_file = self.jsonl_file = self.parquet = None
+        self.parquet_rows = []
+        if "csv" in formats:
+            self.csv_file = self._open(f"{out}.csv", newline="")
+            self.csv = csv.DictWriter(self.csv_file, SUMMARY_COLUMNS + self.score_columns, extrasaction="ignore")
+            self.csv.writeheader()
+        if "jsonl" in formats:
+            self.jsonl_file = self._open(f"{out}.jsonl")
+        if "parquet" in formats:
+            fields = [(c, pyarrow.float64() if c.endswith("score") else pyarrow.int64() if c in ["correct", "wrong", "unattempted", "pages", "pages_skipped"] else pyarrow.string()) for c in SUMMARY_COLUMNS]
+            fields += [(c, pyarrow.float64()) for c in self.score_columns]
+            self.parquet_schema = pyarrow.schema(fields)
+            self.paths.append(f"{out}.parquet")
+            self.parquet = pyarrow.parquet.ParquetWriter(f"{out}.parquet.tmp", self.parquet_schema)
+
+    def _open(self, path, **kwargs):
+        self.paths.append(path)
+        return open(f"{path}.tmp", "w", encoding="utf-8", **kwargs)
+
+    def write(self, row):
+        if self.csv_file:
+            self.csv.writerow(row)
+        if self.jsonl_file:
+            record = {c: row.get(c) for c in SUMMARY_COLUMNS}
+            record["questions"] = {
+                f"Q{q}": {"answer": row[f"a{q}"], "score": row[f"q{q}"]} for q in self.q_nums if f"q{q}" in row
+            }
+            self.jsonl_file.write(json.dumps(record) + "\n")
+        if self.parquet:
+            self.parquet_rows.append(row)
+            if len(self.parquet_rows) >= PARQUET_BATCH_ROWS:
+                self._flush_parquet()
+
+    def _flush_parquet(self):
+        if not self.parquet_rows:
+            return
+        columns = {c: [row.get(c) for row in self.parquet_rows] for c in self.parquet_schema.names}
+        self.parquet.write_table(pyarrow.table(columns, schema=self.parquet_schema))
+        self.parquet_rows = []
+
+    def _close(self):
+        if self.csv_file:
+            self.csv_file.close()
+        if self.jsonl_file:
+            self.jsonl_file.close()
+        if self.parquet:
+            self._flush_parquet()
+            self.parquet.close()
+
+    def commit(self):
+        """Finish the temporary files and rename each over its report"""
+        self._close()
+        for path in self.paths:
+            with open(f"{path}.tmp", "rb") as f:
+                os.fsync(f.fileno())
+            os.replace(f"{path}.tmp", path)
+
+    def discard(self):
+        self._close()
+        for path in self.paths:
+            if os.path.exists(f"{path}.tmp"):
+                os.remove(f"{path}.tmp")
+
+class ShardWriter:
+    """Append {"sha256", "row"} lines to this run's manifest shard"""
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        name = f"run-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.jsonl"
+        self.path = os.path.join(directory, name)
+        self.file = open(self.path, "a", encoding="utf-8")
+        self.unsynced = 0
+
+    def write(self, digest, row):
+        self.file.write(json.dumps({"sha256": digest, "row": row}) + "\n")
+        # Flushed per row so a killed process loses nothing; synced in batches
+        self.file.flush()
+        self.unsynced += 1
+        if self.unsynced >= SHARD_SYNC_ROWS:
+            os.fsync(self.file.fileno())
+            self.unsynced = 0
+
+    def close(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+def read_manifest(directory):
+    """Yield (shard, line number, entry) for every intact manifest line, oldest shard first"""
+    if not os.path.isdir(directory):
+        return
+    for shard in sorted(os.listdir(directory)):
+        if not shard.endswith(".jsonl"):
+            continue
+        with open(os.path.join(directory, shard), "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f):
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # The torn last line of a run that was killed mid-write
+                    continue
+                yield shard, line_no, entry
+
+def finished_sheets(directory, version):
+    """Content hashes already scored without error against the answer key `version`"""
+    finished = set()
+    for _, _, entry in read_manifest(directory):
+        row = entry["row"]
+        if row.get("answer_key_version") != version:
+            continue
+        if row["error"]:
+            finished.discard(entry["sha256"])
+        else:
+            finished.add(entry["sha256"])
+    return finished
+
+def merge_reports(directory, digests, version, writers):
+    """Write the latest manifest row of every sheet in `digests` to the reports.
+
+    Two passes over the shards, so only a hash -> line index is held in
+    memory, not the rows.
+    """
+    latest = {}
+    for shard, line_no, entry in read_manifest(directory):
+        if entry["sha256"] in digests and entry["row"].get("answer_key_version") == version:
+            latest[entry["sha256"]] = (shard, line_no)
+    selected = set(latest.values())
+    count = 0
+    for shard, line_no, entry in read_manifest(directory):
+        if (shard, line_no) in selected:
+            writers.write(entry["row"])
+            count += 1
+    return count
+
+def failed_row(path, digest, version, error):
+    return {"file": path, "sha256": digest, "answer_key_version": version, "error": error}
+
+def score_all(jobs, shard, answers, workers, progress_seconds=2.0):
+    """Score (path, sha256) jobs over a process pool, recording rows as they complete"""
+    version = compile_answer_key(answers)["version"]
+    stats = {"files": 0, "errors": 0, "pages": 0, "pool_restarts": 0}
+    start = last_report = time.perf_counter()
+
+    def record(path, digest, row):
+        row["sha256"] = digest
+        shard.write(digest, row)
+        stats["files"] += 1
+        stats["pages"] += row.get("pages") or 0
+        if row["error"]:
+            stats["errors"] += 1
+            print(f"  {path}: {row['error']}")
+
+    # Enough queued work to keep every worker busy, and no more
+    window = workers * 4
+    pending = {}
+    suspects = []
+    remaining = iter(jobs)
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(answers,))
+    try:
+        while True:
+            for path, digest in remaining:
+                pending[pool.submit(score_sheet, path)] = (path, digest)
+                if len(pending) >= window:
+                    break
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            broken = any(isinstance(future.exception(), BrokenProcessPool) for future in done)
+            if broken:
+                # A dead worker breaks the pool: everything still in flight
+                # fails with it, and there is no telling which sheet did it
+                done = wait(pending)[0]
+            for future in done:
+                path, digest = pending.pop(future)
+                if isinstance(future.exception(), BrokenProcessPool):
+                    suspects.append((path, digest))
+                else:
+                    record(path, digest, future.result())
+            if broken:
+                pool.shutdown(wait=False)
+                pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(answers,))
+                stats["pool_restarts"] += 1
+
+            now = time.perf_counter()
+            if now - last_report >= progress_seconds:
+                last_report = now
+                print(f"  {stats['files']}/{len(jobs)} sheets, {stats['files'] / (now - start):.1f} sheets/s, {stats['errors']} errors")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    # Each sheet caught in a crash gets a process of its own, so only the
+    # one that kills it is recorded as failed
+    if suspects:
+        print(f"  Retrying {len(suspects)} sheet(s) in flight when a worker died, one at a time")
+    for path, digest in suspects:
+        with ProcessPoolExecutor(max_workers=1, initializer=init_worker, initargs=(answers,)) as single:
+            try:
+                row = single.submit(score_sheet, path).result()
+            except BrokenProcessPool:
+                row = failed_row(path, digest, version, "worker process died (out of memory or crash?)")
+        record(path, digest, row)
+    stats["elapsed"] = time.perf_counter() - start
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a directory of response-sheet PDFs")
+    parser.add_argument("inputs", nargs="+", help="Directories, globs or PDF files")
+    parser.add_argument("--out", default="batch_scores", help="Output path without extension (default: batch_scores)")
+    parser.add_argument("--format", default="csv,jsonl", help="Comma-separated: csv, jsonl, parquet (default: csv,jsonl)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--key", help="Answer key (.json or .pdf) to score with (default: OFFICIAL_ANSWERS)")
+    parser.add_argument("--progress", type=float, default=2.0, help="Seconds between progress lines")
+    parser.add_argument("--no-resume", action="store_true", help="Score every sheet again, ignoring earlier runs")
+    args = parser.parse_args()
+
+    formats = [f.strip() for f in args.format.split(",") if f.strip()]
+    unknown = [f for f in formats if f not in ["csv", "jsonl", "parquet"]]
+    if unknown:
+        parser.error(f"unknown format(s): {', '.join(unknown)}")
+    if "parquet" in formats and pyarrow is None:
+        parser.error("parquet output needs pyarrow (pip install pyarrow)")
+
+    paths = sheet_paths(args.inputs)
+    if not paths:
+        print("No PDFs found.")
+        sys.exit(1)
+    answers = load_key_file(args.key) if args.key else OFFICIAL_ANSWERS
+    version = compile_answer_key(answers)["version"]
+    manifest_dir = f"{args.out}.manifest"
+
+    # The same content under two names is scored once
+    digests = {}
+    for path in paths:
+        digests.setdefault(file_sha256(path), path)
+    finished = set() if args.no_resume else finished_sheets(manifest_dir, version)
+    jobs = [(path, digest) for digest, path in digests.items() if digest not in finished]
+    skipped = len(digests) - len(jobs)
+
+    workers = max(1, min(args.workers, len(jobs) or 1))
+    print(f"Scoring {len(jobs)} sheets with {workers} worker(s)"
+          + (f"; {skipped} already scored in earlier runs" if skipped else ""))
+    stats = {"files": 0, "errors": 0, "pages": 0, "pool_restarts": 0, "elapsed": 0.0}
+    if jobs:
+        shard = ShardWriter(manifest_dir)
+        try:
+            stats = score_all(jobs, shard, answers, workers, args.progress)
+        finally:
+            shard.close()
+
+    # Rebuilt from the manifest, so a report never holds a partial run
+    writers = ResultWriters(args.out, formats, sorted(answers))
+    try:
+        reported = merge_reports(manifest_dir, set(digests), version, writers)
+    except BaseException:
+        writers.discard()
+        raise
+    writers.commit()
+
+    elapsed = stats["elapsed"]
+    print("="*64)
+    print(f"Sheets:     {stats['files']} ({stats['files'] - stats['errors']} scored, {stats['errors']} errors), {skipped} skipped")
+    print(f"Pages:      {stats['pages']}")
+    if stats["files"]:
+        print(f"Time:       {elapsed:.1f}s ({stats['files'] / elapsed:.1f} sheets/s, {stats['pages'] / elapsed:.1f} pages/s)")
+    if stats["pool_restarts"]:
+        print(f"Worker pool restarted {stats['pool_restarts']} time(s) after a worker died")
+    print(f"Written:    {', '.join(writers.paths)} ({reported} rows)")
+    print("="*64)
+
+if __name__ == "__main__":
+    main()
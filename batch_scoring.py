@@ -0,0 +1,105 @@
+"""
+Score many candidates at once with NumPy.
+
+Responses are encoded into arrays - NAT answers as floats (NaN when blank or
+unreadable) and MSQ/MCQ choices as option bitmasks (A=1, B=2, C=4, D=8; 0
+when blank) - and all 44 questions are then scored with array operations:
+an interval test for NAT and a lookup in the compiled answer key's marks
+tables for MSQ/MCQ. Every score is exactly what calculate_nat_score,
+calculate_msq_score and calculate_mcq_score give for the same response (see
+benchmark_batch_scoring.py).
+"""
+import numpy as np
+
+from calculate_score import OFFICIAL_ANSWERS, compiled_key, mcq_mask, msq_mask, nat_value
+
+def question_layout(answers=OFFICIAL_ANSWERS):
+    """Question numbers in score order, split into NAT and MSQ/MCQ columns"""
+    q_nums = sorted(answers)
+    nat_q = [q for q in q_nums if answers[q]["type"] == "NAT"]
+    choice_q = [q for q in q_nums if answers[q]["type"] != "NAT"]
+    return q_nums, nat_q, choice_q
+
+def encode_responses(candidates, answers=OFFICIAL_ANSWERS):
+    """Encode candidates' responses as arrays.
+
+    `candidates` is a list of {official_num: {"status", "answer",
+    "chosen_options"}} dicts as returned by mapped_responses; a question
+    missing from a dict was not found on that sheet. Returns {"nat": float
+    array (N x NAT questions), "masks": uint8 array (N x MSQ/MCQ questions)}.
+    """
+    _, nat_q, choice_q = question_layout(answers)
+    choice_columns = [(q, msq_mask if answers[q]["type"] == "MSQ" else mcq_mask) for q in choice_q]
+
+    # Sheets repeat a handful of distinct strings, so each is parsed once
+    nat_seen = {}
+    mask_seen = {}
+    nat_rows = []
+    mask_rows = []
+    for responses in candidates:
+        nat_row = []
+        for q in nat_q:
+            user_q = responses.get(q)
+            if user_q is None:
+                nat_row.append(np.nan)
+                continue
+            answer = user_q["answer"]
+            if answer not in nat_seen:
+                nat_seen[answer] = nat_value(answer)
+            nat_row.append(nat_seen[answer])
+        mask_row = []
+        for q, encode in choice_columns:
+            user_q = responses.get(q)
+            if user_q is None:
+                mask_row.append(0)
+                continue
+            seen_key = (encode, user_q["chosen_options"], user_q["status"])
+            if seen_key not in mask_seen:
+                mask_seen[seen_key] = encode(user_q["chosen_options"], user_q["status"])
+            mask_row.append(mask_seen[seen_key])
+        nat_rows.append(nat_row)
+        mask_rows.append(mask_row)
+
+    return {
+        "nat": np.array(nat_rows, dtype=np.float64).reshape(len(candidates), len(nat_q)),
+        "masks": np.array(mask_rows, dtype=np.uint8).reshape(len(candidates), len(choice_q)),
+    }
+
+def score_encoded(encoded, answers=OFFICIAL_ANSWERS):
+    """Score encoded responses.
+
+    Returns {"q_nums", "scores" (N x 44, in q_nums order), "section_scores"
+    ({"NAT"/"MSQ"/"MCQ": N}), "total_score" (N)}.
+    """
+    q_nums, nat_q, choice_q = question_layout(answers)
+    n = encoded["nat"].shape[0]
+    scores = np.zeros((n, len(q_nums)), dtype=np.float64)
+    column = {q: i for i, q in enumerate(q_nums)}
+    key = compiled_key(answers)
+
+    # NAT: 4 inside the accepted interval, else 0 (NaN is never inside)
+    low = np.array([key["questions"][q]["bounds"][0] for q in nat_q], dtype=np.float64)
+    high = np.array([key["questions"][q]["bounds"][1] for q in nat_q], dtype=np.float64)
+    with np.errstate(invalid="ignore"):
+        nat_scores = np.where((encoded["nat"] >= low) & (encoded["nat"] <= high), 4.0, 0.0)
+    scores[:, [column[q] for q in nat_q]] = nat_scores
+
+    # MSQ/MCQ: index each question's 16-entry marks table with the chosen mask
+    marks = np.array([key["questions"][q]["marks"] for q in choice_q], dtype=np.float64).reshape(len(choice_q), 16)
+    scores[:, [column[q] for q in choice_q]] = marks[np.arange(len(choice_q)), encoded["masks"]]
+
+    section_scores = {}
+    for section in ["NAT", "MSQ", "MCQ"]:
+        section_scores[section] = scores[:, [column[q] for q in q_nums if answers[q]["type"] == section]].sum(axis=1)
+    total_score = section_scores["NAT"] + section_scores["MSQ"] + section_scores["MCQ"]
+
+    return {
+        "q_nums": q_nums,
+        "scores": scores,
+        "section_scores": section_scores,
+        "total_score": total_score,
+    }
+
+def score_batch(candidates, answers=OFFICIAL_ANSWERS):
+    """Encode and score a list of candidates' mapped responses"""
+    return score_encoded(encode_responses(candidates, answers), answers)
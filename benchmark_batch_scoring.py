@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""
+Benchmark the NumPy batch scorer against scoring candidates one at a time
+with score_responses, and check that every question, section and total
+score is identical.
+
+Usage: python benchmark_batch_scoring.py [candidates]   (default 100000)
+Candidates are random synthetic responses, about a tenth of them malformed.
+"""
+import random
+import sys
+import time
+
+import numpy as np
+
+from batch_scoring import encode_responses, score_encoded
+from calculate_score import score_responses
+from synthetic_sheet import random_responses
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rng = random.Random(0)
+    candidates = [random_responses(rng) for _ in range(count)]
+
+    start = time.perf_counter()
+    scalar = [score_responses(responses) for responses in candidates]
+    t_scalar = time.perf_counter() - start
+
+    start = time.perf_counter()
+    encoded = encode_responses(candidates)
+    t_encode = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = score_encoded(encoded)
+    t_score = time.perf_counter() - start
+
+    # Compare as float64 bit patterns, so -0.0 and 0.0 would count as different
+    scalar_scores = np.array([[r["score"] for r in data["results"]] for data in scalar], dtype=np.float64)
+    same_questions = np.array_equal(scalar_scores.view(np.int64), batch["scores"].view(np.int64))
+    same_sections = all(
+        np.array_equal(np.array([data["section_scores"][s]["total"] for data in scalar], dtype=np.float64).view(np.int64),
+                       batch["section_scores"][s].view(np.int64))
+        for s in ["NAT", "MSQ", "MCQ"]
+    )
+    same_totals = np.array_equal(np.array([data["total_score"] for data in scalar], dtype=np.float64).view(np.int64),
+                                 batch["total_score"].view(np.int64))
+
+    print("="*64)
+    print(f"BATCH SCORING BENCHMARK ({count} candidates x 44 questions)")
+    print("="*64)
+    print(f"{'Scalar score_responses':<28} {t_scalar:>8.2f}s {count / t_scalar:>12,.0f} candidates/s")
+    print(f"{'Batch: encode':<28} {t_encode:>8.2f}s {count / t_encode:>12,.0f} candidates/s")
+    print(f"{'Batch: score':<28} {t_score:>8.2f}s {count / t_score:>12,.0f} candidates/s")
+    print(f"{'Batch: total':<28} {t_encode + t_score:>8.2f}s {count / (t_encode + t_score):>12,.0f} candidates/s")
+    print("-"*64)
+    print(f"Identical per-question scores: {'yes' if same_questions else 'NO'}")
+    print(f"Identical section scores:      {'yes' if same_sections else 'NO'}")
+    print(f"Identical totals:              {'yes' if same_totals else 'NO'}")
+    print("="*64)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+Benchmark serial against process-pool PDF text extraction over documents of
+growing length, to choose PDF_PARALLEL_MIN_PAGES for this machine.
+
+Usage: python benchmark_extraction.py [document.pdf] [--workers N]
+Test documents are built by repeating the pages of the given PDF (default:
+the bundled question paper) up to each length. Both modes must return the
+same text; the last column says whether they did.
+"""
+import io
+import os
+import sys
+import time
+
+from pypdf import PdfReader, PdfWriter
+
+import pdf_extraction
+from pdf_extraction import extract_pages
+
+PAGE_COUNTS = [2, 4, 8, 16, 24, 32, 64]
+
+def repeat_pages(pdf_bytes, page_count):
+    """A PDF of page_count pages, cycling through the pages of pdf_bytes"""
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    writer = PdfWriter()
+    for i in range(page_count):
+        writer.add_page(reader.pages[i % len(reader.pages)])
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+def best_time(func, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+def main():
+    args = sys.argv[1:]
+    workers = pdf_extraction.PDF_WORKERS
+    if "--workers" in args:
+        i = args.index("--workers")
+        workers = int(args[i + 1])
+        del args[i:i + 2]
+    source = args[0] if args else "CEED_2026_Question_Paper.pdf"
+    with open(source, "rb") as f:
+        source_bytes = f.read()
+
+    print("="*72)
+    print("PDF EXTRACTION BENCHMARK")
+    print(f"Source: {os.path.basename(source)}   Workers: {workers}   CPUs: {os.cpu_count()}")
+    print("="*72)
+    if workers < 2:
+        print("Only one worker available: parallel extraction is never used here.")
+        print("Run with --workers N to measure the overhead anyway.")
+
+    # Start the pool once so its start-up cost is not charged to the first row
+    pdf_extraction._get_pool(max(workers, 2))
+
+    print(f"{'Pages':>6} {'Serial':>11} {'Parallel':>11} {'Speedup':>8}  Same")
+    print("-"*72)
+    break_even = None
+    for page_count in PAGE_COUNTS:
+        pdf_bytes = repeat_pages(source_bytes, page_count)
+        t_serial, serial = best_time(lambda: extract_pages(pdf_bytes, workers=1))
+        t_parallel, parallel = best_time(lambda: extract_pages(pdf_bytes, workers=max(workers, 2), min_pages=0))
+        speedup = t_serial / t_parallel
+        if speedup > 1.1 and break_even is None:
+            break_even = page_count
+        print(f"{page_count:>6} {t_serial*1000:>9.1f}ms {t_parallel*1000:>9.1f}ms {speedup:>7.2f}x  "
+              f"{'yes' if serial == parallel else 'NO'}")
+
+    print("-"*72)
+    if break_even:
+        print(f"Parallel extraction pays off from about {break_even} pages: "
+              f"set PDF_PARALLEL_MIN_PAGES={break_even}")
+    else:
+        print("Parallel extraction did not pay off at any size tested.")
+    print(f"Current PDF_PARALLEL_MIN_PAGES: {pdf_extraction.PARALLEL_MIN_PAGES}")
+    print("="*72)
+
+if __name__ == "__main__":
+    main()
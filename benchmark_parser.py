@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+"""
+Benchmark the single-pass response parser and the question-mapping index
+against the previous per-block / per-question regex implementations, and
+check that both produce identical results.
+
+Usage: python benchmark_parser.py [response_text.txt | response.pdf ...]
+Without arguments the bundled response_text.txt (if present) and synthetic
+sheets at 1x and 10x size are used.
+"""
+import os
+import re
+import sys
+import timeit
+
+from build_question_ids import question_id_table
+from calculate_score import EXAM_PROFILE, QUESTION_PATTERNS, map_questions, parse_response_content
+from synthetic_sheet import make_response_text
+
+def legacy_parse_response_content(content):
+    """The parser as it was before the tokenizer: five regex scans per block"""
+    matches = list(re.finditer(r'Q\.\d+', content))
+    sections = []
+    current_section = []
+    last_num = -1
+
+    for i in range(len(matches)):
+        start = matches[i].start()
+        end = matches[i+1].start() if i+1 < len(matches) else len(content)
+        q_block = content[start:end]
+
+        m = re.match(r'Q\.(\d+)', q_block)
+        curr_num = int(m.group(1))
+
+        if curr_num < last_num:
+            sections.append(current_section)
+            current_section = []
+
+        q_text_match = re.search(r'Q\.\d+\s*(.*?)(?=Given|Options|Question ID|Status)', q_block, re.DOTALL)
+        q_text = q_text_match.group(1).strip() if q_text_match else ""
+
+        answer_match = re.search(r'Answer\s*:(.*?)(?=\s*Question ID|Status|$)', q_block, re.DOTALL)
+        chosen_option_match = re.search(r'Chosen Option\s*:\s*([^\n]+)', q_block)
+        status_match = re.search(r'Status\s*:(.*?)(?=\s*Given|Options|Question ID|Answer|Chosen Option|$)', q_block, re.DOTALL)
+
+        q_info = {
+            "text": q_text,
+            "raw_block": q_block,
+            "status": status_match.group(1).strip() if status_match else "",
+            "answer": answer_match.group(1).strip() if answer_match else None,
+            "chosen_options": chosen_option_match.group(1).strip() if chosen_option_match else None
+        }
+
+        if q_info["chosen_options"]:
+            raw = q_info["chosen_options"].strip()
+            if raw == '--' or raw.startswith('--'):
+                q_info["chosen_options"] = "--"
+            else:
+                comma_match = re.match(r'^([1-4](?:\s*,\s*[1-4])*)', raw)
+                if comma_match:
+                    cleaned = comma_match.group(1)
+                    cleaned = re.sub(r'\s*,\s*', ',', cleaned)
+                    q_info["chosen_options"] = cleaned
+                else:
+                    consecutive_match = re.match(r'^([1-4]+)', raw)
+                    if consecutive_match:
+                        q_info["chosen_options"] = consecutive_match.group(1)
+                    else:
+                        q_info["chosen_options"] = "--"
+
+        current_section.append(q_info)
+        last_num = curr_num
+
+    sections.append(current_section)
+    return sections
+
+def legacy_map_questions(all_questions):
+    """Question mapping as it was: one uncompiled search per question per block"""
+    mapping = {}
+    for q_num in range(1, 45):
+        pattern = QUESTION_PATTERNS[q_num]
+        for user_q in all_questions:
+            if re.search(pattern, user_q["raw_block"], re.IGNORECASE | re.DOTALL):
+                mapping[q_num] = user_q
+                break
+    return mapping
+
+def strip_question_id(q_info):
+    """The old parser never captured the Question ID"""
+    return {k: v for k, v in q_info.items() if k != "question_id"}
+
+def mapping_diff(a, b):
+    """'yes' when both map every question to the same block, else the questions that differ"""
+    differ = [q for q in sorted(set(a) | set(b)) if id(a.get(q)) != id(b.get(q))]
+    return "yes" if not differ else "Q" + ",Q".join(map(str, differ))
+
+def load_content(path):
+    if path.lower().endswith(".pdf"):
+        from pypdf import PdfReader
+        content = ""
+        for i, page in enumerate(PdfReader(path).pages):
+            content += f"--- Page {i+1} ---\n"
+            content += page.extract_text() or ""
+            content += "\n\n"
+        return content
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+def best_time(func, arg, number):
+    return min(timeit.repeat(lambda: func(arg), number=number, repeat=5)) / number
+
+def report(title, rows):
+    print(f"\n{title}")
+    print(f"{'Input':<24} {'Chars':>9} {'Blocks':>7} {'Legacy':>11} {'New':>11} {'Speedup':>8}  Same")
+    print("-"*80)
+    for name, chars, blocks, t_legacy, t_new, same in rows:
+        print(f"{name[:24]:<24} {chars:>9} {blocks:>7} {t_legacy*1000:>9.3f}ms {t_new*1000:>9.3f}ms "
+              f"{t_legacy / t_new:>7.2f}x  {same}")
+
+def main():
+    inputs = []
+    paths = sys.argv[1:] or [p for p in ["response_text.txt"] if os.path.exists(p)]
+    for path in paths:
+        inputs.append((os.path.basename(path), load_content(path)))
+    inputs.append(("synthetic 1x", make_response_text(seed=1)))
+    inputs.append(("synthetic 10x", make_response_text(seed=1, repeat=10)))
+
+    parse_rows = []
+    map_rows = []
+    id_rows = []
+    for name, content in inputs:
+        legacy = legacy_parse_response_content(content)
+        current = parse_response_content(content)
+        questions = [q for section in current for q in section]
+        number = max(1, 2000 // max(len(questions), 1))
+        parse_rows.append((name, len(content), len(questions),
+                           best_time(legacy_parse_response_content, content, number),
+                           best_time(parse_response_content, content, number),
+                           "yes" if legacy == [[strip_question_id(q) for q in section] for section in current] else "NO"))
+
+        legacy_mapping = legacy_map_questions(questions)
+        mapping, _ = map_questions(questions)
+        map_rows.append((name, len(content), len(questions),
+                         best_time(legacy_map_questions, questions, number),
+                         best_time(map_questions, questions, number),
+                         mapping_diff(legacy_mapping, mapping)))
+
+        # The same sheet again with a Question ID table learned from it
+        id_profile = dict(EXAM_PROFILE, question_ids=question_id_table(mapping))
+        id_mapping, _ = map_questions(questions, id_profile)
+        id_rows.append((name, len(content), len(questions),
+                        best_time(legacy_map_questions, questions, number),
+                        best_time(lambda qs: map_questions(qs, id_profile), questions, number),
+                        mapping_diff(legacy_mapping, id_mapping)))
+
+    print("="*80)
+    print("RESPONSE PARSER BENCHMARK")
+    print("="*80)
+    report("PARSING (per-block regexes vs single-pass tokenizer)", parse_rows)
+    report("MAPPING (44 x N searches vs precompiled index)", map_rows)
+    report("MAPPING (44 x N searches vs Question ID lookup)", id_rows)
+    print("\nQuestions listed under Same were mapped to a different block. The pattern")
+    print("path can hand one block to two questions (Q33's pattern also matches Q26);")
+    print("the Question ID lookup maps each of them to its own block.")
+    print("="*80)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""
+Build the QUESTION_IDS table for calculate_score.py from one response sheet.
+
+Question IDs are fixed per paper, so a sheet whose blocks all map through
+QUESTION_PATTERNS gives the Question ID -> official number table for every
+candidate. The table is printed, and with --write saved to
+question_ids.json, which calculate_score.py loads at import; commit that
+file so production maps blocks by Question ID.
+
+Usage: python build_question_ids.py [response_text.txt | response.pdf] [--write]
+"""
+import json
+import sys
+
+from calculate_score import EXAM_PROFILE, QUESTION_IDS_FILE, parse_response_content, map_questions
+
+def question_id_table(mapping):
+    """Question ID -> official number for every mapped block that has an ID.
+
+    A block matched by more than one question's pattern (Q26/Q33) says
+    nothing reliable about either, so its ID is left out.
+    """
+    table = {}
+    shared = set()
+    for q_num, user_q in mapping.items():
+        qid = user_q.get("question_id")
+        if not qid:
+            continue
+        if qid in table:
+            shared.add(qid)
+        table[qid] = q_num
+    return {qid: q_num for qid, q_num in table.items() if qid not in shared}
+
+def main():
+    args = [arg for arg in sys.argv[1:] if arg != "--write"]
+    write = len(args) < len(sys.argv) - 1
+    path = args[0] if args else "response_text.txt"
+    if path.lower().endswith(".pdf"):
+        from pypdf import PdfReader
+        content = ""
+        for i, page in enumerate(PdfReader(path).pages):
+            content += f"--- Page {i+1} ---\n"
+            content += page.extract_text() or ""
+            content += "\n\n"
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            content = f.read()
+
+    questions = [q for section in parse_response_content(content) for q in section]
+    # Map by pattern only, so an existing table can't mask a bad mapping
+    mapping, _ = map_questions(questions, dict(EXAM_PROFILE, question_ids={}))
+    table = question_id_table(mapping)
+
+    missing = sorted(set(range(1, 45)) - set(table.values()))
+    if missing:
+        print(f"# WARNING: no unambiguous Question ID for Q{', Q'.join(map(str, missing))} - these keep using the pattern fallback")
+
+    print("QUESTION_IDS = {")
+    for qid, q_num in sorted(table.items(), key=lambda item: item[1]):
+        print(f'    "{qid}": {q_num},')
+    print("}")
+
+    if write:
+        with open(QUESTION_IDS_FILE, "w", encoding="utf-8") as f:
+            json.dump(dict(sorted(table.items(), key=lambda item: item[1])), f, indent=2)
+        print(f"# Wrote {len(table)} Question IDs to {QUESTION_IDS_FILE}")
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,7 @@
+import copy
+import hashlib
+import json
+import os
 import re
 
 # Official Answer Key
@@ -104,86 +108,366 @@ QUESTION_PATTERNS = {
     44: r"gestalt\s+principles\s+associated",
 }
 
-def parse_response_text(filename):
-    with open(filename, "r", encoding="utf-8") as f:
-        content = f.read()
-    
+# Question ID printed on the response sheet -> official question number.
+# IDs are fixed per paper, so one sheet whose blocks all map by pattern is
+# enough to build the table: build_question_ids.py writes it to
+# question_ids.json next to this file, which is loaded here. Blocks whose ID
+# is not listed (or every block, until the table is built) fall back to
+# QUESTION_PATTERNS.
+QUESTION_IDS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "question_ids.json")
+
+def load_question_ids(path=QUESTION_IDS_FILE):
+    """Question ID -> official number table from `path`; empty when there is none"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return {str(qid): int(q_num) for qid, q_num in json.load(f).items()}
+
+QUESTION_IDS = load_question_ids()
+
+# Everything needed to map and score one exam's response sheets
+EXAM_PROFILE = {
+    "name": "CEED 2026 Part A",
+    "answers": OFFICIAL_ANSWERS,
+    "question_ids": QUESTION_IDS,
+}
+
+# Every question pattern in one alternation, so a block is scanned once for
+# all 44 questions instead of once per question. The alternation is built
+# from lower-cased patterns (they only use lower-case escapes) and run over a
+# lower-cased block: a case-sensitive scan is several times faster than 44
+# IGNORECASE branches and matches exactly the same text, except for the four
+# characters below whose case-insensitive matches lower() does not
+# reproduce. Blocks containing any of those use the per-pattern search.
+# Branches are non-capturing (44 named groups slow every match attempt down);
+# the question behind a hit is recovered from its first character instead.
+_QUESTION_INDEX = re.compile(
+    "|".join(f"(?:{pattern.lower()})" for pattern in QUESTION_PATTERNS.values()),
+    re.DOTALL
+)
+_QUESTION_INDEX_UNSAFE = re.compile("[İıſK]")
+_QUESTION_REGEXES = {q_num: re.compile(pattern, re.IGNORECASE | re.DOTALL) for q_num, pattern in QUESTION_PATTERNS.items()}
+_QUESTION_REGEXES_LOWER = {q_num: re.compile(pattern.lower(), re.DOTALL) for q_num, pattern in QUESTION_PATTERNS.items()}
+
+# An alternation only reports the first pattern that matches at a position;
+# these are the other patterns that could match at the same spot
+_PATTERNS_BY_FIRST_CHAR = {}
+for _q_num, _pattern in QUESTION_PATTERNS.items():
+    _PATTERNS_BY_FIRST_CHAR.setdefault(_pattern[0].lower(), []).append(_q_num)
+
+def _match_block(block, mapping, user_q):
+    """Assign user_q to every still-unmapped question whose pattern occurs in block"""
+    if not block.isascii() and _QUESTION_INDEX_UNSAFE.search(block):
+        for q_num, regex in _QUESTION_REGEXES.items():
+            if q_num not in mapping and regex.search(block):
+                mapping[q_num] = user_q
+        return
+
+    lowered = block.lower()
+    match = _QUESTION_INDEX.search(lowered)
+    while match:
+        pos = match.start()
+        for q_num in _PATTERNS_BY_FIRST_CHAR[lowered[pos]]:
+            if q_num not in mapping and _QUESTION_REGEXES_LOWER[q_num].match(lowered, pos):
+                mapping[q_num] = user_q
+        # Restart just past this hit so overlapping matches are not skipped
+        match = _QUESTION_INDEX.search(lowered, pos + 1)
+
+def map_questions(questions, profile=EXAM_PROFILE):
+    """Map official question numbers to parsed response blocks.
+
+    Blocks carrying a Question ID from the profile's table are mapped by a
+    dict lookup. The remaining blocks go through QUESTION_PATTERNS: each
+    still-unmapped question goes to the first of them (in sheet order) whose
+    raw text matches its pattern, so Q26 and Q33 resolve exactly as the
+    per-question search did.
+
+    Returns (mapping, stats); stats counts the blocks that went down each path.
+    """
+    question_ids = profile["question_ids"]
+    mapping = {}  # official_num -> user_q_info
+    stats = {"by_id": 0, "by_pattern": 0}
+
+    fallback = []
+    for user_q in questions:
+        q_num = question_ids.get(user_q.get("question_id"))
+        if q_num is None:
+            fallback.append(user_q)
+            continue
+        stats["by_id"] += 1
+        if q_num not in mapping:
+            mapping[q_num] = user_q
+
+    for user_q in fallback:
+        if len(mapping) == len(QUESTION_PATTERNS):
+            break
+        stats["by_pattern"] += 1
+        # Search in raw_block as well in case question text extraction was clipped
+        _match_block(user_q["raw_block"], mapping, user_q)
+    return mapping, stats
+
+# Every field label the block parser needs, plus the question headers, in one
+# alternation so the extracted text is tokenized in a single pass. Labels are
+# matched as plain substrings, exactly like the lookaheads they replace
+# ("Answer" inside "Answered" still counts as a boundary).
+_SHEET_TOKENS = re.compile(r"(Q\.\d+|Given|Options|Question ID|Status|Answer|Chosen(?= Option))")
+_CHOSEN_OPTION = re.compile(r"Chosen Option\s*:\s*([^\n]+)")
+_QUESTION_ID_VALUE = re.compile(r"\s*:\s*(\d+)")
+_CHOSEN_COMMA = re.compile(r"^([1-4](?:\s*,\s*[1-4])*)")
+_CHOSEN_COMMA_SPACING = re.compile(r"\s*,\s*")
+_CHOSEN_DIGITS = re.compile(r"^([1-4]+)")
+
+# Labels are told apart by their first character; these are the labels that
+# end each free-text field
+_TEXT_STOPS = "GOQS"      # Given, Options, Question ID, Status
+_ANSWER_STOPS = "QS"      # Question ID, Status
+_STATUS_STOPS = "GOQAC"   # Given, Options, Question ID, Answer, Chosen Option
+
+def _clean_chosen_options(raw):
+    """Extract only valid option digits (1-4) with optional commas"""
+    raw = raw.strip()
+
+    # Check for unanswered
+    if raw == '--' or raw.startswith('--'):
+        return "--"
+
+    # First, try to match comma-separated pattern like "1,3" or "1, 3"
+    comma_match = _CHOSEN_COMMA.match(raw)
+    if comma_match:
+        # Normalize: remove spaces around commas
+        return _CHOSEN_COMMA_SPACING.sub(',', comma_match.group(1))
+
+    # Try consecutive digits like "24" or "134" - comma may have been lost in PDF parsing
+    consecutive_match = _CHOSEN_DIGITS.match(raw)
+    if consecutive_match:
+        return consecutive_match.group(1)
+
+    # Invalid format
+    return "--"
+
+def _block_record(content, start, header_end, end, text_end, answer_span, status_span, chosen, question_id):
+    """Build the question record for content[start:end] from its field positions"""
+    chosen_options = None
+    for pos in chosen:
+        # Use a restrictive match for the chosen option - stop at newline
+        chosen_match = _CHOSEN_OPTION.match(content, pos, end)
+        if chosen_match:
+            chosen_options = chosen_match.group(1).strip()
+            break
+
+    q_info = {
+        "text": content[header_end:text_end].strip() if text_end is not None else "",
+        "raw_block": content[start:end],
+        "status": content[status_span[0]:status_span[1] or end].strip() if status_span else "",
+        "answer": content[answer_span[0]:answer_span[1] or end].strip() if answer_span else None,
+        "chosen_options": chosen_options,
+        "question_id": question_id
+    }
+    if q_info["chosen_options"]:
+        q_info["chosen_options"] = _clean_chosen_options(q_info["chosen_options"])
+    return q_info
+
+def parse_response_content(content):
+    """Parse extracted response-sheet text into sections of question records.
+
+    The text is tokenized once into headers, field labels and the text
+    between them; each field is then sliced out between label positions.
+    """
     # DON'T remove footer noise yet - it removes actual answers like "31/20/26"
     # We'll clean it during answer extraction instead
-    
+
     # Split into logical sections based on Q.1 restarts
-    # We find all Q.X markers
-    matches = list(re.finditer(r'Q\.\d+', content))
     sections = []
     current_section = []
     last_num = -1
-    
-    for i in range(len(matches)):
-        start = matches[i].start()
-        end = matches[i+1].start() if i+1 < len(matches) else len(content)
-        q_block = content[start:end]
-        
-        m = re.match(r'Q\.(\d+)', q_block)
-        curr_num = int(m.group(1))
-        
-        if curr_num < last_num:
-            # Numbering reset! New section.
-            sections.append(current_section)
-            current_section = []
-        
-        # Extract fields from q_block
-        q_text_match = re.search(r'Q\.\d+\s*(.*?)(?=Given|Options|Question ID|Status)', q_block, re.DOTALL)
-        q_text = q_text_match.group(1).strip() if q_text_match else ""
-        
-        answer_match = re.search(r'Answer\s*:(.*?)(?=\s*Question ID|Status|$)', q_block, re.DOTALL)
-        # Use a more restrictive regex - stop at newline or next field
-        chosen_option_match = re.search(r'Chosen Option\s*:\s*([^\n]+)', q_block)
-        status_match = re.search(r'Status\s*:(.*?)(?=\s*Given|Options|Question ID|Answer|Chosen Option|$)', q_block, re.DOTALL)
-        
-        q_info = {
-            "text": q_text,
-            "raw_block": q_block,
-            "status": status_match.group(1).strip() if status_match else "",
-            "answer": answer_match.group(1).strip() if answer_match else None,
-            "chosen_options": chosen_option_match.group(1).strip() if chosen_option_match else None
-        }
-        
-        # Clean chosen_options - extract only valid option digits (1-4) with optional commas
-        if q_info["chosen_options"]:
-            raw = q_info["chosen_options"].strip()
-            
-            # Check for unanswered
-            if raw == '--' or raw.startswith('--'):
-                q_info["chosen_options"] = "--"
-            else:
-                # Extract valid answer patterns - digits 1-4 with optional commas
-                # Also accept consecutive digits like "24" or "134" (comma may have been lost in PDF parsing)
-                
-                # First, try to match comma-separated pattern like "1,3" or "1, 3"
-                comma_match = re.match(r'^([1-4](?:\s*,\s*[1-4])*)', raw)
-                if comma_match:
-                    # Found comma-separated values
-                    cleaned = comma_match.group(1)
-                    # Normalize: remove spaces around commas
-                    cleaned = re.sub(r'\s*,\s*', ',', cleaned)
-                    q_info["chosen_options"] = cleaned
-                else:
-                    # Try consecutive digits (1-4 only) - comma may have been lost
-                    # Match one or more digits that are all 1-4
-                    consecutive_match = re.match(r'^([1-4]+)', raw)
-                    if consecutive_match:
-                        q_info["chosen_options"] = consecutive_match.group(1)
+    num = None
+
+    pieces = _SHEET_TOKENS.split(content)
+    pos = len(pieces[0])
+    for tok, seg in zip(pieces[1::2], pieces[2::2]):
+        kind = tok[0]
+
+        if kind == "Q" and tok[1] == ".":
+            if num is not None:
+                current_section.append(_block_record(content, start, header_end, pos, text_end, answer_span, status_span, chosen, question_id))
+                last_num = num
+            num = int(tok[2:])
+            if num < last_num:
+                # Numbering reset! New section.
+                sections.append(current_section)
+                current_section = []
+            start = pos
+            header_end = pos + len(tok)
+            text_end = answer_span = status_span = question_id = None
+            chosen = []
+
+        elif num is not None:
+            # Close whichever open fields this label terminates
+            if text_end is None and kind in _TEXT_STOPS:
+                text_end = pos
+            if answer_span and answer_span[1] is None and kind in _ANSWER_STOPS:
+                answer_span[1] = pos
+            if status_span and status_span[1] is None and kind in _STATUS_STOPS:
+                status_span[1] = pos
+
+            # Open "Answer :" / "Status :" on their first labelled occurrence
+            if (kind == "A" and answer_span is None) or (kind == "S" and status_span is None):
+                rest = seg.lstrip()
+                if rest[:1] == ":":
+                    span = [pos + len(tok) + len(seg) - len(rest) + 1, None]
+                    if kind == "A":
+                        answer_span = span
                     else:
-                        # Invalid format
-                        q_info["chosen_options"] = "--"
-                
-        current_section.append(q_info)
-        last_num = curr_num
-    
+                        status_span = span
+            elif kind == "C":
+                chosen.append(pos)
+            elif kind == "Q" and question_id is None:
+                id_match = _QUESTION_ID_VALUE.match(seg)
+                if id_match:
+                    question_id = id_match.group(1)
+
+        pos += len(tok) + len(seg)
+
+    if num is not None:
+        current_section.append(_block_record(content, start, header_end, len(content), text_end, answer_span, status_span, chosen, question_id))
     sections.append(current_section)
     return sections
 
-def calculate_msq_score(correct_keys, chosen_keys, status=""):
+# Searched in a block's raw text to tell whether the fields scoring reads are
+# final, i.e. ended by a following label rather than by the end of the text
+# extracted so far
+_STATUS_CLOSED = re.compile(r"Status\s*:.*?(?:Given|Options|Question ID|Answer|Chosen Option)", re.DOTALL)
+_ANSWER_CLOSED = re.compile(r"Answer\s*:.*?(?:Question ID|Status)", re.DOTALL)
+
+def block_closed(user_q, q_type):
+    """True once more text after this block could not change how it scores"""
+    block = user_q["raw_block"]
+    if not _STATUS_CLOSED.search(block):
+        return False
+    if q_type == "NAT":
+        return _ANSWER_CLOSED.search(block) is not None
+    # The chosen option runs to the end of its line. A value starting with
+    # whitespace means the regex backtracked because the real value has not
+    # been extracted yet.
+    chosen_match = _CHOSEN_OPTION.search(block)
+    return (chosen_match is not None and chosen_match.end() < len(block)
+            and not chosen_match.group(1)[0].isspace())
+
+def read_needed_pages(pages, profile=EXAM_PROFILE):
+    """Pull page texts from an iterable until the sheet can be scored.
+
+    Pages are parsed as they arrive. Reading stops once every official
+    question is mapped and the fields it is scored on are final, so trailing
+    pages are never extracted when `pages` is a lazy generator. Parsing and
+    mapping the returned pages gives exactly the mapping the whole sheet
+    would. Returns the list of page texts read.
+    """
+    answers = profile["answers"]
+    question_ids = profile["question_ids"]
+    id_questions = set(question_ids.values())
+    found = {}         # official_num -> block, as map_questions would assign it
+    found_by_id = set()
+
+    def note(user_q, found, found_by_id):
+        q_num = question_ids.get(user_q["question_id"])
+        if q_num is None:
+            _match_block(user_q["raw_block"], found, user_q)
+        elif q_num not in found_by_id:
+            # A Question ID beats any earlier pattern match
+            found_by_id.add(q_num)
+            found[q_num] = user_q
+
+    page_texts = []
+    content = ""
+    tail = 0  # where the last block, the only one that can still grow, starts
+    for page_text in pages:
+        page_texts.append(page_text)
+        content += f"--- Page {len(page_texts)} ---\n{page_text}\n\n"
+        blocks = [user_q for section in parse_response_content(content[tail:]) for user_q in section]
+        if not blocks:
+            continue
+
+        last = blocks.pop()
+        for user_q in blocks:
+            note(user_q, found, found_by_id)
+        tail = len(content) - len(last["raw_block"])
+
+        trial, trial_by_id = dict(found), set(found_by_id)
+        note(last, trial, trial_by_id)
+        if len(trial) < len(answers):
+            continue
+        # A pattern match may still lose to a Question ID further on
+        if any(q_num in id_questions and q_num not in trial_by_id for q_num in trial):
+            continue
+        if all(block_closed(last, answers[q_num]["type"]) for q_num, user_q in trial.items() if user_q is last):
+            break
+    return page_texts
+
+def extract_student_info_from_pages(page_texts):
+    """Extract student name and ID from already extracted page texts"""
+    # Read first 2 pages to find info
+    full_text = "".join(page_texts[:2])
+    
+    # Try multiple patterns for name extraction
+    name = "Unknown"
+    name_patterns = [
+        r'Participant Name\s+([A-Z\s]+?)(?=\n|Test Center|Test Date)',
+        r'Candidate Name\s*:?\s*([^\n]+)',
+        r'Name\s*:?\s*([A-Z][A-Za-z\s]+?)(?=\n|Application|\d{10})',
+        r'Student Name\s*:?\s*([^\n]+)',
+    ]
+    
+    for pattern in name_patterns:
+        name_match = re.search(pattern, full_text, re.IGNORECASE)
+        if name_match:
+            extracted = name_match.group(1).strip()
+            # Clean up common contamination
+            extracted = re.split(r'\d{2}/\d{2}/\d{2,4}|\d{10,}|Application|Test Center', extracted)[0].strip()
+            if extracted and len(extracted) > 2 and not extracted.isdigit():
+                name = extracted
+                break
+    
+    # Extract Application Number or ID
+    student_id = None
+    id_patterns = [
+        r'Participant ID\s+(\d+)',
+        r'Application Number\s*:?\s*(\d+)',
+        r'Roll Number\s*:?\s*(\d+)',
+        r'ID\s*:?\s*(\d+)',
+        r'\b(\d{10,})\b'  # Any 10+ digit number as fallback
+    ]
+    
+    for pattern in id_patterns:
+        id_match = re.search(pattern, full_text, re.IGNORECASE)
+        if id_match:
+            student_id = id_match.group(1).strip()
+            break
+    
+    student_id = id_match.group(1).strip() if id_match else None
+    
+    return name, student_id
+
+def parse_response_text(filename):
+    with open(filename, "r", encoding="utf-8") as f:
+        content = f.read()
+    return parse_response_content(content)
+
+OPTION_BITS = {"A": 1, "B": 2, "C": 4, "D": 8}
+DIGIT_OPTIONS = {"1": "A", "2": "B", "3": "C", "4": "D"}
+
+# An MCQ answer whose first character is not an option can never be right;
+# no single-option key equals this mask
+INVALID_MCQ = 0b1111
+
+def option_mask(keys):
+    """Bitmask of answer-key letters (A=1, B=2, C=4, D=8)"""
+    mask = 0
+    for key in keys:
+        mask |= OPTION_BITS[key]
+    return mask
+
+def msq_mask(chosen_keys, status=""):
+    """Bitmask of the options chosen in an MSQ response (0 when unattempted)"""
     if status == "Not Answered" or not chosen_keys or chosen_keys == "--":
         return 0
     
@@ -206,77 +490,184 @@ def calculate_msq_score(correct_keys, chosen_keys, status=""):
                     # Order broken or invalid digit - stop here
                     break
     
-    map_dict = {"1": "A", "2": "B", "3": "C", "4": "D"}
-    chosen = {map_dict.get(c.strip(), c.strip()) for c in chosen_raw if c.strip() and c.strip() in map_dict}
+    mask = 0
+    for c in chosen_raw:
+        c = c.strip()
+        if c in DIGIT_OPTIONS:
+            mask |= OPTION_BITS[DIGIT_OPTIONS[c]]
+    return mask
+
+def mcq_mask(chosen_option, status=""):
+    """Bitmask of the option chosen in an MCQ response (0 when unattempted)"""
+    if status == "Not Answered" or not chosen_option or chosen_option == "--":
+        return 0
     
+    # MCQ should only have ONE option
+    # If multiple digits (like "32"), take only the first one
+    # (The second digit is likely contamination from PDF parsing)
+    first_digit = chosen_option[0]
+    chosen = DIGIT_OPTIONS.get(first_digit, first_digit)
+    return OPTION_BITS.get(chosen, INVALID_MCQ)
+
+def nat_value(user_answer):
+    """The numeric NAT answer, or NaN when blank or unreadable (NaN never scores)"""
+    if not user_answer or user_answer == "N/A":
+        return float("nan")
+    try:
+        return float(user_answer)
+    except (TypeError, ValueError):
+        return float("nan")
+
+def nat_bounds(answer_rule):
+    """Accepted NAT interval; a single value is an interval of one"""
+    if "range" in answer_rule:
+        return answer_rule["range"][0], answer_rule["range"][1]
+    if "value" in answer_rule:
+        return answer_rule["value"], answer_rule["value"]
+    return float("inf"), float("-inf")
+
+def _msq_marks(correct, chosen):
     if not chosen: return 0
-    correct = set(correct_keys)
     
     # If any incorrect option is chosen, return -1
-    if not chosen.issubset(correct): return -1
+    if chosen & ~correct: return -1
     
     # Full marks: All correct options chosen
     if chosen == correct: return 4
     
+    n_correct = bin(correct).count("1")
+    n_chosen = bin(chosen).count("1")
+    
     # Partial marks based on official rules:
     # +3: All 4 options are correct but ONLY 3 chosen
-    if len(correct) == 4 and len(chosen) == 3: return 3
+    if n_correct == 4 and n_chosen == 3: return 3
     
     # +2: Three or more options are correct but ONLY 2 chosen (both correct)
-    if len(correct) >= 3 and len(chosen) == 2: return 2
+    if n_correct >= 3 and n_chosen == 2: return 2
     
     # +1: Two or more options are correct but ONLY 1 chosen (correct)
-    if len(correct) >= 2 and len(chosen) == 1: return 1
+    if n_correct >= 2 and n_chosen == 1: return 1
     
     # All other cases (shouldn't reach here if logic is correct)
     return -1
 
-def calculate_mcq_score(correct_key, chosen_option, status=""):
-    if status == "Not Answered" or not chosen_option or chosen_option == "--":
-        return 0
-    
-    # MCQ should only have ONE option
-    # If multiple digits (like "32"), take only the first one
-    # (The second digit is likely contamination from PDF parsing)
-    first_digit = chosen_option[0] if chosen_option else ""
-    
-    map_dict = {"1": "A", "2": "B", "3": "C", "4": "D"}
-    chosen = map_dict.get(first_digit, first_digit)
-    
-    if chosen == correct_key: return 3
+def _mcq_marks(correct, chosen):
+    if not chosen: return 0
+    if chosen == correct: return 3
     else: return -0.5
 
+# Marks for every chosen-option mask, one 16-entry table per key mask
+MSQ_MARKS = [[_msq_marks(correct, chosen) for chosen in range(16)] for correct in range(16)]
+MCQ_MARKS = [[_mcq_marks(correct, chosen) for chosen in range(16)] for correct in range(16)]
+
+def compile_answer_key(answers=OFFICIAL_ANSWERS):
+    """Precompute what scoring needs from an answer key.
+
+    Each MSQ/MCQ question gets its 16-entry marks table (chosen-option mask ->
+    marks) and each NAT question its accepted interval, so scoring a
+    response is a table index or a comparison.
+    """
+    questions = {}
+    for q_num in sorted(answers):
+        official = answers[q_num]
+        if official["type"] == "NAT":
+            questions[q_num] = {"type": "NAT", "bounds": nat_bounds(official)}
+        elif official["type"] == "MSQ":
+            questions[q_num] = {"type": "MSQ", "marks": MSQ_MARKS[option_mask(official["keys"])]}
+        else:
+            questions[q_num] = {"type": "MCQ", "marks": MCQ_MARKS[option_mask(official["key"])]}
+    return {"answers": answers, "version": answer_key_version(answers), "questions": questions}
+
+_compiled_keys = {}
+
+def compiled_key(answers=OFFICIAL_ANSWERS):
+    """compile_answer_key, remembered per answer-key content.
+
+    Keyed on answer_key_version, so a key dict edited in place is compiled
+    afresh; each compiled key holds its own copy of the answers it was
+    compiled from.
+    """
+    version = answer_key_version(answers)
+    compiled = _compiled_keys.get(version)
+    if compiled is None:
+        if len(_compiled_keys) >= 64:
+            _compiled_keys.clear()
+        compiled = _compiled_keys[version] = compile_answer_key(copy.deepcopy(answers))
+    return compiled
+
+def response_code(q_type, user_q):
+    """What scoring reads from a mapped response: the NAT value, or the
+    chosen-option mask for MSQ/MCQ. Independent of the answer key."""
+    if q_type == "NAT":
+        return nat_value(user_q["answer"])
+    if q_type == "MSQ":
+        return msq_mask(user_q["chosen_options"], user_q["status"])
+    return mcq_mask(user_q["chosen_options"], user_q["status"])
+
+def code_marks(compiled, code):
+    """Marks for an encoded response against one compiled question"""
+    if compiled["type"] == "NAT":
+        low, high = compiled["bounds"]
+        return 4 if low <= code <= high else 0
+    return compiled["marks"][code]
+
+def score_question(compiled, user_q):
+    """Marks for one mapped response against one compiled question"""
+    return code_marks(compiled, response_code(compiled["type"], user_q))
+
+def calculate_msq_score(correct_keys, chosen_keys, status=""):
+    return MSQ_MARKS[option_mask(correct_keys)][msq_mask(chosen_keys, status)]
+
+def calculate_mcq_score(correct_key, chosen_option, status=""):
+    return MCQ_MARKS[option_mask(correct_key)][mcq_mask(chosen_option, status)]
+
 def calculate_nat_score(answer_rule, user_answer):
-    if not user_answer or user_answer == "N/A": return 0
-    try:
-        val = float(user_answer)
-        if "range" in answer_rule:
-            if answer_rule["range"][0] <= val <= answer_rule["range"][1]: return 4
-        elif "value" in answer_rule:
-            if val == answer_rule["value"]: return 4
-    except: pass
-    return 0
+    low, high = nat_bounds(answer_rule)
+    return 4 if low <= nat_value(user_answer) <= high else 0
 
-def main():
-    sections = parse_response_text("response_text.txt")
-    
-    # Flatten all questions from all sections into one list
-    all_questions = []
-    for section in sections:
-        all_questions.extend(section)
-    
-    mapping = {} # official_num -> user_q_info
-    
-    # Map all questions by searching across all responses
-    # This handles cases where questions are scattered across sections
-    for q_num in range(1, 45):
-        pattern = QUESTION_PATTERNS[q_num]
-        for user_q in all_questions:
-            # Search in raw_block as well in case question text extraction was clipped
-            if re.search(pattern, user_q["raw_block"], re.IGNORECASE | re.DOTALL):
-                mapping[q_num] = user_q
-                break
+def mapped_responses(mapping):
+    """The fields scoring needs from each mapped block, without the raw text.
+
+    Small and JSON-friendly, so a parsed sheet can be stored and re-scored
+    against another answer key without extracting the PDF again.
+    """
+    return {
+        q_num: {"status": user_q["status"], "answer": user_q["answer"], "chosen_options": user_q["chosen_options"]}
+        for q_num, user_q in mapping.items()
+    }
 
+def answer_key_version(answers=OFFICIAL_ANSWERS):
+    """Short content hash of an answer key - changes whenever any key changes"""
+    canonical = json.dumps({str(q): answers[q] for q in sorted(answers)}, sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:12]
+
+def load_answer_key(path):
+    """Read an answer key saved as JSON by save_answer_key"""
+    with open(path, "r", encoding="utf-8") as f:
+        return {int(q_num): official for q_num, official in json.load(f).items()}
+
+def save_answer_key(answers, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({str(q_num): answers[q_num] for q_num in sorted(answers)}, f, indent=2)
+
+def answer_diff(old_answers, new_answers):
+    """Question numbers whose answer-key entry differs between two keys"""
+    return sorted(q_num for q_num in set(old_answers) | set(new_answers) if old_answers.get(q_num) != new_answers.get(q_num))
+
+def answer_display(official):
+    """The correct answer as shown in results ("[6.0, 6.5]", "A,B,C", "B")"""
+    if official["type"] == "NAT":
+        return f"{official.get('value', official.get('range'))}"
+    if official["type"] == "MSQ":
+        return ",".join(official["keys"])
+    return official["key"]
+
+def score_responses(mapping, answers=OFFICIAL_ANSWERS, key=None):
+    """Score mapped responses (official_num -> block) against an answer key.
+
+    `key` is the answer key already compiled by compile_answer_key, if the
+    caller has it.
+    """
     # Track scores by section
     section_scores = {
         "NAT": {"total": 0, "negative": 0, "correct": 0, "wrong": 0, "unattempted": 0},
@@ -285,67 +676,32 @@ def main():
     }
     
     results = []
+    if key is None:
+        key = compiled_key(answers)
     
-    for q_num in range(1, 45):
-        official = OFFICIAL_ANSWERS[q_num]
+    for q_num in sorted(answers):
+        official = answers[q_num]
         user_q = mapping.get(q_num)
         
         score = 0
         user_display = "N/A"
-        correct_display = ""
         status = "Not Found"
         
+        correct_display = answer_display(official)
         if user_q:
             status = user_q["status"]
             if official["type"] == "NAT":
                 user_display = user_q["answer"] if user_q["answer"] else "N/A"
-                correct_display = f"{official.get('value', official.get('range'))}"
-                score = calculate_nat_score(official, user_q["answer"])
-            elif official["type"] == "MSQ":
-                user_display = user_q["chosen_options"] if user_q["chosen_options"] else "N/A"
-                correct_display = ",".join(official["keys"])
-                score = calculate_msq_score(official["keys"], user_q["chosen_options"], status)
-            elif official["type"] == "MCQ":
+            else:
                 user_display = user_q["chosen_options"] if user_q["chosen_options"] else "N/A"
-                correct_display = official["key"]
-                score = calculate_mcq_score(official["key"], user_q["chosen_options"], status)
-        else:
-            if official["type"] == "NAT": correct_display = f"{official.get('value', official.get('range'))}"
-            elif official["type"] == "MSQ": correct_display = ",".join(official["keys"])
-            elif official["type"] == "MCQ": correct_display = official["key"]
+            score = score_question(key["questions"][q_num], user_q)
         
         # Update section statistics
         section_type = official["type"]
         section_scores[section_type]["total"] += score
-        if score > 0:
-            section_scores[section_type]["correct"] += 1
-        elif score < 0:
+        section_scores[section_type][outcome(official["type"], score, user_display if user_q else None)] += 1
+        if score < 0:
             section_scores[section_type]["negative"] += score
-            section_scores[section_type]["wrong"] += 1
-        else:
-            # Score is 0 - check if it's actually unattempted or wrong attempt
-            is_unattempted = False
-            if user_q and user_display:
-                # Check if answer was provided
-                if official["type"] == "NAT":
-                    # For NAT, if answer exists and isn't N/A or --, it was attempted but wrong
-                    if user_display not in ["N/A", "--", None, ""]:
-                        section_scores[section_type]["wrong"] += 1
-                    else:
-                        section_scores[section_type]["unattempted"] += 1
-                        is_unattempted = True
-                else:
-                    # For MSQ/MCQ, if chosen_options is -- or N/A, it's unattempted
-                    if user_display in ["N/A", "--", None, ""]:
-                        section_scores[section_type]["unattempted"] += 1
-                        is_unattempted = True
-                    else:
-                        # This shouldn't happen for MSQ/MCQ (would be negative or positive)
-                        section_scores[section_type]["unattempted"] += 1
-                        is_unattempted = True
-            else:
-                section_scores[section_type]["unattempted"] += 1
-                is_unattempted = True
             
         results.append({
             "q_num": q_num,
@@ -356,13 +712,115 @@ def main():
             "score": score
         })
     
-    # Generate report
     total_score = sum(section_scores[s]["total"] for s in section_scores)
     total_negative = sum(section_scores[s]["negative"] for s in section_scores)
     
     # Find section with most negative score
     worst_section = min(section_scores.keys(), key=lambda s: section_scores[s]["negative"])
     
+    return {
+        "total_score": total_score,
+        "total_negative": total_negative,
+        "worst_section": worst_section,
+        "section_scores": section_scores,
+        "results": results
+    }
+
+def score_against_keys(mapping, keys):
+    """Score one sheet's mapped responses against several compiled answer keys.
+
+    The first key is the baseline and is scored in full. Every response is
+    encoded once, and each further key only looks up the questions whose
+    answer differs from the baseline's - the rest keep the baseline marks.
+    Returns {"base": name, "keys": [{"name", "version", "total_score",
+    "section_scores", "delta", "questions"}, ...]}, one entry per key in the
+    order given; "questions" lists the differing questions with the score
+    under that key and its delta from the baseline.
+    """
+    codes = {}
+
+    def marks(compiled, q_num):
+        user_q = mapping.get(q_num)
+        if compiled is None or not user_q:
+            return 0
+        code_key = (q_num, compiled["type"])
+        if code_key not in codes:
+            codes[code_key] = response_code(compiled["type"], user_q)
+        return code_marks(compiled, codes[code_key])
+
+    base = keys[0]
+    base_scores = {q_num: marks(compiled, q_num) for q_num, compiled in base["questions"].items()}
+    base_sections = {"NAT": 0, "MSQ": 0, "MCQ": 0}
+    for q_num, score in base_scores.items():
+        base_sections[base["answers"][q_num]["type"]] += score
+    base_total = sum(base_sections.values())
+
+    versions = []
+    for key in keys:
+        sections = dict(base_sections)
+        questions = []
+        for q_num in answer_diff(base["answers"], key["answers"]):
+            official = key["answers"].get(q_num)
+            old_score = base_scores.get(q_num, 0)
+            score = marks(key["questions"].get(q_num), q_num)
+            if q_num in base["answers"]:
+                sections[base["answers"][q_num]["type"]] -= old_score
+            if official is not None:
+                sections[official["type"]] += score
+            questions.append({
+                "q_num": q_num,
+                "correct_ans": answer_display(official) if official else "N/A",
+                "score": score,
+                "delta": score - old_score
+            })
+        total_score = sum(sections.values())
+        versions.append({
+            "name": key.get("name", key["version"]),
+            "version": key["version"],
+            "total_score": total_score,
+            "section_scores": sections,
+            "delta": total_score - base_total,
+            "questions": questions
+        })
+
+    return {"base": versions[0]["name"], "keys": versions}
+
+def outcome(q_type, score, user_display):
+    """Classify a scored question as "correct", "wrong" or "unattempted".
+
+    A zero score counts as wrong only for a NAT that was actually answered;
+    MSQ/MCQ answers always score non-zero. user_display is None when the
+    question was not found on the sheet.
+    """
+    if score > 0:
+        return "correct"
+    if score < 0:
+        return "wrong"
+    if q_type == "NAT" and user_display not in ["N/A", "--", None, ""]:
+        return "wrong"
+    return "unattempted"
+
+def main():
+    sections = parse_response_text("response_text.txt")
+    
+    # Flatten all questions from all sections into one list
+    all_questions = []
+    for section in sections:
+        all_questions.extend(section)
+    
+    # Map all questions by searching across all responses
+    # This handles cases where questions are scattered across sections
+    mapping, mapping_stats = map_questions(all_questions)
+
+    score_data = score_responses(mapping)
+    section_scores = score_data["section_scores"]
+    results = score_data["results"]
+    
+    # Generate report
+    total_score = score_data["total_score"]
+    total_negative = score_data["total_negative"]
+    worst_section = score_data["worst_section"]
+    
     # Write to file
     with open("score_summary.txt", "w", encoding="utf-8") as f:
         f.write("="*80 + "\n")
@@ -416,6 +874,7 @@ def main():
     print(f"\nTotal Score: {total_score:.1f} / 150")
     print(f"Total Negative: {total_negative:.1f}")
     print(f"Worst Section: {worst_section} ({section_scores[worst_section]['negative']:.1f} marks)")
+    print(f"Blocks mapped by Question ID: {mapping_stats['by_id']}, by pattern fallback: {mapping_stats['by_pattern']}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+"""
+Compare every installed PDF text-extraction backend over a corpus of PDFs.
+
+For each backend this reports throughput, peak memory and how well its text
+agrees with pypdf's - page by page, and in what the scorer makes of each
+response sheet (every question's answer and the total). Pick the fastest
+backend that agrees on every sheet and set PDF_BACKEND to it.
+
+Usage: python compare_backends.py [sheet.pdf | directory ...]
+Without arguments the PDFs in this directory are used. Only documents in
+which pypdf finds answered questions count towards scoring agreement, so
+pass a folder of real response sheets to decide.
+"""
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from calculate_score import map_questions, mapped_responses, parse_response_content, score_responses
+from pdf_extraction import BACKENDS, extract_pages, format_pages
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+REFERENCE = "pypdf"
+
+def corpus_paths(args):
+    paths = []
+    for arg in args or ["."]:
+        if os.path.isdir(arg):
+            paths.extend(sorted(glob.glob(os.path.join(arg, "*.pdf"))))
+        else:
+            paths.append(arg)
+    return paths
+
+def peak_memory_mb():
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 1024 / (1024 if sys.platform == "darwin" else 1)
+
+def run_backend(backend, paths):
+    """Extract the corpus with one backend. Runs in a fresh process, so the
+    peak memory is the backend's own."""
+    if resource is None:
+        import tracemalloc
+        tracemalloc.start()
+    baseline = peak_memory_mb() if resource else 0
+
+    start = time.perf_counter()
+    texts = {path: extract_pages(path, workers=1, backend=backend) for path in paths}
+    elapsed = time.perf_counter() - start
+
+    if resource:
+        peak = peak_memory_mb() - baseline
+    else:
+        # Python allocations only; native backends are undercounted
+        peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    return elapsed, peak, texts
+
+def sheet_answers(page_texts):
+    """What the scorer reads from a sheet: every question's answer and the total"""
+    questions = [q for section in parse_response_content(format_pages(page_texts)) for q in section]
+    mapping, _ = map_questions(questions)
+    score_data = score_responses(mapped_responses(mapping))
+    answers = [(r["q_num"], r["user_ans"], r["score"]) for r in score_data["results"]]
+    answered = sum(1 for r in score_data["results"] if r["user_ans"] not in ["N/A", "--", None, ""])
+    return answered, answers, score_data["total_score"]
+
+def collapse(text):
+    return " ".join(text.split())
+
+def main():
+    paths = corpus_paths(sys.argv[1:])
+    if not paths:
+        print("No PDFs found.")
+        return
+    total_bytes = sum(os.path.getsize(path) for path in paths)
+
+    runs = {}
+    for backend in BACKENDS:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            runs[backend] = pool.submit(run_backend, backend, paths).result()
+
+    reference = runs[REFERENCE][2]
+    reference_sheets = {path: sheet_answers(pages) for path, pages in reference.items()}
+    sheets = [path for path, (answered, _, _) in reference_sheets.items() if answered > 0]
+    total_pages = sum(len(pages) for pages in reference.values())
+
+    print("="*88)
+    print("PDF BACKEND COMPARISON")
+    print(f"{len(paths)} documents, {total_pages} pages, {total_bytes / 1024 / 1024:.1f} MB; "
+          f"{len(sheets)} response sheets (reference: {REFERENCE})")
+    print("="*88)
+    print(f"{'Backend':<10} {'Time':>9} {'Pages/s':>9} {'MB/s':>7} {'Peak MB':>8} "
+          f"{'Same pages':>11} {'Same sheets':>12}")
+    print("-"*88)
+
+    agreeing = []
+    for backend, (elapsed, peak, texts) in runs.items():
+        same_pages = sum(
+            1 for path in paths
+            for page, ref_page in zip(texts[path], reference[path])
+            if collapse(page) == collapse(ref_page)
+        )
+        same_sheets = sum(1 for path in sheets if sheet_answers(texts[path]) == reference_sheets[path])
+        if same_sheets == len(sheets):
+            agreeing.append((elapsed, backend))
+        print(f"{backend:<10} {elapsed*1000:>7.0f}ms {total_pages / elapsed:>9.1f} "
+              f"{total_bytes / 1024 / 1024 / elapsed:>7.2f} {peak:>8.1f} "
+              f"{same_pages:>5}/{total_pages:<5} {same_sheets:>5}/{len(sheets):<6}")
+
+    print("-"*88)
+    for path in sheets:
+        differ = [backend for backend, (_, _, texts) in runs.items() if sheet_answers(texts[path]) != reference_sheets[path]]
+        if differ:
+            print(f"{os.path.basename(path)}: scored differently by {', '.join(differ)}")
+    if not sheets:
+        print("No response sheets in the corpus - scoring agreement was not tested.")
+    else:
+        fastest = min(agreeing)[1]
+        print(f"Fastest backend that scores every sheet like {REFERENCE}: {fastest} (PDF_BACKEND={fastest})")
+    print("="*88)
+
+if __name__ == "__main__":
+    main()
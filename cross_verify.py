@@ -8,13 +8,7 @@ all_questions = []
 for section in sections:
     all_questions.extend(section)
 
-mapping = {}
-for q_num in range(1, 45):
-    pattern = QUESTION_PATTERNS[q_num]
-    for user_q in all_questions:
-        if re.search(pattern, user_q['raw_block'], re.IGNORECASE | re.DOTALL):
-            mapping[q_num] = user_q
-            break
+mapping, _ = map_questions(all_questions)
 
 # Check specific critical questions
 print("="*80)
@@ -0,0 +1,212 @@
+"""
+PDF text extraction: pluggable backends, fanned out over a process pool for
+long documents.
+
+pypdf is always available and is the reference: QUESTION_PATTERNS and the
+sheet parser were written against its output. pdfminer.six, PyMuPDF and
+pypdfium2 are used when installed and selected with PDF_BACKEND; their text
+is normalised towards pypdf's (see normalize_text). compare_backends.py
+measures speed, memory and scoring agreement of every installed backend.
+
+pypdf's extract_text() is pure Python and CPU-bound, so a long sheet keeps one
+core busy while the others idle. Documents with at least
+PDF_PARALLEL_MIN_PAGES pages are split into contiguous page ranges; each
+worker opens its own copy of the PDF and extracts its range, and the text is
+put back together in page order. Shorter documents, and machines with a single
+core, are extracted serially - starting workers and re-reading the PDF in each
+of them costs more than it saves there (see benchmark_extraction.py).
+"""
+import io
+import multiprocessing
+import os
+import re
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+
+from pypdf import PdfReader
+
+try:
+    from pdfminer.converter import TextConverter
+    from pdfminer.layout import LAParams
+    from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+    from pdfminer.pdfpage import PDFPage
+except ImportError:
+    PDFPage = None
+
+try:
+    import pymupdf
+except ImportError:
+    pymupdf = None
+
+try:
+    import pypdfium2
+except ImportError:
+    pypdfium2 = None
+
+PARALLEL_MIN_PAGES = int(os.environ.get("PDF_PARALLEL_MIN_PAGES", "16"))
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", "0")) or os.cpu_count() or 1
+PDF_BACKEND = os.environ.get("PDF_BACKEND", "pypdf")
+
+# pdfium marks a word hyphenated across a line break with U+FFFE
+_SOFT_HYPHEN_BREAK = re.compile("[\ufffe\x02]")
+
+def normalize_text(text):
+    """Bring another backend's page text into the shape pypdf produces.
+
+    Compatibility forms are folded (ligatures, non-breaking spaces), line
+    endings become newlines, form feeds are dropped and pdfium's hyphenation
+    marks become the "-" + newline pypdf keeps.
+    """
+    text = unicodedata.normalize("NFKC", text)
+    text = text.replace("\r\n", "\n").replace("\r", "\n").replace("\x0c", "")
+    return _SOFT_HYPHEN_BREAK.sub("-\n", text)
+
+# Each backend opens PDF bytes and returns (page count, function extracting
+# the text of page i, function closing the document). PyMuPDF and pypdfium2
+# hold native handles that are only released by closing.
+
+def _no_close():
+    pass
+
+def _open_pypdf(pdf_bytes):
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    return len(reader.pages), lambda i: reader.pages[i].extract_text() or "", _no_close
+
+def _open_pdfminer(pdf_bytes):
+    pages = list(PDFPage.get_pages(io.BytesIO(pdf_bytes)))
+    resources = PDFResourceManager()
+
+    def page_text(i):
+        out = io.StringIO()
+        device = TextConverter(resources, out, laparams=LAParams())
+        PDFPageInterpreter(resources, device).process_page(pages[i])
+        device.close()
+        return normalize_text(out.getvalue())
+    return len(pages), page_text, _no_close
+
+def _open_pymupdf(pdf_bytes):
+    document = pymupdf.open(stream=pdf_bytes, filetype="pdf")
+    return document.page_count, lambda i: normalize_text(document[i].get_text()), document.close
+
+def _open_pypdfium2(pdf_bytes):
+    document = pypdfium2.PdfDocument(pdf_bytes)
+
+    def page_text(i):
+        page = document[i]
+        textpage = page.get_textpage()
+        try:
+            return normalize_text(textpage.get_text_range())
+        finally:
+            textpage.close()
+            page.close()
+    return len(document), page_text, document.close
+
+BACKENDS = {"pypdf": _open_pypdf}
+if PDFPage is not None:
+    BACKENDS["pdfminer"] = _open_pdfminer
+if pymupdf is not None:
+    BACKENDS["pymupdf"] = _open_pymupdf
+if pypdfium2 is not None:
+    BACKENDS["pypdfium2"] = _open_pypdfium2
+
+def _get_backend(name):
+    name = name or PDF_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"PDF backend '{name}' is not available (installed: {', '.join(BACKENDS)})")
+    return BACKENDS[name]
+
+# Worker processes are started from a clean process, never forked from the
+# caller: the web backend runs threads (answer-key poller, job and write-behind
+# workers), and forking a threaded process can deadlock. forkserver where the
+# platform has it, spawn elsewhere (Windows).
+POOL_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+_pool = None
+_pool_workers = 0
+
+def _get_pool(workers):
+    """One pool per process, created on first use and kept for later documents"""
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=POOL_CONTEXT)
+        _pool_workers = workers
+    return _pool
+
+def _extract_range(pdf_bytes, first, last, backend):
+    """Worker: extract pages first..last-1 from the PDF bytes"""
+    _, page_text, close = _get_backend(backend)(pdf_bytes)
+    try:
+        return [page_text(i) for i in range(first, last)]
+    finally:
+        close()
+
+def _read_bytes(source):
+    if isinstance(source, bytes):
+        return source
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return f.read()
+    source.seek(0)
+    return source.read()
+
+def _page_ranges(page_count, workers):
+    # Twice as many ranges as workers so one slow range does not hold up the rest
+    size = max(1, -(-page_count // (workers * 2)))
+    return [(first, min(first + size, page_count)) for first in range(0, page_count, size)]
+
+def _iter_serial(page_count, page_text, close):
+    try:
+        for i in range(page_count):
+            yield page_text(i)
+    finally:
+        # Exhausted, or closed by a caller that stopped early
+        close()
+
+def _iter_parallel(pdf_bytes, page_count, workers, backend):
+    pool = _get_pool(workers)
+    futures = [pool.submit(_extract_range, pdf_bytes, first, last, backend) for first, last in _page_ranges(page_count, workers)]
+    try:
+        for future in futures:
+            yield from future.result()
+    finally:
+        # The caller may stop early; drop the ranges nobody will read
+        for future in futures:
+            future.cancel()
+
+def open_pages(source, workers=None, min_pages=None, backend=None):
+    """Open a PDF (path, bytes or file object) for page-by-page extraction.
+
+    Returns (page count, iterator over page texts in page order). Pages are
+    extracted lazily when serial; in parallel, ranges are extracted ahead and
+    the ones not yet started are cancelled if the iterator is closed early.
+    The document is closed when the iterator is exhausted or closed, so a
+    caller that stops early must close it. `backend` defaults to PDF_BACKEND.
+    """
+    workers = workers or PDF_WORKERS
+    min_pages = PARALLEL_MIN_PAGES if min_pages is None else min_pages
+    backend = backend or PDF_BACKEND
+
+    pdf_bytes = _read_bytes(source)
+    page_count, page_text, close = _get_backend(backend)(pdf_bytes)
+    if workers < 2 or page_count < max(min_pages, 2):
+        return page_count, _iter_serial(page_count, page_text, close)
+    # Each worker opens its own copy; this one was only needed for the count
+    close()
+    return page_count, _iter_parallel(pdf_bytes, page_count, workers, backend)
+
+def extract_pages(source, workers=None, min_pages=None, backend=None):
+    """Text of every page, in page order"""
+    _, pages = open_pages(source, workers, min_pages, backend)
+    return list(pages)
+
+def format_pages(page_texts):
+    """Join page texts with the `--- Page N ---` markers the parser expects"""
+    content = ""
+    for i, page_text in enumerate(page_texts):
+        content += f"--- Page {i+1} ---\n"
+        content += page_text
+        content += "\n\n"
+    return content
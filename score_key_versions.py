@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""
+Score one response sheet against several answer keys in one pass.
+
+The sheet is extracted, parsed and mapped once; every key after the first is
+scored only on the questions where it differs from the first (see
+calculate_score.score_against_keys). Useful for "draft vs final" and for
+"what if my challenge is accepted" - save the challenged key as JSON with
+calculate_score.save_answer_key and pass it as one more key.
+
+Usage: python score_key_versions.py [sheet.pdf | response_text.txt] [key.pdf | key.json ...]
+Defaults: response_text.txt, scored against the draft key, both final key
+PDFs and OFFICIAL_ANSWERS.
+"""
+import os
+import sys
+import time
+
+from answer_keys import BUILTIN, load_key_file
+from calculate_score import (
+    OFFICIAL_ANSWERS,
+    compile_answer_key,
+    map_questions,
+    mapped_responses,
+    parse_response_content,
+    score_against_keys
+)
+from pdf_extraction import extract_pages, format_pages
+
+DEFAULT_KEYS = ["CEED2026_draftAnswerkey.pdf", "CEED_2026_Answer_Key.pdf", "CEED_2026_Answer_Key (1).pdf"]
+
+def load_sheet(path):
+    if path.lower().endswith(".pdf"):
+        return format_pages(extract_pages(path))
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+def main():
+    sheet = sys.argv[1] if len(sys.argv) > 1 else "response_text.txt"
+    key_paths = sys.argv[2:] or [path for path in DEFAULT_KEYS if os.path.exists(path)]
+
+    keys = [dict(compile_answer_key(load_key_file(path)), name=os.path.basename(path)) for path in key_paths]
+    if not sys.argv[2:]:
+        keys.append(dict(compile_answer_key(OFFICIAL_ANSWERS), name=BUILTIN))
+
+    questions = [q for section in parse_response_content(load_sheet(sheet)) for q in section]
+    mapping, _ = map_questions(questions)
+    responses = mapped_responses(mapping)
+
+    start = time.perf_counter()
+    comparison = score_against_keys(responses, keys)
+    elapsed = time.perf_counter() - start
+
+    print("="*80)
+    print(f"SCORES BY ANSWER KEY: {sheet}")
+    print("="*80)
+    print(f"{'Key':<32} {'Version':<14} {'Total':>7} {'NAT':>6} {'MSQ':>6} {'MCQ':>6} {'Delta':>7}")
+    print("-"*80)
+    for key in comparison["keys"]:
+        sections = key["section_scores"]
+        print(f"{key['name']:<32} {key['version']:<14} {key['total_score']:>7.1f} {sections['NAT']:>6.1f} "
+              f"{sections['MSQ']:>6.1f} {sections['MCQ']:>6.1f} {key['delta']:>+7.1f}")
+
+    print("-"*80)
+    print(f"Questions that differ from {comparison['base']}:")
+    for key in comparison["keys"][1:]:
+        if not key["questions"]:
+            print(f"  {key['name']}: none")
+            continue
+        for q in key["questions"]:
+            print(f"  {key['name']}: Q{q['q_num']} correct {q['correct_ans']}, score {q['score']:.1f} ({q['delta']:+.1f})")
+    print(f"\nScored against {len(keys)} keys in {elapsed*1000:.2f}ms")
+    print("="*80)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Synthetic CEED 2026 response-sheet text for benchmarks and parser checks.
+
+The layout mirrors what pypdf pulls out of a digialm response sheet: a
+candidate header, three sections whose question numbering restarts at Q.1,
+page markers and the timestamp/URL footer noise on every page.
+"""
+import random
+import re
+
+from calculate_score import OFFICIAL_ANSWERS, QUESTION_PATTERNS
+
+FOOTER = "1/20/26, 11:24 AM cdn.digialm.com//per/g01/pub/756/touchstone/AssessmentQPHTMLMode1/CEED2026.html"
+QUESTIONS_PER_PAGE = 4
+QUESTION_ID_BASE = 6307260000
+
+def question_phrase(q_num):
+    """Turn a QUESTION_PATTERNS regex into plain text that it matches"""
+    phrase = QUESTION_PATTERNS[q_num]
+    phrase = phrase.replace(r"\s+", " ").replace(r"\s*", "")
+    return re.sub(r"\\(.)", r"\1", phrase)
+
+def question_id(q_num):
+    return str(QUESTION_ID_BASE + q_num)
+
+def random_answers(rng):
+    """Random responses: mostly answered and mostly right, some blank, some wrong"""
+    answers = {}
+    for q_num, official in OFFICIAL_ANSWERS.items():
+        if rng.random() < 0.2:
+            answers[q_num] = None
+            continue
+        correct = rng.random() < 0.6
+        if official["type"] == "NAT":
+            low, high = official.get("range", [official.get("value")] * 2)
+            value = rng.uniform(low, high) if correct else high + rng.randint(1, 5)
+            answers[q_num] = f"{value:.2f}".rstrip("0").rstrip(".")
+        elif official["type"] == "MSQ":
+            keys = [str("ABCD".index(k) + 1) for k in official["keys"]]
+            if correct:
+                options = rng.sample(keys, rng.randint(1, len(keys)))
+            else:
+                options = rng.sample("1234", rng.randint(1, 3))
+            answers[q_num] = ",".join(sorted(options))
+        else:
+            key = str("ABCD".index(official["key"]) + 1)
+            answers[q_num] = key if correct else str(rng.randint(1, 4))
+    return answers
+
+# Odd values seen in (or plausible for) extracted sheets, to exercise scoring
+# edge cases
+_ODD_CHOICES = ["--", "", None, "1, 3", "241", "31", "A", "x2", "1,5", "4321", "12 3"]
+_ODD_NAT = ["--", "", None, "N/A", " 7 ", "abc", "1e3", "nan", "-0", "12.50"]
+_STATUSES = ["Answered", "Not Answered", "Marked For Review", ""]
+
+def random_responses(rng, odd=0.1, missing=0.02):
+    """Random per-question responses in the shape mapped_responses returns.
+
+    A fraction `odd` of the responses are malformed or unusual values and
+    `missing` of the questions are left out, as if not found on the sheet.
+    """
+    responses = {}
+    for q_num, answer in random_answers(rng).items():
+        if rng.random() < missing:
+            continue
+        q_type = OFFICIAL_ANSWERS[q_num]["type"]
+        if rng.random() < odd:
+            answer = rng.choice(_ODD_NAT if q_type == "NAT" else _ODD_CHOICES)
+            status = rng.choice(_STATUSES)
+        else:
+            status = "Answered" if answer else "Not Answered"
+            if not answer and q_type != "NAT":
+                answer = "--"
+        responses[q_num] = {
+            "status": status,
+            "answer": answer if q_type == "NAT" else None,
+            "chosen_options": answer if q_type != "NAT" else None,
+        }
+    return responses
+
+def _question_block(local_num, q_num, answer, filler):
+    official = OFFICIAL_ANSWERS[q_num]
+    lines = [f"Q.{local_num} {question_phrase(q_num)} {filler}"]
+    if official["type"] == "NAT":
+        lines.append(f"Given Answer : {answer if answer else '--'}")
+    elif "Options" in QUESTION_PATTERNS[q_num]:
+        lines.append("2. \n3. \n4. ")
+    else:
+        lines.append("Options 1. \n2. \n3. \n4. ")
+    lines.append(f"Question ID : {question_id(q_num)}")
+    lines.append(f"Question Type : {'SA' if official['type'] == 'NAT' else official['type']}")
+    if official["type"] != "NAT":
+        for option in range(1, 5):
+            lines.append(f"Option {option} ID : {question_id(q_num)}{option}")
+    lines.append(f"Status : {'Answered' if answer else 'Not Answered'}")
+    if official["type"] != "NAT":
+        lines.append(f"Chosen Option : {answer if answer else '--'}")
+    return "\n".join(lines)
+
+def make_pages(seed=0, repeat=1, answers=None):
+    """Build the page texts of one synthetic sheet.
+
+    `repeat` writes the three sections that many times over, which is how the
+    10x-sized benchmark inputs are produced.
+    """
+    rng = random.Random(seed)
+    if answers is None:
+        answers = random_answers(rng)
+    filler = "Refer to the image shown below and choose accordingly."
+
+    blocks = []
+    for _ in range(repeat):
+        for first, last in [(1, 8), (9, 18), (19, 44)]:
+            for q_num in range(first, last + 1):
+                blocks.append(_question_block(q_num - first + 1, q_num, answers.get(q_num), filler))
+
+    header = (
+        "Participant ID 2026001234\n"
+        "Participant Name SAMPLE CANDIDATE\n"
+        "Test Center Name DIGITAL EXAM CENTRE\n"
+        "Test Date 18/01/2026\n"
+        "Subject CEED 2026 PART A\n"
+    )
+    pages = []
+    for i in range(0, len(blocks), QUESTIONS_PER_PAGE):
+        text = "\n".join(blocks[i:i + QUESTIONS_PER_PAGE])
+        if i == 0:
+            text = header + text
+        pages.append(text + "\n" + FOOTER)
+    return pages
+
+def make_response_text(seed=0, repeat=1, answers=None):
+    """The sheet as one string, with the `--- Page N ---` markers extract_all.py writes"""
+    content = ""
+    for i, page_text in enumerate(make_pages(seed, repeat, answers)):
+        content += f"--- Page {i+1} ---\n"
+        content += page_text
+        content += "\n\n"
+    return content
@@ -0,0 +1,72 @@
+import os
+import sys
+
+import pytest
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [root_dir, os.path.join(root_dir, "webapp", "backend")]
+
+@pytest.fixture(scope="session")
+def app_module(tmp_path_factory):
+    """The Flask app module, storing scores in a local SQLite file
+    (SCORE_SPOOL) instead of Supabase"""
+    os.environ.update({
+        "SUPABASE_URL": "",
+        "SUPABASE_KEY": "",
+        "SCORE_SPOOL": str(tmp_path_factory.mktemp("app") / "scores.db"),
+        "EXPORT_TOKEN": "export-token",
+        "SCORE_WRITE_INTERVAL_MS": "50",
+        "SCORE_SYNC_SECONDS": "0.05",
+    })
+    import app
+    return app
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+@pytest.fixture
+def scored_row(app_module):
+    """A function giving the scores table row of a synthetic sheet for
+    (seed, student_id), scored with the active key"""
+    from sheet_parsing import parse_sheet
+    from synthetic_sheet import make_response_text
+
+    def scored_row(seed, student_id):
+        responses, mapping_stats = parse_sheet(make_response_text(seed=seed))
+        parsed = {"name": "SAMPLE CANDIDATE", "student_id": student_id, "pages": 3,
+                  "responses": {str(q): r for q, r in responses.items()}, "mapping_stats": mapping_stats}
+        result = app_module.score_parsed(parsed, app_module.answer_key_registry.active(), {})
+        return app_module.score_row(result)
+    return scored_row
+
+@pytest.fixture
+def sheet_pdf(app_module, monkeypatch):
+    """Uploads parsed from synthetic sheet text instead of a PDF (no PDF
+    library needed): returns a function giving the "PDF" bytes of a sheet
+    for (seed, student_id). Other bytes fail to parse, like a broken PDF.
+    The bulk pool runs in threads so the fake parser reaches it."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    from sheet_parsing import parse_sheet
+    from synthetic_sheet import make_response_text
+
+    def parse_upload(pdf_bytes, timings, workers=None):
+        header, _, seed = pdf_bytes.decode("utf-8", "replace").partition("\n")
+        if not header.startswith("%SHEET "):
+            raise ValueError("Could not read the PDF")
+        responses, mapping_stats = parse_sheet(make_response_text(seed=int(seed)), timings)
+        return {"name": "SAMPLE CANDIDATE", "student_id": header.split(" ", 1)[1], "pages": 3,
+                "pages_skipped": 0, "responses": {str(q): r for q, r in responses.items()},
+                "mapping_stats": mapping_stats}
+
+    def parse_member(pdf_bytes):
+        timings = {}
+        return parse_upload(pdf_bytes, timings, workers=1), timings
+
+    pool = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(app_module, "parse_upload", parse_upload)
+    monkeypatch.setattr(app_module, "parse_member", parse_member)
+    monkeypatch.setattr(app_module, "get_bulk_pool", lambda: pool)
+    yield lambda seed, student_id: f"%SHEET {student_id}\n{seed}".encode("utf-8")
+    pool.shutdown()
@@ -0,0 +1,84 @@
+import csv
+import io
+
+import pytest
+
+from export import iter_export, resume_point
+from score_store import SqliteScores
+
+def stored_row(student_id, name, answer):
+    return {
+        "student_id": student_id, "name": name,
+        "total_score": 10, "nat_score": 4, "msq_score": 3, "mcq_score": 3,
+        "section_details": {"NAT Section": {"correct": 1, "wrong": 0, "unattempted": 0}},
+        "question_details": {"Q1": {"score": 4, "student_answer": answer}},
+        "updated_at": "2026-03-01T00:00:00"
+    }
+
+@pytest.fixture
+def store(tmp_path):
+    store = SqliteScores(str(tmp_path / "scores.db"))
+    store.upsert([
+        stored_row("s1", "Plain", "6.2"),
+        # Extracted text can carry newlines into a name or a NAT answer
+        stored_row("s2", "Two\nLines", "6.\n2"),
+        stored_row("s3", "Quote \"Q\"", "7"),
+    ])
+    return store
+
+def record_ends(text):
+    """Offsets just past each complete CSV record (header first)"""
+    ends = []
+    buffer = io.StringIO(text, newline="")
+    reader = csv.reader(buffer)
+    for _ in reader:
+        ends.append(buffer.tell())
+    return ends
+
+@pytest.mark.parametrize("flatten", [False, True])
+def test_csv_resumes_after_a_row_with_a_multi_line_field(store, tmp_path, flatten):
+    full = "".join(iter_export(store, "csv", flatten))
+    assert "Two\nLines" in full
+    ids = [None, 1, 2, 3]
+    ends = record_ends(full)
+
+    path = tmp_path / "scores.csv"
+    for cut in range(len(full)):
+        path.write_bytes(full[:cut].encode("utf-8"))
+        complete = [i for i, end in enumerate(ends) if end <= cut]
+        expected = (ids[complete[-1]] or 0) if complete else 0
+
+        assert resume_point(str(path), "csv") == expected, cut
+        kept = path.read_bytes().decode("utf-8")
+        assert kept == full[:ends[complete[-1]] if complete else 0]
+
+        # Appending the rest gives the export an uninterrupted run writes
+        rest = "".join(iter_export(store, "csv", flatten, after=expected, header=not kept))
+        assert kept + rest == full
+
+def test_jsonl_resumes_after_the_last_complete_line(store, tmp_path):
+    full = "".join(iter_export(store, "jsonl"))
+    lines = full.splitlines(keepends=True)
+    path = tmp_path / "scores.jsonl"
+    path.write_text(lines[0] + lines[1] + lines[2][:10])
+
+    assert resume_point(str(path), "jsonl") == 2
+    assert path.read_text() + "".join(iter_export(store, "jsonl", after=2)) == full
+
+def test_export_needs_the_token(client, app_module, monkeypatch):
+    assert client.get("/api/export").status_code == 401
+    assert client.get("/api/export", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get("/api/export", headers={"Authorization": "Bearer export-tokén"}).status_code == 401
+    assert client.get("/api/export", headers={"Authorization": "export-token"}).status_code == 401
+
+    response = client.get("/api/export?format=jsonl", headers={"Authorization": "Bearer export-token"})
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+
+    monkeypatch.setattr(app_module, "EXPORT_TOKEN", None)
+    assert client.get("/api/export", headers={"Authorization": "Bearer export-token"}).status_code == 403
+
+def test_export_rejects_bad_arguments(client):
+    headers = {"Authorization": "Bearer export-token"}
+    assert client.get("/api/export?format=xml", headers=headers).status_code == 400
+    assert client.get("/api/export?after=abc", headers=headers).status_code == 400
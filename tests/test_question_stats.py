@@ -0,0 +1,44 @@
+import time
+
+def expected_stats(app_module):
+    """Students, attempts and mean marks per question, straight from the stored rows"""
+    rows = [row for rows in app_module.score_store.iter_rows(100, "student_id, question_details") for row in rows]
+    expected = {}
+    for q_num in app_module.question_stats.q_nums:
+        details = [row["question_details"][f"Q{q_num}"] for row in rows]
+        expected[q_num] = {
+            "attempted": sum(1 for q in details if q["student_answer"] not in ["--", "N/A", None, ""]),
+            "mean_marks": round(sum(q["score"] for q in details) / len(rows), 3)
+        }
+    return len(rows), expected
+
+def served_stats(client):
+    summary = client.get("/api/questions/stats").get_json()
+    return summary["students"], {
+        q["q_num"]: {"attempted": q["attempted"], "mean_marks": q["mean_marks"]} for q in summary["questions"]
+    }
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+def test_stats_include_rows_written_by_another_worker(client, app_module, scored_row):
+    # Written straight to the store, as another worker would
+    app_module.score_store.upsert([scored_row(seed, f"stats-{seed}") for seed in range(3)])
+    assert wait_for(lambda: served_stats(client) == expected_stats(app_module))
+    students, _ = served_stats(client)
+    assert students >= 3
+
+    # A re-upload replaces the student's answers instead of adding to them
+    app_module.score_store.upsert([scored_row(7, "stats-0")])
+    assert wait_for(lambda: served_stats(client) == expected_stats(app_module))
+    assert served_stats(client)[0] == students
+
+def test_stats_of_one_question(client):
+    response = client.get("/api/questions/stats?q=Q17")
+    assert response.status_code == 200
+    assert [q["q_num"] for q in response.get_json()["questions"]] == [17]
+    assert "max-age" in response.headers["Cache-Control"]
+    assert client.get("/api/questions/stats?q=99").status_code == 404
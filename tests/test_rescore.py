@@ -0,0 +1,162 @@
+import copy
+import threading
+import time
+
+from calculate_score import OFFICIAL_ANSWERS
+from distribution import ScoreDistribution
+from rescore import rescore_all, rescore_row, stored_response
+from score_store import SqliteScores
+from store_sync import keep_in_sync, store_timestamp
+
+MCQ = next(q for q, official in OFFICIAL_ANSWERS.items() if official["type"] == "MCQ")
+OTHER_KEY = "ABCD".replace(OFFICIAL_ANSWERS[MCQ]["key"], "")[0]
+
+def stored_row(row_id, answer, status="Answered", updated_at="2026-03-01T00:00:00"):
+    official = OFFICIAL_ANSWERS[MCQ]["key"]
+    score = 3 if answer == "ABCD"[ord(official) - ord("A")] else -0.5
+    return {
+        "id": row_id, "nat_score": 0, "msq_score": 0, "mcq_score": score,
+        "section_details": {"MCQ Section": {"score": score, "correct": int(score > 0), "wrong": int(score < 0), "unattempted": 0}},
+        "question_details": {f"Q{MCQ}": {"type": "MCQ", "status": status, "student_answer": answer,
+                                         "correct_answer": official, "score": score}},
+        "updated_at": updated_at
+    }
+
+class Query:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def select(self, columns):
+        return self
+
+    def gt(self, column, value):
+        return Query([row for row in self.rows if row[column] > value])
+
+    def order(self, column):
+        return Query(sorted(self.rows, key=lambda row: row[column]))
+
+    def limit(self, n):
+        return Query(self.rows[:n])
+
+    def execute(self):
+        return type("Result", (), {"data": copy.deepcopy(self.rows)})()
+
+class FakeSupabase:
+    """The scores table and the rescore_scores function, in memory"""
+    def __init__(self, rows):
+        self.rows = {row["id"]: row for row in rows}
+        self.calls = []
+
+    def table(self, name):
+        return Query(list(self.rows.values()))
+
+    def rpc(self, name, params):
+        self.calls.append(len(params["rows"]))
+        updated = []
+        for new in params["rows"]:
+            row = self.rows[new["id"]]
+            if row["updated_at"] == new["read_updated_at"]:
+                row.update({k: v for k, v in new.items() if k != "read_updated_at"})
+                updated.append(new["id"])
+        return Query(updated)
+
+def test_status_is_carried_into_the_rescore():
+    assert stored_response({"status": "Not Answered", "student_answer": "1"})["status"] == "Not Answered"
+    # Rows stored before the status was kept
+    assert stored_response({"student_answer": "N/A"}) == {"status": "", "answer": None, "chosen_options": None}
+
+    new_answers = {**OFFICIAL_ANSWERS, MCQ: {"type": "MCQ", "key": OTHER_KEY}}
+    answered = rescore_row(stored_row(1, OTHER_KEY), [MCQ], new_answers)
+    not_answered = rescore_row(stored_row(2, OTHER_KEY, "Not Answered"), [MCQ], new_answers)
+    assert answered["question_details"][f"Q{MCQ}"]["score"] == 3
+    assert not_answered["question_details"][f"Q{MCQ}"]["score"] == 0
+    assert not_answered["question_details"][f"Q{MCQ}"]["status"] == "Not Answered"
+
+def test_each_page_is_written_back_in_one_call():
+    client = FakeSupabase([stored_row(i, OTHER_KEY) for i in range(1, 8)])
+    new_answers = {**OFFICIAL_ANSWERS, MCQ: {"type": "MCQ", "key": OTHER_KEY}}
+
+    stats = rescore_all(client, OFFICIAL_ANSWERS, new_answers, page_size=3)
+    assert client.calls == [3, 3, 1]
+    assert (stats["rows_read"], stats["rows_updated"], stats["rows_skipped"]) == (7, 7, 0)
+    assert all(row["total_score"] == 3 for row in client.rows.values())
+
+def test_row_written_since_it_was_read_is_skipped():
+    client = FakeSupabase([stored_row(1, OTHER_KEY), stored_row(2, OTHER_KEY)])
+    new_answers = {**OFFICIAL_ANSWERS, MCQ: {"type": "MCQ", "key": OTHER_KEY}}
+    rpc = client.rpc
+    def reupload_then_rpc(name, params):
+        # The student of row 2 re-uploads between the read and the write
+        client.rows[2]["updated_at"] = "2026-03-02T00:00:00"
+        return rpc(name, params)
+    client.rpc = reupload_then_rpc
+
+    stats = rescore_all(client, OFFICIAL_ANSWERS, new_answers)
+    assert (stats["rows_updated"], stats["rows_skipped"]) == (1, 1)
+    assert client.rows[2]["mcq_score"] == -0.5
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+def sync_distribution(store, distribution, stop):
+    return keep_in_sync("Test distribution", distribution,
+                        lambda: store.iter_rows(100, "id, student_id, total_score, updated_at"),
+                        lambda since: store.iter_changed(since, 100, "id, student_id, total_score, updated_at"),
+                        store.version, poll_seconds=0.02, stop=stop)
+
+def test_version_bump_rebuilds_the_distribution(tmp_path):
+    store = SqliteScores(str(tmp_path / "scores.db"))
+    row = {"student_id": "s1", "name": "A", "total_score": 10, "nat_score": 10,
+           "msq_score": 0, "mcq_score": 0}
+    store.upsert([row])
+    distribution = ScoreDistribution(0, 150)
+    stop = threading.Event()
+    thread = sync_distribution(store, distribution, stop)
+    try:
+        assert wait_for(lambda: distribution.student_score("s1") == 10)
+
+        # A job writing around the servers, then bumping the version
+        store.upsert([dict(row, total_score=20, nat_score=20)])
+        store.bump_version()
+        assert wait_for(lambda: distribution.store_version == 1)
+        assert distribution.student_score("s1") == 20
+    finally:
+        stop.set()
+        thread.join()
+
+def test_rows_written_elsewhere_are_applied_without_a_rebuild(tmp_path):
+    store = SqliteScores(str(tmp_path / "scores.db"))
+    row = {"student_id": "s1", "name": "A", "total_score": 10, "nat_score": 10,
+           "msq_score": 0, "mcq_score": 0}
+    store.upsert([row])
+    distribution = ScoreDistribution(0, 150)
+    rebuilds = []
+    rebuild = distribution.rebuild
+    distribution.rebuild = lambda pages, version: rebuilds.append(version) or rebuild(pages, version)
+    stop = threading.Event()
+    thread = sync_distribution(store, distribution, stop)
+    try:
+        assert wait_for(lambda: distribution.student_score("s1") == 10)
+
+        # Another worker writing a new student and re-scoring one
+        store.upsert([dict(row, student_id="s2", total_score=30), dict(row, total_score=20)])
+        assert wait_for(lambda: distribution.student_score("s2") == 30)
+        assert distribution.student_score("s1") == 20
+        assert distribution.rank(30)["count"] == 2
+        assert rebuilds == [0]
+    finally:
+        stop.set()
+        thread.join()
+
+def test_changed_rows_page_past_equal_timestamps(tmp_path):
+    store = SqliteScores(str(tmp_path / "scores.db"))
+    store.upsert([{"student_id": f"s{i}", "name": "A", "total_score": i, "nat_score": i,
+                   "msq_score": 0, "mcq_score": 0} for i in range(5)])
+    pages = list(store.iter_changed(0, 2, "student_id, total_score"))
+    assert [len(rows) for rows in pages] == [2, 2, 1]
+    assert [row["student_id"] for rows in pages for row in rows] == [f"s{i}" for i in range(5)]
+    latest = max(store_timestamp(row["updated_at"]) for rows in pages for row in rows)
+    assert list(store.iter_changed(latest, 2, "student_id")) == []
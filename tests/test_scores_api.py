@@ -0,0 +1,119 @@
+import time
+
+from calculate_score import OFFICIAL_ANSWERS
+from distribution import ScoreDistribution
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+def stored_totals(app_module):
+    return app_module.score_store.total_scores()
+
+def synced(client, app_module):
+    """The workers' in-memory distribution holds every stored row"""
+    return client.get("/api/distribution").get_json()["count"] == len(stored_totals(app_module))
+
+def test_distribution_counts_every_stored_score(client, app_module, scored_row):
+    app_module.score_store.upsert([scored_row(seed, f"dist-{seed}") for seed in range(4)])
+    assert wait_for(lambda: synced(client, app_module))
+
+    totals = stored_totals(app_module)
+    summary = client.get("/api/distribution?bin=10").get_json()
+    assert summary["bin_width"] == 10
+    assert sum(b["count"] for b in summary["bins"]) == len(totals)
+    assert (summary["min"], summary["max"]) == (min(totals), max(totals))
+    assert summary["mean"] == round(sum(totals) / len(totals), 2)
+    for b in summary["bins"]:
+        assert b["count"] == sum(1 for t in totals if b["low"] <= t < b["high"])
+
+def test_distribution_rejects_bad_bins(client):
+    for width in ["abc", "0", "0.1", "-5", "nan", "inf"]:
+        assert client.get(f"/api/distribution?bin={width}").status_code == 400
+
+def test_rank_of_a_student_and_of_a_score(client, app_module, scored_row):
+    row = scored_row(11, "rank-1")
+    app_module.score_store.upsert([row])
+    assert wait_for(lambda: synced(client, app_module))
+
+    totals = stored_totals(app_module)
+    rank = client.get("/api/rank/rank-1").get_json()
+    assert rank["student_id"] == "rank-1"
+    assert rank["rank"] == 1 + sum(1 for t in totals if t > row["total_score"])
+    assert rank["count"] == len(totals)
+    by_score = client.get(f"/api/rank?score={row['total_score']}").get_json()
+    assert by_score["rank"] == rank["rank"]
+
+    assert client.get("/api/rank/nobody").status_code == 404
+    assert client.get("/api/rank?score=abc").status_code == 400
+
+def test_rank_of_a_student_the_worker_has_not_seen(client, app_module, scored_row, monkeypatch):
+    # A distribution that has not synced since the row was written elsewhere
+    distribution = ScoreDistribution(app_module.score_distribution.low, app_module.score_distribution.high)
+    monkeypatch.setattr(app_module, "score_distribution", distribution)
+    row = scored_row(12, "rank-2")
+    app_module.score_store.upsert([row])
+
+    response = client.get("/api/rank/rank-2")
+    assert response.status_code == 200
+    assert (response.get_json()["rank"], response.get_json()["count"]) == (1, 1)
+    assert distribution.student_score("rank-2") == row["total_score"]
+
+def test_score_pages_follow_the_cursor_through_every_row(client, app_module, scored_row):
+    app_module.score_store.upsert([scored_row(seed, f"page-{seed}") for seed in range(20, 27)])
+    rows, url = [], "/api/scores?limit=3"
+    while url:
+        page = client.get(url).get_json()
+        assert len(page["rows"]) <= 3
+        rows.extend(page["rows"])
+        url = f"/api/scores?limit=3&cursor={page['next_cursor']}" if page["next_cursor"] else None
+
+    expected = sorted(stored_totals(app_module), reverse=True)
+    assert [row["total_score"] for row in rows] == expected
+    assert len({row["id"] for row in rows}) == len(rows)
+    order = [(-row["total_score"], row["id"]) for row in rows]
+    assert order == sorted(order)
+    assert client.get("/api/scores?limit=3&cursor=junk").status_code == 400
+
+def test_unchanged_page_is_not_modified_until_a_write(client, app_module, scored_row):
+    first = client.get("/api/scores?limit=5")
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "no-cache"
+    assert client.get("/api/scores?limit=5", headers={"If-None-Match": etag}).status_code == 304
+
+    # Saved through this worker's write-behind queue and shared spool
+    app_module.score_writer.put(scored_row(30, "etag-1"))
+    assert wait_for(lambda: client.get("/api/scores?limit=5", headers={"If-None-Match": etag}).status_code == 200)
+
+def test_unchanged_chart_series_is_not_modified(client):
+    first = client.get("/api/scores?points=10")
+    assert first.status_code == 200
+    series = first.get_json()
+    assert len(series["scores"]) <= 10
+    assert series["scores"] == sorted(series["scores"], reverse=True)
+    assert client.get("/api/scores?points=10", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+def test_what_if_for_one_student_and_for_everyone(client, app_module, scored_row):
+    row = scored_row(40, "whatif-1")
+    app_module.score_store.upsert([row])
+    mcq = next(q_num for q_num, official in OFFICIAL_ANSWERS.items() if official["type"] == "MCQ")
+    disputes = {"disputes": [f"{mcq}=bonus"]}
+
+    scenarios = client.post("/api/what-if", json=dict(disputes, student_id="whatif-1")).get_json()["scenarios"]
+    assert len(scenarios) == 2
+    assert scenarios[0]["total_score"] == row["total_score"]
+    assert scenarios[0]["delta"] == 0
+    # A bonus gives everyone the MCQ's full 3 marks
+    assert scenarios[1]["delta"] == 3 - row["question_details"][f"Q{mcq}"]["score"]
+
+    assert wait_for(lambda: app_module.question_stats.summary()["students"] == len(stored_totals(app_module)))
+    everyone = client.post("/api/what-if", json=disputes).get_json()["scenarios"]
+    assert [s["candidates"] for s in everyone] == [len(stored_totals(app_module))] * 2
+    assert everyone[0]["mean_delta"] == 0
+    assert everyone[1]["mean_delta"] > 0
+
+    assert client.post("/api/what-if", json={}).status_code == 400
+    assert client.post("/api/what-if", json={"disputes": ["99=A"]}).status_code == 400
+    assert client.post("/api/what-if", json=dict(disputes, student_id="nobody")).status_code == 404
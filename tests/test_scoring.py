@@ -0,0 +1,119 @@
+import copy
+import random
+
+import pytest
+
+from calculate_score import (
+    OFFICIAL_ANSWERS,
+    calculate_mcq_score,
+    calculate_msq_score,
+    calculate_nat_score,
+    compiled_key,
+    map_questions,
+    mapped_responses,
+    parse_response_content,
+    score_responses
+)
+from synthetic_sheet import make_response_text, random_responses
+
+# The scoring functions as they were before the mark tables, kept as the
+# reference the table-based scoring must agree with
+
+def legacy_msq_score(correct_keys, chosen_keys, status=""):
+    if status == "Not Answered" or not chosen_keys or chosen_keys == "--":
+        return 0
+    if ',' in chosen_keys:
+        chosen_raw = chosen_keys.split(',')
+    else:
+        chosen_raw = []
+        last_digit = 0
+        for char in chosen_keys:
+            if char.isdigit():
+                digit = int(char)
+                if digit > last_digit and digit <= 4:
+                    chosen_raw.append(char)
+                    last_digit = digit
+                else:
+                    break
+    map_dict = {"1": "A", "2": "B", "3": "C", "4": "D"}
+    chosen = {map_dict.get(c.strip(), c.strip()) for c in chosen_raw if c.strip() and c.strip() in map_dict}
+    if not chosen: return 0
+    correct = set(correct_keys)
+    if not chosen.issubset(correct): return -1
+    if chosen == correct: return 4
+    if len(correct) == 4 and len(chosen) == 3: return 3
+    if len(correct) >= 3 and len(chosen) == 2: return 2
+    if len(correct) >= 2 and len(chosen) == 1: return 1
+    return -1
+
+def legacy_mcq_score(correct_key, chosen_option, status=""):
+    if status == "Not Answered" or not chosen_option or chosen_option == "--":
+        return 0
+    first_digit = chosen_option[0] if chosen_option else ""
+    map_dict = {"1": "A", "2": "B", "3": "C", "4": "D"}
+    chosen = map_dict.get(first_digit, first_digit)
+    if chosen == correct_key: return 3
+    else: return -0.5
+
+def legacy_nat_score(answer_rule, user_answer):
+    if not user_answer or user_answer == "N/A": return 0
+    try:
+        val = float(user_answer)
+        if "range" in answer_rule:
+            if answer_rule["range"][0] <= val <= answer_rule["range"][1]: return 4
+        elif "value" in answer_rule:
+            if val == answer_rule["value"]: return 4
+    except: pass
+    return 0
+
+def legacy_question_score(official, user_q):
+    if official["type"] == "NAT":
+        return legacy_nat_score(official, user_q["answer"])
+    if official["type"] == "MSQ":
+        return legacy_msq_score(official["keys"], user_q["chosen_options"], user_q["status"])
+    return legacy_mcq_score(official["key"], user_q["chosen_options"], user_q["status"])
+
+def assert_matches_legacy(responses, answers=OFFICIAL_ANSWERS):
+    scored = score_responses(responses, answers)
+    expected = {
+        q_num: legacy_question_score(official, responses[q_num]) if q_num in responses else 0
+        for q_num, official in answers.items()
+    }
+    assert {result["q_num"]: result["score"] for result in scored["results"]} == expected
+    assert scored["total_score"] == sum(expected.values())
+    for q_type, section in scored["section_scores"].items():
+        assert section["total"] == sum(score for q_num, score in expected.items() if answers[q_num]["type"] == q_type)
+
+@pytest.mark.parametrize("seed", range(200))
+def test_random_responses_score_as_legacy(seed):
+    assert_matches_legacy(random_responses(random.Random(seed), odd=0.3, missing=0.05))
+
+@pytest.mark.parametrize("seed", range(5))
+def test_synthetic_sheet_scores_as_legacy(seed):
+    questions = [q for section in parse_response_content(make_response_text(seed=seed)) for q in section]
+    mapping, _ = map_questions(questions)
+    assert_matches_legacy(mapped_responses(mapping))
+
+@pytest.mark.parametrize("chosen", ["1", "13", "1,3", "241", "31", "4321", "12 3", "1,5", "A", "x2", "--", "", None])
+@pytest.mark.parametrize("status", ["Answered", "Not Answered", ""])
+def test_choice_functions_match_legacy(chosen, status):
+    for keys in [["A"], ["A", "C"], ["A", "B", "C"], ["A", "B", "C", "D"]]:
+        assert calculate_msq_score(keys, chosen, status) == legacy_msq_score(keys, chosen, status)
+    for key in "ABCD":
+        assert calculate_mcq_score(key, chosen, status) == legacy_mcq_score(key, chosen, status)
+
+@pytest.mark.parametrize("answer", ["6.2", " 7 ", "18", "18.0", "-0", "1e3", "nan", "abc", "--", "N/A", "", None])
+def test_nat_function_matches_legacy(answer):
+    for rule in [{"type": "NAT", "range": [6.0, 6.5]}, {"type": "NAT", "value": 18.0}, {"type": "NAT", "value": 0.0}]:
+        assert calculate_nat_score(rule, answer) == legacy_nat_score(rule, answer)
+
+def test_key_edited_in_place_is_recompiled():
+    answers = copy.deepcopy(OFFICIAL_ANSWERS)
+    mcq = next(q_num for q_num, official in answers.items() if official["type"] == "MCQ")
+    before = compiled_key(answers)
+    answers[mcq] = dict(answers[mcq], key="ABCD".replace(answers[mcq]["key"], "")[0])
+
+    after = compiled_key(answers)
+    assert after is not before
+    assert after["version"] != before["version"]
+    assert_matches_legacy(random_responses(random.Random(0), odd=0.3), answers)
@@ -0,0 +1,115 @@
+import io
+import json
+import time
+import zipfile
+
+from answer_keys import BUILTIN, AnswerKeyRegistry
+from calculate_score import OFFICIAL_ANSWERS, save_answer_key
+
+def upload(client, data, url="/api/calculate-score", filename="sheet.pdf"):
+    return client.post(url, data={"file": (io.BytesIO(data), filename)}, content_type="multipart/form-data")
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+def zip_of(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+def test_repeat_upload_is_served_from_the_result_cache(client, sheet_pdf):
+    pdf = sheet_pdf(1, "upload-1")
+    first = upload(client, pdf)
+    assert first.status_code == 200
+    assert first.get_json()["debug"]["cache"] == "miss"
+
+    again = upload(client, pdf)
+    assert again.status_code == 200
+    assert again.get_json()["debug"]["cache"] == "result"
+    assert again.get_json()["scores"] == first.get_json()["scores"]
+    assert again.get_json()["student_info"]["student_id"] == "upload-1"
+
+    # Queued for saving, then stored
+    assert wait_for(lambda: client.get("/api/scores/upload-1").status_code == 200)
+    assert client.get("/api/scores/upload-1").get_json()["total_score"] == first.get_json()["scores"]["total_score"]
+
+def test_upload_compares_every_answer_key(client, app_module, sheet_pdf, tmp_path, monkeypatch):
+    # A revised key with one MCQ answer changed, next to the built-in one
+    mcq = next(q_num for q_num, official in OFFICIAL_ANSWERS.items() if official["type"] == "MCQ")
+    other = "ABCD".replace(OFFICIAL_ANSWERS[mcq]["key"], "")[0]
+    revised = {**OFFICIAL_ANSWERS, mcq: dict(OFFICIAL_ANSWERS[mcq], key=other)}
+    save_answer_key(revised, str(tmp_path / "revised.json"))
+    (tmp_path / "CURRENT").write_text(BUILTIN)
+    monkeypatch.setattr(app_module, "answer_key_registry", AnswerKeyRegistry(str(tmp_path)))
+
+    response = upload(client, sheet_pdf(2, "upload-2"), url="/api/calculate-score?keys=all")
+    assert response.status_code == 200
+    result = response.get_json()
+    compared = {version["name"]: version for version in result["key_versions"]["keys"]}
+    assert result["key_versions"]["base"] == BUILTIN
+    assert sorted(compared) == [BUILTIN, "revised"]
+    assert compared[BUILTIN]["total_score"] == result["scores"]["total_score"]
+    assert [q["q_num"] for q in compared["revised"]["questions"]] == [mcq]
+    assert compared["revised"]["total_score"] == result["scores"]["total_score"] + compared["revised"]["delta"]
+
+def test_upload_rejects_an_unknown_answer_key(client, sheet_pdf):
+    response = upload(client, sheet_pdf(2, "upload-2"), url="/api/calculate-score?keys=nope")
+    assert response.status_code == 400
+    assert "nope" in response.get_json()["error"]
+
+def test_bulk_streams_a_line_per_sheet_and_an_error_for_a_bad_member(client, sheet_pdf):
+    archive = zip_of({
+        "a.pdf": sheet_pdf(3, "bulk-a"),
+        "broken.pdf": b"not a pdf",
+        "nested/b.pdf": sheet_pdf(4, "bulk-b"),
+        "notes.txt": b"skipped",
+        "__MACOSX/._a.pdf": b"skipped",
+    })
+    response = upload(client, archive, url="/api/calculate-score/bulk", filename="sheets.zip")
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    by_file = {line["file"]: line for line in lines[:-1]}
+    assert sorted(by_file) == ["a.pdf", "broken.pdf", "nested/b.pdf"]
+    assert by_file["broken.pdf"]["error"] == "Could not read the PDF"
+    assert by_file["a.pdf"]["student_info"]["student_id"] == "bulk-a"
+    assert by_file["nested/b.pdf"]["student_info"]["student_id"] == "bulk-b"
+    summary = lines[-1]["summary"]
+    assert (summary["files"], summary["scored"], summary["errors"], summary["not_scored"]) == (3, 2, 1, 0)
+
+    # A sheet uploaded before is served from the same cache as single uploads
+    assert upload(client, sheet_pdf(3, "bulk-a")).get_json()["debug"]["cache"] == "result"
+
+def test_bulk_refuses_what_is_not_an_archive_of_pdfs(client):
+    assert upload(client, b"PK", url="/api/calculate-score/bulk", filename="sheets.zip").status_code == 400
+    assert upload(client, zip_of({"a.txt": b"x"}), url="/api/calculate-score/bulk",
+                  filename="sheets.zip").status_code == 400
+    assert upload(client, b"x", url="/api/calculate-score/bulk", filename="sheets.tar").status_code == 400
+
+def test_job_is_submitted_then_polled_to_its_result(client, sheet_pdf):
+    response = upload(client, sheet_pdf(5, "job-1"), url="/api/jobs")
+    assert response.status_code == 202
+    job = response.get_json()
+    assert job["status"] == "queued"
+    assert job["status_url"] == f"/api/jobs/{job['job_id']}"
+
+    polled = client.get(f"{job['status_url']}?wait=5").get_json()
+    assert polled["status"] == "done"
+    assert polled["result"]["student_info"]["student_id"] == "job-1"
+    assert polled["result"]["scores"] == upload(client, sheet_pdf(5, "job-1")).get_json()["scores"]
+
+def test_job_that_cannot_be_scored_fails(client, sheet_pdf):
+    job = upload(client, b"not a pdf", url="/api/jobs").get_json()
+    polled = client.get(f"/api/jobs/{job['job_id']}?wait=5").get_json()
+    assert polled["status"] == "failed"
+    assert polled["error"] == "Could not read the PDF"
+
+def test_unknown_job_and_bad_wait(client):
+    assert client.get("/api/jobs/nope").status_code == 404
+    assert client.get("/api/jobs/nope?wait=soon").status_code == 400
@@ -0,0 +1,169 @@
+import time
+
+import pytest
+
+from write_behind import MemorySpool, SqliteSpool, WriteBehindQueue
+
+@pytest.fixture(params=["memory", "sqlite"])
+def spool(request, tmp_path):
+    if request.param == "memory":
+        return MemorySpool()
+    return SqliteSpool(str(tmp_path / "spool.db"))
+
+class Database:
+    """flush_fn that records batches and rejects rows of the keys in `bad`"""
+    def __init__(self, bad=(), down=False):
+        self.rows = {}
+        self.batches = []
+        self.bad = set(bad)
+        self.down = down
+
+    def __call__(self, rows):
+        if self.down:
+            raise ConnectionError("database unreachable")
+        if any(row["student_id"] in self.bad for row in rows):
+            raise ValueError("row rejected")
+        self.batches.append(rows)
+        for row in rows:
+            self.rows[row["student_id"]] = row
+
+def test_rows_of_one_key_are_coalesced(spool):
+    db = Database()
+    queue = WriteBehindQueue(db, spool)
+    for score in [10, 20, 30]:
+        queue.put({"student_id": "s1", "total_score": score})
+    queue.put({"student_id": "s2", "total_score": 5})
+
+    assert queue.flush()
+    assert db.batches == [[{"student_id": "s1", "total_score": 30}, {"student_id": "s2", "total_score": 5}]]
+    stats = queue.stats()
+    assert (stats["queued"], stats["coalesced"], stats["written"], stats["pending"]) == (4, 2, 2, 0)
+
+def test_row_replaced_while_written_is_kept(spool):
+    spool.put("s1", {"student_id": "s1", "total_score": 1})
+    entries = spool.take(10, 60)
+    spool.put("s1", {"student_id": "s1", "total_score": 2})
+    spool.done(entries)
+
+    assert [row for _, _, row in spool.take(10, 60)] == [{"student_id": "s1", "total_score": 2}]
+
+def test_lease_expires(tmp_path):
+    spool = SqliteSpool(str(tmp_path / "spool.db"))
+    spool.put("s1", {"student_id": "s1"})
+
+    assert len(spool.take(10, lease_seconds=0.2)) == 1
+    # Another writer cannot take the key while it is leased...
+    assert spool.take(10, lease_seconds=0.2) == []
+    time.sleep(0.3)
+    # ...but can once the lease of a writer that died has run out
+    assert [key for key, _, _ in spool.take(10, lease_seconds=0.2)] == ["s1"]
+
+def test_spooled_rows_survive_a_restart(tmp_path):
+    path = str(tmp_path / "spool.db")
+    WriteBehindQueue(Database(down=True), SqliteSpool(path)).put({"student_id": "s1", "total_score": 7})
+
+    db = Database()
+    assert WriteBehindQueue(db, SqliteSpool(path)).flush()
+    assert db.rows == {"s1": {"student_id": "s1", "total_score": 7}}
+
+def test_database_down_keeps_rows_pending(spool):
+    db = Database(down=True)
+    queue = WriteBehindQueue(db, spool, max_attempts=2)
+    for i in range(3):
+        queue.put({"student_id": f"s{i}"})
+
+    for _ in range(5):
+        assert not queue.flush()
+    stats = queue.stats()
+    assert (stats["pending"], stats["dead_letters"], stats["failures"]) == (3, 0, 5)
+
+    db.down = False
+    assert queue.flush()
+    assert sorted(db.rows) == ["s0", "s1", "s2"]
+
+def test_rejected_row_is_dead_lettered(spool):
+    db = Database(bad={"bad"})
+    queue = WriteBehindQueue(db, spool, max_attempts=3)
+    queue.put({"student_id": "bad"})
+    for i in range(3):
+        queue.put({"student_id": f"s{i}"})
+        queue.flush()
+
+    # The rejected row did not hold back the others, and was given up on
+    assert sorted(db.rows) == ["s0", "s1", "s2"]
+    stats = queue.stats()
+    assert (stats["pending"], stats["dead_letters"], stats["dead_lettered"]) == (0, 1, 1)
+    assert queue.flush()
+
+def test_put_gives_up_when_the_spool_stays_full(spool):
+    queue = WriteBehindQueue(Database(down=True), spool, max_pending=1, put_timeout=0.05)
+    assert queue.put({"student_id": "s1"})
+
+    start = time.monotonic()
+    assert not queue.put({"student_id": "s2"})
+    assert time.monotonic() - start < 1
+    assert queue.stats()["dropped"] == 1
+
+def test_database_down_is_probed_with_one_row(spool):
+    db = Database(down=True)
+    calls = []
+    queue = WriteBehindQueue(lambda rows: calls.append(len(rows)) or db(rows), spool)
+    for i in range(5):
+        queue.put({"student_id": f"s{i}"})
+
+    assert not queue.flush()
+    # The batch, then its first and last rows alone - not every row of it
+    assert calls == [5, 1, 1]
+    assert queue.stats()["pending"] == 5
+
+def test_writer_backs_off_while_a_full_batch_fails(spool):
+    db = Database(down=True)
+    queue = WriteBehindQueue(db, spool, batch_size=2, flush_seconds=0.05)
+    for i in range(5):
+        queue.put({"student_id": f"s{i}"})
+    queue.start()
+    time.sleep(0.5)
+    queue.stop()
+
+    # A full batch goes out at once, but not again right after failing
+    assert 1 <= queue.stats()["failures"] <= 2
+    assert queue._thread is None
+
+def test_puts_do_not_wake_a_backing_off_writer(spool):
+    db = Database(down=True)
+    calls = []
+    queue = WriteBehindQueue(lambda rows: calls.append(len(rows)) or db(rows), spool,
+                             batch_size=20, flush_seconds=0.5)
+    queue.start()
+    try:
+        # 20 rows a second for 3 seconds against a database that stays down
+        for i in range(60):
+            queue.put({"student_id": f"s{i}"})
+            time.sleep(0.05)
+    finally:
+        queue.stop()
+
+    # Three calls (batch and two probes) per round, rounds 1 s then 2 s apart
+    assert len(calls) <= 12
+    assert queue.stats()["pending"] == 60
+
+def test_write_mark_counts_writes_of_every_queue_on_the_spool(tmp_path):
+    path = str(tmp_path / "spool.db")
+    first = WriteBehindQueue(Database(), SqliteSpool(path))
+    second = WriteBehindQueue(Database(), SqliteSpool(path))
+    created, written, _ = first.spool.write_mark()
+    assert written == 0
+
+    first.put({"student_id": "s1"})
+    assert first.spool.write_mark() == second.spool.write_mark()
+    first.flush()
+    second.put({"student_id": "s2"})
+    second.flush()
+
+    # Either queue's writes show in the mark both read, failed ones do not
+    assert first.spool.write_mark()[:2] == (created, 2)
+    failing = WriteBehindQueue(Database(down=True), SqliteSpool(path))
+    failing.put({"student_id": "s3"})
+    failing.flush()
+    assert second.spool.write_mark()[:2] == (created, 2)
+    assert MemorySpool().write_mark() is None
@@ -1,13 +1,13 @@
 import re
-from pypdf import PdfReader
+from pdf_extraction import extract_pages
 
 # Step 1: Verify Official Answer Key against PDF
 print("="*80)
 print("STEP 1: VERIFYING OFFICIAL ANSWER KEY AGAINST PDF")
 print("="*80)
 
-reader = PdfReader("CEED2026_draftAnswerkey.pdf")
-pdf_text = reader.pages[0].extract_text()
+# The section regexes below follow pypdf's layout of the answer-key table
+pdf_text = extract_pages("CEED2026_draftAnswerkey.pdf", backend="pypdf")[0]
 
 # Extract answers from PDF
 nat_matches = re.findall(r'(\d+)\s+(\d+(?:\.\d+)?(?:\s+to\s+\d+(?:\.\d+)?)?)', pdf_text[:200])
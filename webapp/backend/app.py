@@ -1,12 +1,17 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-from pypdf import PdfReader
-import re
+import base64
+import hmac
+import json
+import math
 import os
-from datetime import datetime
-from supabase import create_client, Client
-from werkzeug.utils import secure_filename
+import shutil
 import tempfile
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timezone
+from supabase import create_client, Client
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -28,247 +33,282 @@ except Exception as e:
 import sys
 root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.append(root_dir)
-from calculate_score import (
-    OFFICIAL_ANSWERS, 
-    QUESTION_PATTERNS,
-    calculate_nat_score,
-    calculate_msq_score,
-    calculate_mcq_score,
-    parse_response_text
+from answer_keys import AnswerKeyRegistry
+from calculate_score import score_against_keys, score_responses
+from batch_scoring import encode_responses
+from distribution import ScoreDistribution, score_range, store_timestamp
+from export import FORMATS, iter_export
+from pdf_extraction import PDF_BACKEND, POOL_CONTEXT
+from question_stats import QuestionStats
+from rescore import stored_responses
+from jobs import JobQueue, MemoryJobStore, QueueFull, SqliteJobStore
+from result_cache import ResultCache
+from score_store import SqliteScores, SupabaseScores
+from sheet_parsing import elapsed_ms, parse_member, parse_upload, sheet_cache_key
+from what_if import candidate_scenarios, parse_dispute, population_scenarios
+from write_behind import MemorySpool, SqliteSpool, WriteBehindQueue
+
+# Worker processes started fresh (pdf_extraction.POOL_CONTEXT) re-run the main
+# script as __mp_main__ when the server was started with `python app.py`;
+# background services only run in the server itself
+SERVER_PROCESS = __name__ != "__mp_main__"
+
+# Answer keys come from ANSWER_KEY_DIR when set (see answer_keys.py) and are
+# reloaded in the background, so a key revision needs no restart
+answer_key_registry = AnswerKeyRegistry(
+    directory=os.environ.get("ANSWER_KEY_DIR") or None,
+    poll_seconds=float(os.environ.get("ANSWER_KEY_POLL_SECONDS", "5"))
 )
+if SERVER_PROCESS:
+    answer_key_registry.start()
 
-def extract_student_info(pdf_path):
-    """Extract student name and ID from PDF"""
-    reader = PdfReader(pdf_path)
-    full_text = ""
-    # Read first 2 pages to find info
-    for i in range(min(2, len(reader.pages))):
-        full_text += reader.pages[i].extract_text()
-    
-    # Try multiple patterns for name extraction
-    name = "Unknown"
-    name_patterns = [
-        r'Participant Name\s+([A-Z\s]+?)(?=\n|Test Center|Test Date)',
-        r'Candidate Name\s*:?\s*([^\n]+)',
-        r'Name\s*:?\s*([A-Z][A-Za-z\s]+?)(?=\n|Application|\d{10})',
-        r'Student Name\s*:?\s*([^\n]+)',
-    ]
-    
-    for pattern in name_patterns:
-        name_match = re.search(pattern, full_text, re.IGNORECASE)
-        if name_match:
-            extracted = name_match.group(1).strip()
-            # Clean up common contamination
-            extracted = re.split(r'\d{2}/\d{2}/\d{2,4}|\d{10,}|Application|Test Center', extracted)[0].strip()
-            if extracted and len(extracted) > 2 and not extracted.isdigit():
-                name = extracted
-                break
-    
-    # Extract Application Number or ID
-    student_id = None
-    id_patterns = [
-        r'Participant ID\s+(\d+)',
-        r'Application Number\s*:?\s*(\d+)',
-        r'Roll Number\s*:?\s*(\d+)',
-        r'ID\s*:?\s*(\d+)',
-        r'\b(\d{10,})\b'  # Any 10+ digit number as fallback
-    ]
-    
-    for pattern in id_patterns:
-        id_match = re.search(pattern, full_text, re.IGNORECASE)
-        if id_match:
-            student_id = id_match.group(1).strip()
-            break
-    
-    student_id = id_match.group(1).strip() if id_match else None
-    
-    return name, student_id
-
-def calculate_score_from_pdf(pdf_path):
-    """Calculate score from PDF and return detailed results"""
-    # Extract text from PDF
-    reader = PdfReader(pdf_path)
-    content = ""
-    for i, page in enumerate(reader.pages):
-        page_text = page.extract_text() or ""
-        content += f"--- Page {i+1} ---\n"
-        content += page_text
-        content += "\n\n"
+# Uploads are cached by the SHA-256 of the PDF bytes. SCORE_CACHE_DIR adds a
+# disk tier shared by all workers on the host; without it only the
+# in-process LRU is used. Disk entries unused for SCORE_CACHE_MAX_AGE_HOURS
+# are swept (0 keeps them until the directory is pruned externally).
+result_cache = ResultCache(
+    max_entries=int(os.environ.get("SCORE_CACHE_SIZE", "512")),
+    directory=os.environ.get("SCORE_CACHE_DIR") or None,
+    max_age=float(os.environ.get("SCORE_CACHE_MAX_AGE_HOURS", "168")) * 3600
+)
+
+# /api/scores returns at most this many points of the score ranking
+SCORE_SERIES_POINTS = int(os.environ.get("SCORE_SERIES_POINTS", "500"))
+SCORE_SERIES_MAX_POINTS = 5000
+
+# Listing pages of /api/scores (?limit=&cursor=)
+SCORE_PAGE_MAX = 1000
+SCORE_PAGE_COLUMNS = "id, student_id, name, total_score, nat_score, msq_score, mcq_score, updated_at"
+
+# /api/export streams every stored row, so it is only served to requests
+# carrying this token (Authorization: Bearer <EXPORT_TOKEN>)
+EXPORT_TOKEN = os.environ.get("EXPORT_TOKEN") or None
+
+# Bulk uploads: a ZIP of response sheets, scored BULK_WORKERS at a time
+BULK_WORKERS = int(os.environ.get("BULK_WORKERS", "0")) or os.cpu_count() or 1
+BULK_MAX_FILES = int(os.environ.get("BULK_MAX_FILES", "500"))
+BULK_MAX_FILE_MB = float(os.environ.get("BULK_MAX_FILE_MB", "20"))
+BULK_MAX_TOTAL_MB = float(os.environ.get("BULK_MAX_TOTAL_MB", "1000"))
+
+def format_result(parsed, score_data, key):
+    """Shape a parsed upload and its scores against a compiled key into the API response"""
+    # Format section details for frontend
+    section_details_formatted = {
+        "NAT Section": {
+            "score": score_data["section_scores"]["NAT"]["total"],
+            "max_score": 32,
+            "correct": score_data["section_scores"]["NAT"]["correct"],
+            "wrong": score_data["section_scores"]["NAT"]["wrong"],
+            "unattempted": score_data["section_scores"]["NAT"]["unattempted"]
+        },
+        "MSQ Section": {
+            "score": score_data["section_scores"]["MSQ"]["total"],
+            "max_score": 40,
+            "correct": score_data["section_scores"]["MSQ"]["correct"],
+            "wrong": score_data["section_scores"]["MSQ"]["wrong"],
+            "unattempted": score_data["section_scores"]["MSQ"]["unattempted"]
+        },
+        "MCQ Section": {
+            "score": score_data["section_scores"]["MCQ"]["total"],
+            "max_score": 78,
+            "correct": score_data["section_scores"]["MCQ"]["correct"],
+            "wrong": score_data["section_scores"]["MCQ"]["wrong"],
+            "unattempted": score_data["section_scores"]["MCQ"]["unattempted"]
+        }
+    }
     
-    # Parse using existing logic
-    sections = parse_response_with_content(content)
-    all_questions = []
-    for section in sections:
-        all_questions.extend(section)
+    # Format question details for frontend
+    question_details_formatted = {}
+    for q in score_data["results"]:
+        q_key = f"Q{q['q_num']}"
+        question_details_formatted[q_key] = {
+            "type": q["type"],
+            "status": q["status"],
+            "student_answer": q["user_ans"],
+            "correct_answer": q["correct_ans"],
+            "score": q["score"]
+        }
     
-    # Map questions
-    mapping = {}
-    for q_num in range(1, 45):
-        pattern = QUESTION_PATTERNS[q_num]
-        for user_q in all_questions:
-            if re.search(pattern, user_q["raw_block"], re.IGNORECASE | re.DOTALL):
-                mapping[q_num] = user_q
-                break
+    # Count N/A answers to detect potential PDF parsing issues
+    # Note: "--" is valid (officially marked as unattempted), only count "N/A" (parsing failures)
+    na_count = sum(1 for r in score_data["results"] if r["user_ans"] == "N/A")
+    has_many_na = na_count > 10  # Threshold: more than 10 N/As suggests parsing issues
     
-    # Calculate scores
-    section_scores = {
-        "NAT": {"total": 0, "negative": 0, "correct": 0, "wrong": 0, "unattempted": 0},
-        "MSQ": {"total": 0, "negative": 0, "correct": 0, "wrong": 0, "unattempted": 0},
-        "MCQ": {"total": 0, "negative": 0, "correct": 0, "wrong": 0, "unattempted": 0}
+    return {
+        "student_info": {
+            "name": parsed["name"],
+            "student_id": parsed["student_id"]
+        },
+        "scores": {
+            "total_score": score_data["total_score"],
+            "nat_score": score_data["section_scores"]["NAT"]["total"],
+            "msq_score": score_data["section_scores"]["MSQ"]["total"],
+            "mcq_score": score_data["section_scores"]["MCQ"]["total"]
+        },
+        "section_details": section_details_formatted,
+        "question_details": question_details_formatted,
+        "warning": {
+            "has_many_na": has_many_na,
+            "na_count": na_count
+        },
+        "answer_key_version": key["version"],
+        "answer_key_name": key["name"],
+        "debug": {
+            "mapping": parsed["mapping_stats"],
+            "pages": parsed["pages"],
+            "pages_skipped": parsed.get("pages_skipped", 0)
+        }
     }
+
+@app.route('/api/health', methods=['GET'])
+def health():
+    return jsonify({"status": "ok", "supabase_connected": supabase is not None,
+                    "score_store": score_store.name if score_store else None})
+
+NO_ANSWERS_ERROR = "No answers could be extracted from this PDF. This usually happens when the PDF contains images instead of text. Please make sure you're saving your response sheet using the browser's 'Print' option and selecting 'Save as PDF' - do not use screenshot or download as image."
+
+def score_parsed(parsed, key, timings):
+    """Score a parsed upload against a compiled key into the API response.
+
+    Returns None when no answers were found on the sheet.
+    """
+    start = time.perf_counter()
+    responses = {int(q): r for q, r in parsed["responses"].items()}
+    score_data = score_responses(responses, key["answers"], key)
+    timings["score_ms"] = elapsed_ms(start)
     
-    results = []
+    # Check if PDF is actually a valid response sheet
+    # If all answers are N/A and no questions were matched, it's likely not a response sheet
+    answered_count = sum(1 for r in score_data["results"] if r["user_ans"] not in ["N/A", "--", None, ""])
+    if answered_count == 0:
+        return None
+    return format_result(parsed, score_data, key)
+
+def score_upload(pdf_bytes, key, timings, parse=None):
+    """Score uploaded PDF bytes against a compiled key, through the caches,
+    and store the result.
+
+    Returns (response, parsed upload or None on a result-cache hit); the
+    response is None when no answers were found. `parse` replaces
+    parse_upload, e.g. to run it on the bulk pool.
+    """
+    sheet_key = sheet_cache_key(pdf_bytes, PDF_BACKEND)
     
-    for q_num in range(1, 45):
-        official = OFFICIAL_ANSWERS[q_num]
-        user_q = mapping.get(q_num)
-        
-        score = 0
-        user_display = "N/A"
-        correct_display = ""
-        status = "Not Found"
-        
-        if user_q:
-            status = user_q["status"]
-            if official["type"] == "NAT":
-                user_display = user_q["answer"] if user_q["answer"] else "N/A"
-                correct_display = f"{official.get('value', official.get('range'))}"
-                score = calculate_nat_score(official, user_q["answer"])
-            elif official["type"] == "MSQ":
-                user_display = user_q["chosen_options"] if user_q["chosen_options"] else "N/A"
-                correct_display = ",".join(official["keys"])
-                score = calculate_msq_score(official["keys"], user_q["chosen_options"], status)
-            elif official["type"] == "MCQ":
-                user_display = user_q["chosen_options"] if user_q["chosen_options"] else "N/A"
-                correct_display = official["key"]
-                score = calculate_mcq_score(official["key"], user_q["chosen_options"], status)
-        else:
-            if official["type"] == "NAT": 
-                correct_display = f"{official.get('value', official.get('range'))}"
-            elif official["type"] == "MSQ": 
-                correct_display = ",".join(official["keys"])
-            elif official["type"] == "MCQ": 
-                correct_display = official["key"]
-        
-        # Update section statistics
-        section_type = official["type"]
-        section_scores[section_type]["total"] += score
+    # The same bytes scored against the same answer key give the same
+    # response, so a repeat upload skips extraction, parsing and scoring
+    cache_status = "result"
+    parsed = None
+    result = result_cache.get("result", f"{sheet_key}-{key['version']}")
+    if result is None:
+        cache_status = "parsed"
+        parsed = result_cache.get("parsed", sheet_key)
+        if parsed is None:
+            cache_status = "miss"
+            parsed = parse(pdf_bytes, timings) if parse else parse_upload(pdf_bytes, timings)
+            result_cache.put("parsed", sheet_key, parsed)
         
-        if score > 0:
-            section_scores[section_type]["correct"] += 1
-        elif score < 0:
-            section_scores[section_type]["negative"] += score
-            section_scores[section_type]["wrong"] += 1
-        else:
-            if user_q and user_display:
-                if official["type"] == "NAT":
-                    if user_display not in ["N/A", "--", None, ""]:
-                        section_scores[section_type]["wrong"] += 1
-                    else:
-                        section_scores[section_type]["unattempted"] += 1
-                else:
-                    if user_display in ["N/A", "--", None, ""]:
-                        section_scores[section_type]["unattempted"] += 1
-                    else:
-                        section_scores[section_type]["unattempted"] += 1
-            else:
-                section_scores[section_type]["unattempted"] += 1
-        
-        results.append({
-            "q_num": q_num,
-            "type": official["type"],
-            "status": status,
-            "user_ans": user_display,
-            "correct_ans": correct_display,
-            "score": score
-        })
+        result = score_parsed(parsed, key, timings)
+        if result is None:
+            return None, parsed
+        result_cache.put("result", f"{sheet_key}-{key['version']}", result)
     
-    total_score = sum(section_scores[s]["total"] for s in section_scores)
-    total_negative = sum(section_scores[s]["negative"] for s in section_scores)
-    worst_section = min(section_scores.keys(), key=lambda s: section_scores[s]["negative"])
+    # Queue for Supabase if configured
+    store_result(result)
     
+    # Cached entries are shared, so add the per-request debug info to a copy
+    result = dict(result)
+    result["debug"] = dict(result["debug"], timings_ms=timings, cache=cache_status)
+    return result, parsed
+
+def score_row(result):
+    """The scores table row of a result; created_at is left to its column default"""
     return {
-        "total_score": total_score,
-        "total_negative": total_negative,
-        "worst_section": worst_section,
-        "section_scores": section_scores,
-        "results": results
+        "student_id": result["student_info"]["student_id"],
+        "name": result["student_info"]["name"],
+        "total_score": result["scores"]["total_score"],
+        "nat_score": result["scores"]["nat_score"],
+        "msq_score": result["scores"]["msq_score"],
+        "mcq_score": result["scores"]["mcq_score"],
+        "section_details": result["section_details"],
+        "question_details": result["question_details"],
+        "updated_at": datetime.utcnow().isoformat()
     }
 
-def parse_response_with_content(content):
-    """Parse response text content (from calculate_score.py logic)"""
-    # Split into logical sections based on Q.1 restarts
-    matches = list(re.finditer(r'Q\.\d+', content))
-    sections = []
-    current_section = []
-    last_num = -1
-    
-    for i in range(len(matches)):
-        start = matches[i].start()
-        end = matches[i+1].start() if i+1 < len(matches) else len(content)
-        q_block = content[start:end]
-        
-        m = re.match(r'Q\.(\d+)', q_block)
-        curr_num = int(m.group(1))
-        
-        if curr_num < last_num:
-            sections.append(current_section)
-            current_section = []
-        
-        q_text_match = re.search(r'Q\.\d+\s*(.*?)(?=Given|Options|Question ID|Status)', q_block, re.DOTALL)
-        q_text = q_text_match.group(1).strip() if q_text_match else ""
-        
-        answer_match = re.search(r'Answer\s*:(.*?)(?=\s*Question ID|Status|$)', q_block, re.DOTALL)
-        # Use a more restrictive regex - stop at newline or next field
-        chosen_option_match = re.search(r'Chosen Option\s*:\s*([^\n]+)', q_block)
-        status_match = re.search(r'Status\s*:(.*?)(?=\s*Given|Options|Question ID|Answer|Chosen Option|$)', q_block, re.DOTALL)
-        
-        q_info = {
-            "text": q_text,
-            "raw_block": q_block,
-            "status": status_match.group(1).strip() if status_match else "",
-            "answer": answer_match.group(1).strip() if answer_match else None,
-            "chosen_options": chosen_option_match.group(1).strip() if chosen_option_match else None
-        }
-        
-        # Clean chosen_options - extract only valid option digits (1-4) with optional commas
-        if q_info["chosen_options"]:
-            raw = q_info["chosen_options"].strip()
-            
-            # Check for unanswered
-            if raw == '--' or raw.startswith('--'):
-                q_info["chosen_options"] = "--"
-            else:
-                # Extract valid answer patterns - digits 1-4 with optional commas
-                # Also accept consecutive digits like "24" or "134" (comma may have been lost in PDF parsing)
-                
-                # First, try to match comma-separated pattern like "1,3" or "1, 3"
-                comma_match = re.match(r'^([1-4](?:\s*,\s*[1-4])*)', raw)
-                if comma_match:
-                    # Found comma-separated values
-                    cleaned = comma_match.group(1)
-                    # Normalize: remove spaces around commas
-                    cleaned = re.sub(r'\s*,\s*', ',', cleaned)
-                    q_info["chosen_options"] = cleaned
-                else:
-                    # Try consecutive digits (1-4 only) - comma may have been lost
-                    # Match one or more digits that are all 1-4
-                    consecutive_match = re.match(r'^([1-4]+)', raw)
-                    if consecutive_match:
-                        q_info["chosen_options"] = consecutive_match.group(1)
-                    else:
-                        # Invalid format
-                        q_info["chosen_options"] = "--"
-                
-        current_section.append(q_info)
-        last_num = curr_num
-    
-    sections.append(current_section)
-    return sections
+# Scores are kept in Supabase when it is configured. Without it, SCORE_SPOOL
+# also holds a local scores table that stands in for it, so the backend runs
+# and can be tested with no network (see score_store.py).
+SCORE_SPOOL = os.environ.get("SCORE_SPOOL") or None
+if supabase:
+    score_store = SupabaseScores(supabase)
+elif SCORE_SPOOL:
+    score_store = SqliteScores(SCORE_SPOOL)
+else:
+    score_store = None
 
-@app.route('/api/health', methods=['GET'])
-def health():
-    return jsonify({"status": "ok", "supabase_connected": supabase is not None})
+# Results are saved off the request path: rows are coalesced per student and
+# upserted in batches of SCORE_WRITE_BATCH, at least every
+# SCORE_WRITE_INTERVAL_MS. With SCORE_SPOOL every row is recorded in that
+# SQLite file first and replayed from it until written, so a slow or
+# unreachable database loses nothing, even across restarts. A row the
+# database keeps rejecting is set aside as a dead letter (see
+# write_behind.py).
+# Every SCORE_SYNC_SECONDS each worker applies the rows other workers wrote
+# since the latest it has seen (one query on the updated_at index) to the
+# in-memory views below, and rebuilds them at once if rescore.py bumped the
+# store version; *_REFRESH_SECONDS, if set, also rebuilds them that often
+SCORE_SYNC_SECONDS = float(os.environ.get("SCORE_SYNC_SECONDS", "10"))
+
+# Score distribution for charts, kept in memory and updated as rows are
+# written (see distribution.py)
+score_distribution = ScoreDistribution(*score_range(answer_key_registry.active()["answers"]))
+if score_store and SERVER_PROCESS:
+    score_distribution.start(
+        lambda: score_store.iter_rows(1000, "id, student_id, total_score, updated_at"),
+        lambda since: score_store.iter_changed(since, 1000, "id, student_id, total_score, updated_at"),
+        score_store.version,
+        SCORE_SYNC_SECONDS,
+        float(os.environ.get("SCORE_DISTRIBUTION_REFRESH_SECONDS", "0"))
+    )
+
+# Per-question statistics (attempt rate, accuracy, option picks, NAT values),
+# kept the same way (see question_stats.py)
+question_stats = QuestionStats()
+if score_store and SERVER_PROCESS:
+    question_stats.start(
+        lambda: score_store.iter_rows(500, "id, student_id, question_details, updated_at"),
+        lambda since: score_store.iter_changed(since, 500, "id, student_id, question_details, updated_at"),
+        score_store.version,
+        SCORE_SYNC_SECONDS,
+        float(os.environ.get("QUESTION_STATS_REFRESH_SECONDS", "0"))
+    )
+QUESTION_STATS_MAX_AGE = int(os.environ.get("QUESTION_STATS_MAX_AGE", "60"))
+
+def write_scores(rows):
+    score_store.upsert(rows)
+    score_distribution.record(rows)
+    question_stats.record(rows)
+
+score_writer = WriteBehindQueue(
+    write_scores,
+    spool=SqliteSpool(SCORE_SPOOL) if SCORE_SPOOL else MemorySpool(),
+    key="student_id",
+    batch_size=int(os.environ.get("SCORE_WRITE_BATCH", "200")),
+    flush_seconds=float(os.environ.get("SCORE_WRITE_INTERVAL_MS", "500")) / 1000,
+    max_pending=int(os.environ.get("SCORE_WRITE_MAX_PENDING", "10000")),
+    put_timeout=float(os.environ.get("SCORE_WRITE_MAX_WAIT_MS", "2000")) / 1000
+)
+if score_store and SERVER_PROCESS:
+    score_writer.start()
+
+def store_result(result):
+    """Queue a scored result for saving, if a score store is configured"""
+    if not score_store:
+        return
+    row = score_row(result)
+    if score_writer.put(row):
+        # Ranked here at once, before the row is written; other workers
+        # pick it up from the store (see get_rank)
+        score_distribution.record([row])
 
 @app.route('/api/calculate-score', methods=['POST'])
 def calculate_score_endpoint():
@@ -283,170 +323,483 @@ def calculate_score_endpoint():
         return jsonify({"error": "Only PDF files are allowed"}), 400
     
     try:
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            file.save(tmp_file.name)
-            tmp_path = tmp_file.name
-        
-        # Extract student info
-        name, student_id = extract_student_info(tmp_path)
+        timings = {}
+        pdf_bytes = file.read()
+        sheet_key = sheet_cache_key(pdf_bytes, PDF_BACKEND)
         
-        # Use default values if extraction fails - score can still be calculated
-        if not student_id:
-            student_id = "Unknown"
-        if not name or name == "Unknown":
-            name = "Anonymous"
+        # One key snapshot for the whole request, even if a reload lands meanwhile
+        key = answer_key_registry.active()
         
-        # Calculate score
-        score_data = calculate_score_from_pdf(tmp_path)
+        # Optional "keys": more registry versions to score the same sheet
+        # against ("draft,final" or "all"), compared with the active key
+        compare_keys = None
+        requested = request.values.get("keys", "").strip()
+        if requested:
+            names = [v["name"] for v in answer_key_registry.versions()] if requested == "all" else [n.strip() for n in requested.split(",") if n.strip()]
+            unknown = [n for n in names if answer_key_registry.get(n) is None]
+            if unknown:
+                return jsonify({"error": f"Unknown answer key version(s): {', '.join(unknown)}"}), 400
+            compare_keys = [key] + [answer_key_registry.get(n) for n in names if n != key["name"]]
         
-        # Check if PDF is actually a valid response sheet
-        # If all answers are N/A and no questions were matched, it's likely not a response sheet
-        answered_count = sum(1 for r in score_data["results"] if r["user_ans"] not in ["N/A", "--", None, ""])
-        if answered_count == 0:
-            os.unlink(tmp_path)
-            return jsonify({
-                "error": "No answers could be extracted from this PDF. This usually happens when the PDF contains images instead of text. Please make sure you're saving your response sheet using the browser's 'Print' option and selecting 'Save as PDF' - do not use screenshot or download as image."
-            }), 400
-        
-        # Clean up temp file
-        os.unlink(tmp_path)
-        
-        # Format section details for frontend
-        section_details_formatted = {
-            "NAT Section": {
-                "score": score_data["section_scores"]["NAT"]["total"],
-                "max_score": 32,
-                "correct": score_data["section_scores"]["NAT"]["correct"],
-                "wrong": score_data["section_scores"]["NAT"]["wrong"],
-                "unattempted": score_data["section_scores"]["NAT"]["unattempted"]
-            },
-            "MSQ Section": {
-                "score": score_data["section_scores"]["MSQ"]["total"],
-                "max_score": 40,
-                "correct": score_data["section_scores"]["MSQ"]["correct"],
-                "wrong": score_data["section_scores"]["MSQ"]["wrong"],
-                "unattempted": score_data["section_scores"]["MSQ"]["unattempted"]
-            },
-            "MCQ Section": {
-                "score": score_data["section_scores"]["MCQ"]["total"],
-                "max_score": 78,
-                "correct": score_data["section_scores"]["MCQ"]["correct"],
-                "wrong": score_data["section_scores"]["MCQ"]["wrong"],
-                "unattempted": score_data["section_scores"]["MCQ"]["unattempted"]
-            }
-        }
+        result, parsed = score_upload(pdf_bytes, key, timings)
+        if result is None:
+            return jsonify({"error": NO_ANSWERS_ERROR}), 400
         
-        # Format question details for frontend
-        question_details_formatted = {}
-        for q in score_data["results"]:
-            q_key = f"Q{q['q_num']}"
-            question_details_formatted[q_key] = {
-                "type": q["type"],
-                "student_answer": q["user_ans"],
-                "correct_answer": q["correct_ans"],
-                "score": q["score"]
-            }
-        
-        # Count N/A answers to detect potential PDF parsing issues
-        # Note: "--" is valid (officially marked as unattempted), only count "N/A" (parsing failures)
-        na_count = sum(1 for r in score_data["results"] if r["user_ans"] == "N/A")
-        has_many_na = na_count > 10  # Threshold: more than 10 N/As suggests parsing issues
-        
-        # Prepare response for frontend
-        result = {
-            "student_info": {
-                "name": name,
-                "student_id": student_id
-            },
-            "scores": {
-                "total_score": score_data["total_score"],
-                "nat_score": score_data["section_scores"]["NAT"]["total"],
-                "msq_score": score_data["section_scores"]["MSQ"]["total"],
-                "mcq_score": score_data["section_scores"]["MCQ"]["total"]
-            },
-            "section_details": section_details_formatted,
-            "question_details": question_details_formatted,
-            "warning": {
-                "has_many_na": has_many_na,
-                "na_count": na_count
-            }
-        }
-        
-        # Store in Supabase if configured
-        if supabase:
-            try:
-                # Check if student already exists
-                existing = supabase.table('scores').select('*').eq('student_id', student_id).execute()
-                
-                if existing.data:
-                    # Update existing record
-                    supabase.table('scores').update({
-                        "name": name,
-                        "total_score": score_data["total_score"],
-                        "nat_score": result["scores"]["nat_score"],
-                        "msq_score": result["scores"]["msq_score"],
-                        "mcq_score": result["scores"]["mcq_score"],
-                        "section_details": section_details_formatted,
-                        "question_details": question_details_formatted,
-                        "updated_at": datetime.utcnow().isoformat()
-                    }).eq('student_id', student_id).execute()
-                else:
-                    # Insert new record
-                    supabase.table('scores').insert({
-                        "student_id": student_id,
-                        "name": name,
-                        "total_score": score_data["total_score"],
-                        "nat_score": result["scores"]["nat_score"],
-                        "msq_score": result["scores"]["msq_score"],
-                        "mcq_score": result["scores"]["mcq_score"],
-                        "section_details": section_details_formatted,
-                        "question_details": question_details_formatted,
-                        "created_at": datetime.utcnow().isoformat()
-                    }).execute()
-            except Exception as e:
-                print(f"Supabase error: {e}")
-                # Continue even if Supabase fails
+        if compare_keys:
+            # Reuses the parsed sheet; each extra key only re-scores the
+            # questions where it differs from the active key
+            if parsed is None:
+                parsed = result_cache.get("parsed", sheet_key)
+            if parsed is None:
+                parsed = parse_upload(pdf_bytes, timings)
+                result_cache.put("parsed", sheet_key, parsed)
+            start = time.perf_counter()
+            responses = {int(q): r for q, r in parsed["responses"].items()}
+            result["key_versions"] = score_against_keys(responses, compare_keys)
+            timings["compare_ms"] = elapsed_ms(start)
         
         return jsonify(result), 200
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+_bulk_pool = None
+
+def get_bulk_pool():
+    """Worker processes for bulk uploads, created on first use"""
+    global _bulk_pool
+    if _bulk_pool is None:
+        _bulk_pool = ProcessPoolExecutor(max_workers=BULK_WORKERS, mp_context=POOL_CONTEXT)
+    return _bulk_pool
+
+def archive_members(archive):
+    """The PDF members of a ZIP, skipping folders and macOS resource forks"""
+    return [
+        info for info in archive.infolist()
+        if not info.is_dir()
+        and info.filename.lower().endswith(".pdf")
+        and not info.filename.startswith("__MACOSX/")
+        and not os.path.basename(info.filename).startswith("._")
+    ]
+
+def read_member(archive, info, limit):
+    """A member's bytes, or None when it inflates past `limit` bytes (the
+    sizes in a ZIP's directory are not to be trusted)"""
+    with archive.open(info) as member:
+        data = member.read(limit + 1)
+    return None if len(data) > limit else data
+
+@app.route('/api/calculate-score/bulk', methods=['POST'])
+def bulk_calculate_score():
+    """Score every PDF in an uploaded ZIP, streaming one NDJSON line per sheet
+    as it completes and a summary line at the end"""
+    if 'file' not in request.files:
+        return jsonify({"error": "No file provided"}), 400
+    file = request.files['file']
+    if not file.filename.lower().endswith('.zip'):
+        return jsonify({"error": "Only ZIP archives are allowed"}), 400
+
+    # The upload is closed once the view returns, so the archive is copied
+    # to a temporary file that the streaming response owns. Members are read
+    # from it one at a time, never unpacked together.
+    spool = tempfile.TemporaryFile()
+    shutil.copyfileobj(file.stream, spool)
+    try:
+        archive = zipfile.ZipFile(spool)
+    except zipfile.BadZipFile:
+        spool.close()
+        return jsonify({"error": "Not a valid ZIP archive"}), 400
+    members = archive_members(archive)
+    error = None
+    if not members:
+        error = "No PDF files in the archive"
+    elif len(members) > BULK_MAX_FILES:
+        error = f"Too many PDFs in the archive ({len(members)}; limit {BULK_MAX_FILES})"
+    if error:
+        archive.close()
+        spool.close()
+        return jsonify({"error": error}), 400
+
+    key = answer_key_registry.active()
+    file_limit = int(BULK_MAX_FILE_MB * 1024 * 1024)
+    total_limit = int(BULK_MAX_TOTAL_MB * 1024 * 1024)
+    too_large = f"File larger than {BULK_MAX_FILE_MB:g} MB"
+
+    def finish(name, sheet_key, parsed, timings, cache_status):
+        result = score_parsed(parsed, key, timings)
+        if result is None:
+            return {"file": name, "error": NO_ANSWERS_ERROR}
+        result_cache.put("result", f"{sheet_key}-{key['version']}", result)
+        store_result(result)
+        return dict(result, file=name, debug=dict(result["debug"], timings_ms=timings, cache=cache_status))
+
+    # Sheets submitted to the worker pool and not yet reported
+    pending = {}
+
+    def generate():
+        try:
+            yield from score_members()
+        finally:
+            # Ends early when the client disconnects: sheets not yet started
+            # are not scored
+            for future in pending:
+                future.cancel()
+            archive.close()
+            spool.close()
+
+    def score_members():
+        summary = {"files": len(members), "scored": 0, "errors": 0}
+        total_read = 0
+        # At most two sheets per worker are held in memory at a time
+        window = BULK_WORKERS * 2
+        remaining = iter(members)
+        start = time.perf_counter()
+
+        def emit(line):
+            summary["errors" if "error" in line else "scored"] += 1
+            return json.dumps(line) + "\n"
+
+        while True:
+            for info in remaining:
+                name = info.filename
+                data = None if info.file_size > file_limit else read_member(archive, info, file_limit)
+                if data is None:
+                    yield emit({"file": name, "error": too_large})
+                    continue
+                total_read += len(data)
+                if total_read > total_limit:
+                    yield emit({"file": name, "error": f"Archive exceeds {BULK_MAX_TOTAL_MB:g} MB uncompressed; stopped here"})
+                    remaining = iter(())
+                    break
+
+                # Same caches as single uploads
+                sheet_key = sheet_cache_key(data, PDF_BACKEND)
+                result = result_cache.get("result", f"{sheet_key}-{key['version']}")
+                if result is not None:
+                    store_result(result)
+                    yield emit(dict(result, file=name, debug=dict(result["debug"], cache="result")))
+                    continue
+                parsed = result_cache.get("parsed", sheet_key)
+                if parsed is not None:
+                    yield emit(finish(name, sheet_key, parsed, {}, "parsed"))
+                    continue
+                pending[get_bulk_pool().submit(parse_member, data)] = (name, sheet_key)
+                if len(pending) >= window:
+                    break
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, sheet_key = pending.pop(future)
+                try:
+                    parsed, timings = future.result()
+                    result_cache.put("parsed", sheet_key, parsed)
+                    line = finish(name, sheet_key, parsed, timings, "miss")
+                except Exception as e:
+                    line = {"file": name, "error": str(e)}
+                yield emit(line)
+
+        summary["not_scored"] = summary["files"] - summary["scored"] - summary["errors"]
+        summary["elapsed_ms"] = elapsed_ms(start)
+        summary["answer_key_version"] = key["version"]
+        yield json.dumps({"summary": summary}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+def parse_in_pool(pdf_bytes, timings):
+    """parse_upload on the bulk pool, so job threads do not contend for the GIL"""
+    parsed, worker_timings = get_bulk_pool().submit(parse_member, pdf_bytes).result()
+    timings.update(worker_timings)
+    return parsed
+
+def run_scoring_job(pdf_bytes):
+    """Job handler: the response /api/calculate-score would have given"""
+    result, _ = score_upload(pdf_bytes, answer_key_registry.active(), {}, parse=parse_in_pool)
+    if result is None:
+        raise ValueError(NO_ANSWERS_ERROR)
+    return result
+
+# Async scoring jobs (see jobs.py). JOBS_DB shares one queue between all
+# workers on the host through SQLite; without it each process has its own.
+job_queue = JobQueue(
+    run_scoring_job,
+    store=SqliteJobStore(os.environ["JOBS_DB"]) if os.environ.get("JOBS_DB") else MemoryJobStore(),
+    workers=int(os.environ.get("JOB_WORKERS", "2")),
+    max_queued=int(os.environ.get("JOB_QUEUE_SIZE", "100")),
+    ttl=float(os.environ.get("JOB_TTL_SECONDS", "3600"))
+)
+if SERVER_PROCESS:
+    job_queue.start()
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """Queue a response sheet for scoring and return its job id at once"""
+    if 'file' not in request.files:
+        return jsonify({"error": "No file provided"}), 400
+
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({"error": "No file selected"}), 400
+
+    if not file.filename.endswith('.pdf'):
+        return jsonify({"error": "Only PDF files are allowed"}), 400
+
+    try:
+        job_id = job_queue.submit(file.read())
+    except QueueFull:
+        response = jsonify({"error": "Too many sheets waiting to be scored; try again shortly"})
+        response.headers["Retry-After"] = "5"
+        return response, 503
+    return jsonify({"job_id": job_id, "status": "queued", "status_url": f"/api/jobs/{job_id}"}), 202
+
+@app.route('/api/jobs/stats', methods=['GET'])
+def job_stats():
+    return jsonify(job_queue.stats())
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """A job's status, and its result or error once finished. ?wait=N holds
+    the request up to N seconds (at most 60) for the job to finish."""
+    try:
+        wait_seconds = min(60.0, max(0.0, float(request.args.get("wait", "0"))))
+    except ValueError:
+        return jsonify({"error": "wait must be a number of seconds"}), 400
+    job = job_queue.get(job_id, wait_seconds)
+    if job is None:
+        return jsonify({"error": "Job not found or expired"}), 404
+    return jsonify(job), 200
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(dict(result_cache.stats(), answer_key_version=answer_key_registry.active()["version"],
+                        score_writes=score_writer.stats()))
+
+@app.route('/api/answer-keys', methods=['GET'])
+def answer_keys():
+    return jsonify({"versions": answer_key_registry.versions()})
+
+@app.route('/api/what-if', methods=['POST'])
+def what_if():
+    """Scores under every combination of accepted challenges, for one stored
+    student or as score distributions over everyone stored"""
+    body = request.get_json(silent=True) or {}
+    key = answer_key_registry.active()
+    try:
+        disputes = [parse_dispute(spec, key["answers"]) for spec in body.get("disputes", [])]
+    except ValueError as e:
+        return jsonify({"error": f"Invalid dispute: {e}"}), 400
+    if not disputes:
+        return jsonify({"error": "No disputes given, e.g. {\"disputes\": [\"42=C\", \"17=bonus\"]}"}), 400
+    if not score_store:
+        return jsonify({"error": "Database not configured"}), 500
+    
+    try:
+        student_id = body.get("student_id")
+        if student_id:
+            row = score_store.get(student_id, "question_details")
+            if row is None:
+                return jsonify({"error": "Score not found"}), 404
+            responses = stored_responses(row["question_details"])
+            scenarios = candidate_scenarios(responses, disputes, key["answers"])
+        elif question_stats.types == {q: official["type"] for q, official in key["answers"].items()}:
+            # Everyone's responses, encoded once per write by question_stats
+            scenarios = population_scenarios(question_stats.encoded(), disputes, key["answers"])
+        else:
+            candidates = [
+                stored_responses(row["question_details"])
+                for rows in score_store.iter_rows(1000, "id, question_details")
+                for row in rows
+            ]
+            scenarios = population_scenarios(encode_responses(candidates, key["answers"]), disputes, key["answers"])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    
+    return jsonify({
+        "answer_key_version": key["version"],
+        "answer_key_name": key["name"],
+        "student_id": student_id,
+        "scenarios": scenarios
+    }), 200
+
 @app.route('/api/scores/<student_id>', methods=['GET'])
 def get_score(student_id):
-    if not supabase:
+    if not score_store:
         return jsonify({"error": "Database not configured"}), 500
     
     try:
-        result = supabase.table('scores').select('*').eq('student_id', student_id).execute()
-        if result.data:
-            return jsonify(result.data[0]), 200
+        row = score_store.get(student_id)
+        if row is not None:
+            return jsonify(row), 200
         else:
             return jsonify({"error": "Score not found"}), 404
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def encode_cursor(row):
+    """Opaque cursor after a listed row: its (total_score, id)"""
+    return base64.urlsafe_b64encode(json.dumps([row["total_score"], row["id"]]).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    score, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    return float(score), int(row_id)
+
+def conditional_response(etag, last_write, make_response):
+    """A 304 when the request's validators match, else make_response(), with
+    the ETag, Last-Modified (when known) and Cache-Control: no-cache"""
+    last_modified = datetime.fromtimestamp(int(last_write), tz=timezone.utc) if last_write else None
+    if request.if_none_match.contains(etag) or (
+            not request.if_none_match and last_modified and request.if_modified_since
+            and request.if_modified_since >= last_modified):
+        response, status = Response(status=304), 304
+    else:
+        response, status = make_response()
+    if status in [200, 304]:
+        response.set_etag(etag)
+        if last_modified:
+            response.last_modified = last_modified
+        response.headers["Cache-Control"] = "no-cache"
+    return response, status
+
 @app.route('/api/scores', methods=['GET'])
 def get_all_scores():
-    """Get all total scores for chart display"""
-    if not supabase:
+    """Total scores for chart display, highest first: every score, or up to
+    `points` of them evenly spaced over the ranking when there are more.
+    Conditional requests are answered from the in-memory distribution's
+    write clock: an unchanged poll gets a 304 without a database query.
+
+    With `limit` (and then `cursor`) it lists stored rows instead, a page at
+    a time in (total_score, id) order. Pages are revalidated against the
+    write count every worker on the host keeps in the shared spool, again
+    without a database query; without SCORE_SPOOL, against the store's row
+    count and latest updated_at (one indexed query).
+    """
+    if not score_store:
         # Return empty array instead of error when DB not configured
         return jsonify({"scores": [], "message": "Database not configured"}), 200
     
+    if "limit" in request.args or "cursor" in request.args:
+        try:
+            limit = min(max(int(request.args.get("limit", "100")), 1), SCORE_PAGE_MAX)
+            after = decode_cursor(request.args["cursor"]) if request.args.get("cursor") else None
+        except (ValueError, TypeError):
+            return jsonify({"error": "limit must be a whole number and cursor one returned by this endpoint"}), 400
+        def listing():
+            rows = score_store.page(limit, after, SCORE_PAGE_COLUMNS)
+            return jsonify({
+                "rows": rows,
+                "next_cursor": encode_cursor(rows[-1]) if len(rows) == limit else None
+            }), 200
+        try:
+            mark = score_writer.spool.write_mark()
+            if mark is not None:
+                # Re-scores bypass the spool; they show in the store version
+                created, written, last_write = mark
+                etag = f"writes-{int(created * 1000000)}-{written}-v{score_distribution.store_version}"
+                return conditional_response(etag, last_write, listing)
+            count, updated_at = score_store.last_write()
+            last_write = store_timestamp(updated_at)
+            return conditional_response(f"rows-{count}-{int(last_write * 1000000)}", last_write, listing)
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+    
     try:
-        # Fetch only total_score from all records, ordered by total_score
-        result = supabase.table('scores').select('total_score').order('total_score', desc=True).execute()
-        if result.data:
-            # Extract just the scores as a list
-            scores = [item['total_score'] for item in result.data]
-            return jsonify({"scores": scores}), 200
-        else:
-            return jsonify({"scores": []}), 200
-    except Exception as e:
-        print(f"Error fetching scores: {e}")
-        # Return empty array on error so frontend doesn't break
-        return jsonify({"scores": [], "error": str(e)}), 200
+        points = int(request.args.get("points", SCORE_SERIES_POINTS))
+    except ValueError:
+        return jsonify({"error": "points must be a whole number"}), 400
+    points = min(max(points, 2), SCORE_SERIES_MAX_POINTS)
+    
+    def series():
+        series = score_distribution.series(points)
+        series["downsampled"] = len(series["scores"]) < series["count"]
+        return jsonify(series), 200
+    return conditional_response(*score_distribution.validators(), series)
+
+@app.route('/api/export', methods=['GET'])
+def export_scores():
+    """Every stored row as CSV or JSON Lines, streamed page by page; resume
+    an interrupted download with `after` = the last id received"""
+    if not EXPORT_TOKEN:
+        return jsonify({"error": "Export is not enabled on this server"}), 403
+    if not hmac.compare_digest(request.headers.get("Authorization", "").encode("utf-8"),
+                               f"Bearer {EXPORT_TOKEN}".encode("utf-8")):
+        return jsonify({"error": "Invalid export token"}), 401
+    if not score_store:
+        return jsonify({"error": "Database not configured"}), 500
+    
+    fmt = request.args.get("format", "csv")
+    if fmt not in FORMATS:
+        return jsonify({"error": f"format must be one of: {', '.join(FORMATS)}"}), 400
+    flatten = request.args.get("flatten", "0") not in ["0", "false", ""]
+    try:
+        after = int(request.args.get("after", "0"))
+    except ValueError:
+        return jsonify({"error": "after must be a row id"}), 400
+    
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    return Response(
+        stream_with_context(iter_export(score_store, fmt, flatten, after)),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=scores.{fmt}"}
+    )
+
+@app.route('/api/rank', methods=['GET'])
+def get_rank_by_score():
+    """Rank and percentile a total score would have among the stored ones"""
+    try:
+        score = float(request.args["score"])
+    except (KeyError, ValueError):
+        score = None
+    if score is None or not math.isfinite(score):
+        return jsonify({"error": "score must be a number, e.g. /api/rank?score=72.5"}), 400
+    return jsonify(score_distribution.rank(score)), 200
+
+@app.route('/api/rank/<student_id>', methods=['GET'])
+def get_rank(student_id):
+    """A stored student's rank and percentile, from the in-memory index; a
+    student it does not know yet (uploaded through another worker since it
+    last synced) is looked up in the store and added to it"""
+    score = score_distribution.student_score(student_id)
+    if score is None and score_store:
+        try:
+            row = score_store.get(student_id, "student_id, total_score, updated_at")
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+        if row is not None:
+            score_distribution.record([row])
+            score = score_distribution.student_score(student_id)
+    if score is None:
+        return jsonify({"error": "Score not found"}), 404
+    return jsonify(dict(score_distribution.rank(score), student_id=student_id)), 200
+
+@app.route('/api/questions/stats', methods=['GET'])
+def get_question_stats():
+    """Per-question statistics over all stored results, against the active key;
+    `q` limits them to one question"""
+    summary = question_stats.summary(answer_key_registry.active()["answers"])
+    if request.args.get("q"):
+        questions = [q for q in summary["questions"] if str(q["q_num"]) == request.args["q"].lstrip("Qq")]
+        if not questions:
+            return jsonify({"error": "Unknown question"}), 404
+        summary = dict(summary, questions=questions)
+    response = jsonify(summary)
+    response.headers["Cache-Control"] = f"public, max-age={QUESTION_STATS_MAX_AGE}"
+    return response, 200
+
+@app.route('/api/distribution', methods=['GET'])
+def get_distribution():
+    """Histogram, quantiles and count of all stored total scores"""
+    try:
+        width = float(request.args.get("bin", "5"))
+    except ValueError:
+        return jsonify({"error": "bin must be a number of marks"}), 400
+    if not math.isfinite(width) or width < score_distribution.step:
+        return jsonify({"error": f"bin must be a number of marks, at least {score_distribution.step}"}), 400
+    # One bin already holds every score
+    width = min(width, score_distribution.high - score_distribution.low)
+    return jsonify(score_distribution.summary(width)), 200
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
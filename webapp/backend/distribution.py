@@ -0,0 +1,253 @@
+"""
+Score distribution, kept up to date as scores are written.
+
+Total scores lie on a 0.5-mark grid (an MCQ wrong answer costs 0.5) between
+the lowest and highest totals any answer key for the paper's questions
+allows, so rows scored with a draft or a revised key fit as well, and the
+distribution is
+kept exactly: one count per grid point, plus each student's current grid
+point so a re-upload moves the student instead of counting them twice.
+Histograms of any bin width, quantiles and a downsampled series of the
+ranked scores are all read from those counts, and a Fenwick tree over them
+answers rank and percentile queries in O(log n), all without touching the
+database.
+
+Each process builds its copy from the score store when it starts, applies
+the rows it accepts (as they are queued) and writes itself, adds a student
+it is asked about but does not know from the store, and picks up what other
+workers wrote from the rows updated since the latest it has seen, rebuilding
+only when a re-scoring job bumps the store version (see store_sync.py).
+
+The latest updated_at among the rows it has seen is kept as a store-wide
+write clock: with the row count and the sum of the scores it makes
+validators (ETag, Last-Modified) that change whenever a row is written and
+that every worker which has seen the same rows agrees on.
+"""
+import math
+import os
+import sys
+import threading
+import time
+
+from store_sync import keep_in_sync, store_timestamp
+
+root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(root_dir)
+from calculate_score import MCQ_MARKS, MSQ_MARKS, OFFICIAL_ANSWERS, OPTION_BITS
+
+STEP = 0.5
+QUANTILES = [0.1, 0.25, 0.5, 0.75, 0.9, 0.99]
+
+# Every mark a question of each type can get, whatever its correct answer
+TYPE_MARKS = {
+    "NAT": [0, 4],
+    "MSQ": [marks for key in range(1, 16) for marks in MSQ_MARKS[key]],
+    "MCQ": [marks for key in OPTION_BITS.values() for marks in MCQ_MARKS[key]]
+}
+
+def score_range(answers=OFFICIAL_ANSWERS):
+    """Lowest and highest total that any answer key with the same question
+    types allows - so revising a key never moves a total off the grid"""
+    low = sum(min(TYPE_MARKS[official["type"]]) for official in answers.values())
+    high = sum(max(TYPE_MARKS[official["type"]]) for official in answers.values())
+    return low, high
+
+class FenwickTree:
+    """Counts per grid point with O(log n) updates and prefix sums"""
+    def __init__(self, counts):
+        # Built in O(n): each node passes its partial sum to its parent
+        self._tree = [0] + list(counts)
+        for i in range(1, len(self._tree)):
+            parent = i + (i & -i)
+            if parent < len(self._tree):
+                self._tree[parent] += self._tree[i]
+
+    def add(self, point, delta):
+        i = point + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def prefix(self, point):
+        """Sum of the counts at points 0..point"""
+        total = 0
+        i = point + 1
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+class ScoreDistribution:
+    def __init__(self, low, high, step=STEP):
+        self.low = low
+        self.high = high
+        self.step = step
+        self._counts = [0] * (int(round((high - low) / step)) + 1)
+        self._points = {}
+        self._tree = FenwickTree(self._counts)
+        self._lock = threading.Lock()
+        self._during_rebuild = None
+        self._thread = None
+        self._last_write = 0
+        self.updated_at = None
+        # Store version (score_store.version()) of the last rebuild
+        self.store_version = None
+
+    def _point(self, score):
+        # Totals outside the range (from a key with other question types)
+        # are kept at its ends
+        return min(len(self._counts) - 1, max(0, int(round((score - self.low) / self.step))))
+
+    def _apply(self, counts, points, student_id, score):
+        """Move a student to the point of their score; returns (old, new) point"""
+        old = points.get(student_id)
+        if old is not None:
+            counts[old] -= 1
+        points[student_id] = self._point(score)
+        counts[points[student_id]] += 1
+        return old, points[student_id]
+
+    def record(self, rows):
+        """Apply queued or written score rows (student_id, total_score)"""
+        with self._lock:
+            for row in rows:
+                old, new = self._apply(self._counts, self._points, row["student_id"], row["total_score"])
+                if old is not None:
+                    self._tree.add(old, -1)
+                self._tree.add(new, 1)
+                self._last_write = max(self._last_write, store_timestamp(row.get("updated_at")))
+                if self._during_rebuild is not None:
+                    self._during_rebuild.append((row["student_id"], row["total_score"]))
+
+    def rebuild(self, pages, store_version=None):
+        """Recount from pages of stored rows (student_id, total_score and
+        optionally updated_at / created_at), read at `store_version`"""
+        with self._lock:
+            self._during_rebuild = []
+        counts = [0] * len(self._counts)
+        points = {}
+        last_write = 0
+        try:
+            for rows in pages:
+                for row in rows:
+                    self._apply(counts, points, row["student_id"], row["total_score"])
+                    last_write = max(last_write, store_timestamp(row.get("updated_at") or row.get("created_at")))
+        finally:
+            with self._lock:
+                written, self._during_rebuild = self._during_rebuild, None
+        with self._lock:
+            # Rows written while the pages were read may be missing from them
+            for student_id, score in written:
+                self._apply(counts, points, student_id, score)
+            self._counts, self._points, self._tree = counts, points, FenwickTree(counts)
+            self._last_write = max(self._last_write, last_write)
+            self.updated_at = time.time()
+            self.store_version = store_version
+
+    def start(self, load_pages, load_changes=None, version=None, poll_seconds=10, refresh_seconds=None):
+        """Build in the background now, then apply the rows load_changes()
+        finds every poll_seconds (see store_sync.keep_in_sync)"""
+        if self._thread is not None:
+            return
+        self._thread = keep_in_sync("Score distribution", self, load_pages, load_changes, version,
+                                    poll_seconds, refresh_seconds)
+
+    def rank(self, score):
+        """Rank of a total score among the stored ones: 1 + the number of
+        students above it, with the share at or below it (`percentile`) and
+        the share at or above it (`top_percent`)"""
+        point = self._point(score)
+        with self._lock:
+            total = self._tree.prefix(len(self._counts) - 1)
+            at_or_below = self._tree.prefix(point)
+            below = self._tree.prefix(point - 1) if point else 0
+        if not total:
+            return {"score": score, "rank": None, "count": 0}
+        return {
+            "score": score,
+            "rank": total - at_or_below + 1,
+            "count": total,
+            "percentile": round(at_or_below / total * 100, 2),
+            "top_percent": round((total - below) / total * 100, 2)
+        }
+
+    def validators(self):
+        """(ETag, last write time) of the stored scores as this process has seen them"""
+        with self._lock:
+            total = sum(self._counts)
+            points = sum(p * c for p, c in enumerate(self._counts))
+            last_write = self._last_write
+        return f"{total}-{points}-{int(last_write * 1000000)}", last_write
+
+    def student_score(self, student_id):
+        """A student's total as last written, or None when unknown"""
+        with self._lock:
+            point = self._points.get(student_id)
+        return None if point is None else self._value(point)
+
+    def _value(self, point):
+        return self.low + point * self.step
+
+    def _snapshot(self):
+        with self._lock:
+            return list(self._counts)
+
+    def _at_ranks(self, counts, positions):
+        """Scores at ascending 0-based positions (sorted) of the ranked scores"""
+        values = []
+        cumulative = 0
+        point = -1
+        for position in positions:
+            while cumulative <= position:
+                point += 1
+                cumulative += counts[point]
+            values.append(self._value(point))
+        return values
+
+    def quantiles(self, counts=None, qs=QUANTILES):
+        if counts is None:
+            counts = self._snapshot()
+        total = sum(counts)
+        if not total:
+            return {}
+        values = self._at_ranks(counts, [min(total - 1, int(q * total)) for q in qs])
+        return {f"p{round(q * 100)}": value for q, value in zip(qs, values)}
+
+    def histogram(self, width, counts=None):
+        """Counts in fixed bins of `width` marks; bin edges are multiples of width"""
+        if counts is None:
+            counts = self._snapshot()
+        start = math.floor(self.low / width) * width
+        bins = [0] * (math.floor((self.high - start) / width + 1e-9) + 1)
+        for point, count in enumerate(counts):
+            if count:
+                bins[math.floor((self._value(point) - start) / width + 1e-9)] += count
+        return [{"low": start + i * width, "high": start + (i + 1) * width, "count": count}
+                for i, count in enumerate(bins)]
+
+    def series(self, points):
+        """Up to `points` scores, highest first, evenly spaced over the ranking,
+        with their ranks (1 = highest); every score when there are fewer"""
+        counts = self._snapshot()
+        total = sum(counts)
+        if total <= points:
+            ranks = list(range(1, total + 1))
+        else:
+            ranks = sorted({round(1 + i * (total - 1) / (points - 1)) for i in range(points)})
+        # Rank r (highest first) is ascending position total - r
+        scores = self._at_ranks(counts, [total - rank for rank in reversed(ranks)])[::-1]
+        return {"scores": scores, "ranks": ranks, "count": total}
+
+    def summary(self, width):
+        counts = self._snapshot()
+        total = sum(counts)
+        return {
+            "count": total,
+            "mean": round(sum(c * self._value(p) for p, c in enumerate(counts)) / total, 2) if total else None,
+            "min": self._at_ranks(counts, [0])[0] if total else None,
+            "max": self._at_ranks(counts, [total - 1])[0] if total else None,
+            "quantiles": self.quantiles(counts),
+            "bin_width": width,
+            "bins": self.histogram(width, counts),
+            "updated_at": self.updated_at
+        }
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+"""
+Export the scores table as CSV or JSON Lines, streamed in pages.
+
+Rows are read in pages ordered by id (keyset paging) and written as each
+page arrives, so memory use does not grow with the table. With --flatten
+the section_details and question_details blobs become plain columns: per
+section nat_/msq_/mcq_ correct, wrong and unattempted, and per question its
+score (q1..q44) and the student's answer (a1..a44), as in batch_score.py.
+Without it they are kept as JSON (a JSON string in a CSV cell).
+
+Usage:
+    python export.py --out scores.csv [--format csv|jsonl] [--flatten]
+                     [--page-size 1000] [--sqlite scores.db]
+
+Rows come from Supabase (SUPABASE_URL, SUPABASE_KEY) or, with --sqlite, the
+local scores table SCORE_SPOOL keeps. An interrupted export is resumed:
+when --out already exists, a partly written last row is dropped and the
+rows after the last complete one are appended. GET /api/export serves the
+same stream over HTTP, resumable with ?after=<last id received>.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+
+root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(root_dir)
+from calculate_score import OFFICIAL_ANSWERS
+
+BASE_COLUMNS = ["id", "student_id", "name", "total_score", "nat_score", "msq_score", "mcq_score",
+                "created_at", "updated_at"]
+DETAIL_COLUMNS = ["section_details", "question_details"]
+SECTIONS = {"nat": "NAT Section", "msq": "MSQ Section", "mcq": "MCQ Section"}
+SECTION_FIELDS = ["correct", "wrong", "unattempted"]
+Q_NUMS = sorted(OFFICIAL_ANSWERS)
+FORMATS = ["csv", "jsonl"]
+
+def export_columns(flatten):
+    if not flatten:
+        return BASE_COLUMNS + DETAIL_COLUMNS
+    return (BASE_COLUMNS
+            + [f"{s}_{field}" for s in SECTIONS for field in SECTION_FIELDS]
+            + [f"q{q}" for q in Q_NUMS]
+            + [f"a{q}" for q in Q_NUMS])
+
+def flatten_row(row):
+    """A stored row with its section and question details as plain columns"""
+    flat = {column: row.get(column) for column in BASE_COLUMNS}
+    sections = row.get("section_details") or {}
+    for s, section_name in SECTIONS.items():
+        for field in SECTION_FIELDS:
+            flat[f"{s}_{field}"] = (sections.get(section_name) or {}).get(field)
+    questions = row.get("question_details") or {}
+    for q in Q_NUMS:
+        details = questions.get(f"Q{q}") or {}
+        flat[f"q{q}"] = details.get("score")
+        flat[f"a{q}"] = details.get("student_answer")
+    return flat
+
+def iter_export(store, fmt="csv", flatten=False, after=0, page_size=1000, header=None):
+    """The export as text chunks, one per page of rows with id > `after`.
+
+    A CSV starts with its header row unless it resumes (by default, when
+    `after` > 0).
+    """
+    columns = export_columns(flatten)
+    if header is None:
+        header = not after
+    if fmt == "csv" and header:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(columns)
+        yield buffer.getvalue()
+    for rows in store.iter_rows(page_size, "*", after):
+        buffer = io.StringIO()
+        if fmt == "csv":
+            writer = csv.writer(buffer)
+            for row in rows:
+                row = flatten_row(row) if flatten else dict(
+                    row, **{c: json.dumps(row[c]) if row.get(c) is not None else None for c in DETAIL_COLUMNS})
+                writer.writerow([row.get(column) for column in columns])
+        else:
+            for row in rows:
+                row = flatten_row(row) if flatten else {column: row.get(column) for column in columns}
+                buffer.write(json.dumps(row) + "\n")
+        yield buffer.getvalue()
+
+def resume_point(path, fmt):
+    """Drop a partly written last record from an earlier export in `path` and
+    return the id of its last complete row (0 when it has none)"""
+    with open(path, "rb+") as f:
+        size = f.seek(0, os.SEEK_END)
+        if fmt == "jsonl":
+            start, end = _last_line(f)
+        else:
+            start, end = _last_csv_record(f)
+        f.seek(start)
+        last = f.read(end - start).decode("utf-8")
+        if end < size:
+            f.truncate(end)
+    if not last.strip():
+        return 0
+    if fmt == "jsonl":
+        return int(json.loads(last)["id"])
+    values = next(csv.reader(io.StringIO(last, newline="")))
+    return 0 if values[0] == "id" else int(values[0])
+
+def _last_line(f):
+    """(start, end) offsets of the last complete line; JSON Lines records
+    never hold a raw newline, so the end of the file is enough"""
+    # Read back from the end until the last complete line is in view
+    tail = b""
+    while f.tell() > 0 and tail.count(b"\n") < 2:
+        step = min(65536, f.tell())
+        f.seek(f.tell() - step)
+        tail = f.read(step) + tail
+        f.seek(f.tell() - step)
+    base = f.tell()
+    end = tail.rfind(b"\n") + 1
+    return base + tail.rfind(b"\n", 0, max(end - 1, 0)) + 1, base + end
+
+def _last_csv_record(f):
+    """(start, end) offsets of the last complete CSV record. A quoted field
+    may hold newlines (NAT answers, the question_details JSON), so a line
+    ends a record only when the quotes read so far are balanced - the file
+    is scanned from the start, since a tail alone cannot tell."""
+    f.seek(0)
+    start = end = offset = quotes = 0
+    record_start = 0
+    for line in f:
+        offset += len(line)
+        quotes += line.count(b'"')
+        if quotes % 2 == 0 and line.endswith(b"\n"):
+            start, end = record_start, offset
+            record_start = offset
+    return start, end
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the scores table as CSV or JSON Lines")
+    parser.add_argument("--out", required=True, help="File to write; an existing one is resumed")
+    parser.add_argument("--format", choices=FORMATS, help="Default: from the --out extension, else csv")
+    parser.add_argument("--flatten", action="store_true", help="Section and question details as plain columns")
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--sqlite", help="Read the local SQLite scores table (SCORE_SPOOL) instead of Supabase")
+    args = parser.parse_args()
+    fmt = args.format or ("jsonl" if args.out.endswith((".jsonl", ".ndjson")) else "csv")
+
+    if args.sqlite:
+        from score_store import SqliteScores
+        store = SqliteScores(args.sqlite)
+    else:
+        from dotenv import load_dotenv
+        from supabase import create_client
+        from score_store import SupabaseScores
+        load_dotenv()
+        url = os.environ.get("SUPABASE_URL")
+        key = os.environ.get("SUPABASE_KEY")
+        if not url or not key:
+            print("SUPABASE_URL and SUPABASE_KEY must be set (or use --sqlite)")
+            sys.exit(1)
+        store = SupabaseScores(create_client(url, key))
+
+    after = resume_point(args.out, fmt) if os.path.exists(args.out) else 0
+    header = not os.path.exists(args.out) or os.path.getsize(args.out) == 0
+    if after:
+        print(f"Resuming {args.out} after row id {after}")
+
+    start = time.perf_counter()
+    rows = 0
+    with open(args.out, "a", newline="", encoding="utf-8") as out:
+        for chunk in iter_export(store, fmt, args.flatten, after, args.page_size, header):
+            out.write(chunk)
+            out.flush()
+            rows += chunk.count("\n")
+            print(f"  {rows} lines written", end="\r")
+    print(f"\n{args.out}: {rows} lines written in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+Asynchronous scoring jobs.
+
+A job is submitted with its payload (the uploaded PDF bytes) and gets an id
+straight away; a bounded pool of worker threads runs the handler and keeps
+the result, or the error, until it expires. Clients poll a job, or wait on
+it for up to a given number of seconds.
+
+Jobs live in a store. MemoryJobStore keeps them in this process only.
+SqliteJobStore keeps them in a local SQLite file - a stand-in for a real
+broker - so every gunicorn worker on the host shares one queue: any worker
+can take a job, and any worker can answer a poll for it. A job left
+"running" by a worker that died is queued again after `stale_seconds`.
+
+Queue depth, and the wait (submitted -> started) and run (started ->
+finished) times of recent jobs, are reported by JobQueue.stats().
+"""
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import closing
+
+TIMING_SAMPLES = 1000
+
+class QueueFull(Exception):
+    pass
+
+def _percentiles(values):
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values) * 1000, 2),
+        "p50_ms": round(pick(0.5) * 1000, 2),
+        "p95_ms": round(pick(0.95) * 1000, 2),
+        "max_ms": round(values[-1] * 1000, 2)
+    }
+
+def _public(job):
+    """A job as returned to clients: everything but the payload"""
+    return {k: v for k, v in job.items() if k != "payload"}
+
+class MemoryJobStore:
+    def __init__(self):
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, job_id, payload, max_queued):
+        with self._lock:
+            queued = sum(1 for job in self._jobs.values() if job["status"] == "queued")
+            if queued >= max_queued:
+                raise QueueFull()
+            self._jobs[job_id] = {"job_id": job_id, "status": "queued", "payload": payload,
+                                  "submitted": time.time(), "started": None, "finished": None,
+                                  "result": None, "error": None}
+
+    def claim(self, stale_seconds):
+        with self._lock:
+            for job in self._jobs.values():
+                if job["status"] == "queued":
+                    job["status"] = "running"
+                    job["started"] = time.time()
+                    return job["job_id"], job["payload"]
+        return None
+
+    def finish(self, job_id, result=None, error=None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(status="failed" if error else "done", result=result, error=error,
+                           finished=time.time(), payload=None)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return _public(job) if job else None
+
+    def expire(self, ttl):
+        cutoff = time.time() - ttl
+        with self._lock:
+            for job_id in [i for i, job in self._jobs.items() if job["finished"] and job["finished"] < cutoff]:
+                del self._jobs[job_id]
+
+    def counts(self):
+        with self._lock:
+            counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+            for job in self._jobs.values():
+                counts[job["status"]] += 1
+            return counts
+
+    def timings(self, limit):
+        with self._lock:
+            started = [job for job in self._jobs.values() if job["started"]]
+        started = sorted(started, key=lambda job: job["started"])[-limit:]
+        return [(job["submitted"], job["started"], job["finished"]) for job in started]
+
+class SqliteJobStore:
+    def __init__(self, path):
+        self.path = path
+        with closing(self._connect()) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY, status TEXT NOT NULL, payload BLOB,
+                submitted REAL NOT NULL, started REAL, finished REAL, result TEXT, error TEXT)""")
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, submitted)")
+
+    def _connect(self):
+        # One connection per call: connections cannot be shared across threads
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def add(self, job_id, payload, max_queued):
+        with closing(self._connect()) as db:
+            db.execute("BEGIN IMMEDIATE")
+            queued = db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= max_queued:
+                db.execute("ROLLBACK")
+                raise QueueFull()
+            db.execute("INSERT INTO jobs (job_id, status, payload, submitted) VALUES (?, 'queued', ?, ?)",
+                       (job_id, payload, time.time()))
+            db.execute("COMMIT")
+
+    def claim(self, stale_seconds):
+        now = time.time()
+        with closing(self._connect()) as db:
+            # Taken under a write lock, so two workers never claim the same job
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute(
+                "SELECT job_id, payload FROM jobs WHERE status = 'queued' OR (status = 'running' AND started < ?) "
+                "ORDER BY submitted LIMIT 1", (now - stale_seconds,)).fetchone()
+            if row is None:
+                db.execute("ROLLBACK")
+                return None
+            db.execute("UPDATE jobs SET status = 'running', started = ? WHERE job_id = ?", (now, row[0]))
+            db.execute("COMMIT")
+        return row[0], row[1]
+
+    def finish(self, job_id, result=None, error=None):
+        with closing(self._connect()) as db:
+            db.execute("UPDATE jobs SET status = ?, result = ?, error = ?, finished = ?, payload = NULL WHERE job_id = ?",
+                       ("failed" if error else "done", json.dumps(result) if result is not None else None,
+                        error, time.time(), job_id))
+
+    def get(self, job_id):
+        with closing(self._connect()) as db:
+            row = db.execute("SELECT job_id, status, submitted, started, finished, result, error FROM jobs WHERE job_id = ?",
+                             (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(["job_id", "status", "submitted", "started", "finished", "result", "error"], row))
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def expire(self, ttl):
+        with closing(self._connect()) as db:
+            db.execute("DELETE FROM jobs WHERE finished IS NOT NULL AND finished < ?", (time.time() - ttl,))
+
+    def counts(self):
+        counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+        with closing(self._connect()) as db:
+            for status, count in db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"):
+                counts[status] = count
+        return counts
+
+    def timings(self, limit):
+        with closing(self._connect()) as db:
+            return db.execute("SELECT submitted, started, finished FROM jobs WHERE started IS NOT NULL "
+                              "ORDER BY started DESC LIMIT ?", (limit,)).fetchall()
+
+class JobQueue:
+    def __init__(self, handler, store=None, workers=2, max_queued=100, ttl=3600, stale_seconds=600, poll_seconds=0.25):
+        self.handler = handler
+        self.store = store or MemoryJobStore()
+        self.workers = workers
+        self.max_queued = max_queued
+        self.ttl = ttl
+        self.stale_seconds = stale_seconds
+        self.poll_seconds = poll_seconds
+        self._wakeup = threading.Condition()
+        self._threads = []
+
+    def start(self):
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"score-job-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, payload):
+        """Queue a job and return its id; raises QueueFull when the queue is full"""
+        job_id = uuid.uuid4().hex
+        self.store.add(job_id, payload, self.max_queued)
+        with self._wakeup:
+            self._wakeup.notify_all()
+        return job_id
+
+    def get(self, job_id, wait=0):
+        """The job, waiting up to `wait` seconds for it to finish; None when
+        unknown or expired"""
+        deadline = time.time() + wait
+        job = self.store.get(job_id)
+        while job is not None and job["status"] in ["queued", "running"] and time.time() < deadline:
+            # Woken by local workers; jobs run by other processes are polled
+            with self._wakeup:
+                self._wakeup.wait(min(self.poll_seconds * 4, max(0, deadline - time.time())))
+            job = self.store.get(job_id)
+        if job is not None and job["finished"] and job["finished"] < time.time() - self.ttl:
+            return None
+        return job
+
+    def stats(self):
+        counts = self.store.counts()
+        timings = self.store.timings(TIMING_SAMPLES)
+        return {
+            "queue_depth": counts["queued"],
+            "max_queued": self.max_queued,
+            "workers": self.workers,
+            "jobs": counts,
+            "wait_time": _percentiles([started - submitted for submitted, started, _ in timings]),
+            "run_time": _percentiles([finished - started for _, started, finished in timings if finished]),
+            "ttl_seconds": self.ttl
+        }
+
+    def _work(self):
+        last_expiry = 0
+        while True:
+            if time.time() - last_expiry > 60:
+                last_expiry = time.time()
+                try:
+                    self.store.expire(self.ttl)
+                except Exception as e:
+                    print(f"Job expiry failed: {e}")
+            try:
+                claimed = self.store.claim(self.stale_seconds)
+            except Exception as e:
+                print(f"Job claim failed: {e}")
+                claimed = None
+            if claimed is None:
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_seconds)
+                continue
+
+            job_id, payload = claimed
+            try:
+                self.store.finish(job_id, result=self.handler(payload))
+            except Exception as e:
+                self.store.finish(job_id, error=str(e))
+            with self._wakeup:
+                self._wakeup.notify_all()
@@ -0,0 +1,240 @@
+"""
+Per-question statistics over all stored results.
+
+Each stored row's question_details is reduced to one code per question with
+calculate_score.response_code, the encoding scoring itself uses: the
+chosen-option mask of an MSQ/MCQ answer, or the NAT value (interned per
+question; 0 = blank, UNREADABLE = an answer that is not a number). For every
+question this keeps how many students gave each code, plus each student's
+codes (2 bytes a question) so a re-upload replaces their contribution
+instead of adding to it. What is reported -
+attempt rate, accuracy, option picks, NAT values, mean marks - is derived
+from those counts and the active answer key when asked for, so a key
+revision needs no recount. The same codes give the what-if endpoint every
+student's responses in batch_scoring's encoding, without reading the store.
+
+Like the score distribution, each process builds its copy from the store in
+one streaming pass when it starts, applies the rows it writes itself, picks
+up rows written elsewhere from those updated since the latest it has seen,
+and rebuilds only when a re-scoring job bumps the store version (see
+store_sync.py).
+"""
+import math
+import os
+import sys
+import threading
+import time
+from array import array
+from collections import Counter
+
+import numpy as np
+
+root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(root_dir)
+from calculate_score import (
+    INVALID_MCQ,
+    OFFICIAL_ANSWERS,
+    OPTION_BITS,
+    answer_display,
+    code_marks,
+    compiled_key,
+    response_code
+)
+from rescore import stored_response
+from store_sync import keep_in_sync
+
+NAT_TOP_VALUES = 20
+UNREADABLE = 65535
+
+class QuestionStats:
+    def __init__(self, answers=OFFICIAL_ANSWERS):
+        self.types = {q: official["type"] for q, official in answers.items()}
+        self.q_nums = sorted(self.types)
+        self._counts = {q: Counter() for q in self.q_nums}
+        self._students = {}
+        # NAT values seen per question, in order; a code is an index + 1
+        self._nat_values = {q: [] for q in self.q_nums if self.types[q] == "NAT"}
+        self._nat_codes = {q: {} for q in self._nat_values}
+        self._lock = threading.Lock()
+        self._intern_lock = threading.Lock()
+        self._during_rebuild = None
+        self._version = 0
+        self._cached = (None, None)
+        self._encoded = (None, None)
+        self._thread = None
+        self.updated_at = None
+
+    def _nat_code(self, q_num, answer):
+        value = response_code("NAT", answer)
+        if math.isnan(value):
+            return 0 if answer["answer"] in [None, "--"] else UNREADABLE
+        codes = self._nat_codes[q_num]
+        code = codes.get(value)
+        if code is None:
+            with self._intern_lock:
+                code = codes.get(value)
+                if code is None:
+                    values = self._nat_values[q_num]
+                    if len(values) >= UNREADABLE - 1:
+                        # Out of codes: counted as attempted with no value
+                        return UNREADABLE
+                    values.append(value)
+                    code = codes[value] = len(values)
+        return code
+
+    def encode(self, question_details):
+        """A stored row's question_details as packed per-question codes"""
+        details = question_details or {}
+        codes = array("H")
+        for q_num in self.q_nums:
+            stored = details.get(f"Q{q_num}")
+            if stored is None:
+                codes.append(0)
+                continue
+            answer = stored_response(stored)
+            if self.types[q_num] == "NAT":
+                codes.append(self._nat_code(q_num, answer))
+            else:
+                codes.append(response_code(self.types[q_num], answer))
+        return codes.tobytes()
+
+    def _apply(self, counts, students, student_id, codes):
+        old = students.get(student_id)
+        if old == codes:
+            return False
+        if old is not None:
+            for q_num, code in zip(self.q_nums, array("H", old)):
+                counts[q_num][code] -= 1
+        students[student_id] = codes
+        for q_num, code in zip(self.q_nums, array("H", codes)):
+            counts[q_num][code] += 1
+        return True
+
+    def record(self, rows):
+        """Apply written score rows (student_id, question_details); a row
+        already applied changes nothing"""
+        encoded = [(row["student_id"], self.encode(row["question_details"])) for row in rows]
+        with self._lock:
+            changed = [self._apply(self._counts, self._students, student_id, codes)
+                       for student_id, codes in encoded]
+            if self._during_rebuild is not None:
+                self._during_rebuild.extend(encoded)
+            if any(changed):
+                self._version += 1
+
+    def rebuild(self, pages, store_version=None):
+        """Recount from pages of stored rows (student_id, question_details)"""
+        with self._lock:
+            self._during_rebuild = []
+        counts = {q: Counter() for q in self.q_nums}
+        students = {}
+        try:
+            for rows in pages:
+                for row in rows:
+                    self._apply(counts, students, row["student_id"], self.encode(row["question_details"]))
+        finally:
+            with self._lock:
+                written, self._during_rebuild = self._during_rebuild, None
+        with self._lock:
+            # Rows written while the pages were read may be missing from them
+            for student_id, codes in written:
+                self._apply(counts, students, student_id, codes)
+            self._counts, self._students = counts, students
+            self._version += 1
+            self.updated_at = time.time()
+
+    def start(self, load_pages, load_changes=None, version=None, poll_seconds=10, refresh_seconds=None):
+        """Build in the background now, then apply the rows load_changes()
+        finds every poll_seconds (see store_sync.keep_in_sync)"""
+        if self._thread is not None:
+            return
+        self._thread = keep_in_sync("Question statistics", self, load_pages, load_changes, version,
+                                    poll_seconds, refresh_seconds)
+
+    def encoded(self):
+        """Every student's responses as batch_scoring.encode_responses encodes
+        them ({"nat", "masks"}, one row per student), rebuilt only after rows
+        were written"""
+        with self._lock:
+            if self._encoded[0] == self._version:
+                return self._encoded[1]
+            version = self._version
+            codes = np.frombuffer(b"".join(self._students.values()), dtype=np.uint16)
+            codes = codes.reshape(len(self._students), len(self.q_nums))
+        nat_columns = []
+        for i, q_num in enumerate(self.q_nums):
+            if self.types[q_num] != "NAT":
+                continue
+            # Code 0 (blank) and codes past the values (UNREADABLE) are NaN
+            values = np.array([np.nan] + self._nat_values[q_num], dtype=np.float64)
+            column = codes[:, i]
+            nat_columns.append(np.where(column < len(values), values[np.minimum(column, len(values) - 1)], np.nan))
+        choice = [i for i, q_num in enumerate(self.q_nums) if self.types[q_num] != "NAT"]
+        encoded = {
+            "nat": np.stack(nat_columns, axis=1) if nat_columns else np.empty((len(codes), 0)),
+            "masks": codes[:, choice].astype(np.uint8)
+        }
+        with self._lock:
+            self._encoded = (version, encoded)
+        return encoded
+
+    def _question(self, q_num, counts, students, compiled, official):
+        q_type = self.types[q_num]
+        if q_type == "NAT":
+            values = [math.nan] + self._nat_values[q_num]
+            marks = {code: code_marks(compiled, values[code]) if code < len(values) else 0 for code in counts}
+        else:
+            marks = {code: compiled["marks"][code] for code in counts}
+        full = max(compiled["marks"]) if q_type != "NAT" else 4
+        attempted = students - counts[0]
+        correct = sum(n for code, n in counts.items() if code and marks[code] == full)
+        partial = sum(n for code, n in counts.items() if code and 0 < marks[code] < full)
+        stats = {
+            "q_num": q_num,
+            "type": q_type,
+            "correct_answer": answer_display(official),
+            "attempted": attempted,
+            "attempt_rate": round(attempted / students * 100, 2) if students else None,
+            "correct": correct,
+            "partial": partial,
+            "wrong": attempted - correct - partial,
+            "accuracy": round(correct / attempted * 100, 2) if attempted else None,
+            "mean_marks": round(sum(marks[code] * n for code, n in counts.items()) / students, 3) if students else None
+        }
+        if q_type == "NAT":
+            top = sorted(((n, code) for code, n in counts.items() if code and n), reverse=True)[:NAT_TOP_VALUES]
+            stats["values"] = [{"value": values[code] if code < len(values) else None, "count": n} for n, code in top]
+        else:
+            picks = {letter: 0 for letter in OPTION_BITS}
+            for code, n in counts.items():
+                if q_type == "MCQ" and code == INVALID_MCQ:
+                    picks["invalid"] = picks.get("invalid", 0) + n
+                    continue
+                for letter, bit in OPTION_BITS.items():
+                    if code & bit:
+                        picks[letter] += n
+            stats["options"] = picks
+        return stats
+
+    def summary(self, answers=OFFICIAL_ANSWERS):
+        """Statistics of every question against an answer key, recomputed only
+        after rows were written or the key changed"""
+        key = compiled_key(answers)
+        with self._lock:
+            version = (self._version, key["version"])
+            if self._cached[0] == version:
+                return self._cached[1]
+            counts = {q: Counter(c) for q, c in self._counts.items()}
+            students = len(self._students)
+        summary = {
+            "students": students,
+            "answer_key_version": key["version"],
+            "updated_at": self.updated_at,
+            "questions": [
+                self._question(q, counts[q], students, key["questions"][q], answers[q])
+                for q in self.q_nums if q in key["questions"]
+            ]
+        }
+        with self._lock:
+            self._cached = (version, summary)
+        return summary
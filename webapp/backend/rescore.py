@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+"""
+Re-score stored results after an answer-key revision, without re-uploads.
+
+The old and new keys are diffed and only the questions that changed are
+re-scored for each stored row, from the student answers already kept in its
+question_details. Rows are read in pages ordered by id, and the score
+columns of a page's changed rows are written back in one statement (the
+rescore_scores function in SUPABASE_SETUP.md). Each row is only updated if
+its updated_at is still the one read, so a sheet re-uploaded meanwhile is
+not overwritten by the re-scored old one: that row is skipped, and was
+already scored with the active key when it was uploaded. The same function
+bumps the score version servers watch, so their in-memory distribution and
+statistics are rebuilt with the new scores.
+
+Usage:
+    python rescore.py --old-key draft_key.json [--new-key final_key.pdf]
+                      [--page-size 1000] [--dry-run]
+
+Keys are JSON files written by calculate_score.save_answer_key or official
+answer-key PDFs; without --new-key the OFFICIAL_ANSWERS in calculate_score.py
+are used. Running the job twice is harmless: a question is re-scored from the
+student's answer, not adjusted by a delta.
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+from dotenv import load_dotenv
+from supabase import create_client
+
+root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(root_dir)
+from answer_keys import load_key_file
+from calculate_score import (
+    OFFICIAL_ANSWERS,
+    answer_diff,
+    answer_display,
+    compiled_key,
+    outcome,
+    score_question
+)
+
+SECTION_NAMES = {"NAT": "NAT Section", "MSQ": "MSQ Section", "MCQ": "MCQ Section"}
+SCORE_COLUMNS = {"NAT": "nat_score", "MSQ": "msq_score", "MCQ": "mcq_score"}
+
+def stored_response(stored):
+    """Rebuild the mapped response scoring needs from a stored question_details entry.
+
+    "N/A" was stored for blank or missing answers. Rows stored before the
+    status was kept have none: only "Not Answered" changes a score, and it
+    nearly always comes with a blank answer anyway.
+    """
+    student_answer = stored.get("student_answer")
+    answer = None if student_answer in ["N/A", None, ""] else student_answer
+    return {"status": stored.get("status", ""), "answer": answer, "chosen_options": answer}
+
+def stored_responses(question_details):
+    """Mapped responses (official_num -> response) of a stored row's question_details"""
+    return {
+        int(q_key[1:]): stored_response(details)
+        for q_key, details in (question_details or {}).items()
+    }
+
+def rescore_row(row, changed, new_answers):
+    """Re-score the changed questions of one stored row.
+
+    Returns the updated score columns, or None when no stored value changes.
+    """
+    key = compiled_key(new_answers)
+    questions = dict(row["question_details"] or {})
+    sections = {name: dict(details) for name, details in (row["section_details"] or {}).items()}
+    scores = {s: row[column] for s, column in SCORE_COLUMNS.items()}
+    modified = False
+
+    for q_num in changed:
+        q_key = f"Q{q_num}"
+        stored = questions.get(q_key)
+        official = new_answers.get(q_num)
+        if stored is None or official is None:
+            continue
+
+        student_answer = stored["student_answer"]
+        new_score = score_question(key["questions"][q_num], stored_response(stored))
+        new_entry = dict(stored, type=official["type"], correct_answer=answer_display(official), score=new_score)
+        if new_entry == stored:
+            continue
+        modified = True
+        questions[q_key] = new_entry
+
+        # Move the question's marks and outcome from the old entry to the new
+        for entry, sign in [(stored, -1), (new_entry, 1)]:
+            section = sections.get(SECTION_NAMES[entry["type"]])
+            scores[entry["type"]] += sign * entry["score"]
+            if section is not None:
+                section["score"] += sign * entry["score"]
+                section[outcome(entry["type"], entry["score"], student_answer)] += sign
+
+    if not modified:
+        return None
+    updated = {
+        "total_score": scores["NAT"] + scores["MSQ"] + scores["MCQ"],
+        "section_details": sections,
+        "question_details": questions,
+        "updated_at": datetime.utcnow().isoformat()
+    }
+    for s, column in SCORE_COLUMNS.items():
+        updated[column] = scores[s]
+    return updated
+
+ROW_COLUMNS = "id, nat_score, msq_score, mcq_score, section_details, question_details, updated_at"
+
+def iter_rows(supabase, page_size, columns=ROW_COLUMNS, after=0):
+    """Stored rows in pages ordered by id (keyset paging - no OFFSET scans),
+    starting after the row with id `after`"""
+    last_id = after
+    while True:
+        page = supabase.table('scores').select(columns).gt('id', last_id).order('id').limit(page_size).execute()
+        if not page.data:
+            return
+        yield page.data
+        last_id = page.data[-1]["id"]
+
+def update_unchanged(supabase, updates):
+    """Write a page of re-scored rows in one statement, each only if it was
+    not written since it was read; returns the number updated"""
+    rows = [dict(updated, id=row["id"], read_updated_at=row.get("updated_at")) for row, updated in updates]
+    return len(supabase.rpc('rescore_scores', {"rows": rows}).execute().data or [])
+
+def rescore_all(supabase, old_answers, new_answers, page_size=1000, dry_run=False):
+    changed = answer_diff(old_answers, new_answers)
+    stats = {"changed_questions": changed, "rows_read": 0, "rows_updated": 0, "rows_skipped": 0}
+    if not changed:
+        return stats
+
+    for rows in iter_rows(supabase, page_size):
+        stats["rows_read"] += len(rows)
+        updates = [(row, rescore_row(row, changed, new_answers)) for row in rows]
+        updates = [(row, updated) for row, updated in updates if updated]
+        written = len(updates) if dry_run or not updates else update_unchanged(supabase, updates)
+        stats["rows_updated"] += written
+        stats["rows_skipped"] += len(updates) - written
+        print(f"  {stats['rows_read']} rows read, {stats['rows_updated']} changed, "
+              f"{stats['rows_skipped']} skipped (written since read)")
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score stored results after an answer-key revision")
+    parser.add_argument("--old-key", required=True, help="Answer key (.json or .pdf) the stored rows were scored with")
+    parser.add_argument("--new-key", help="Answer key (.json or .pdf) to re-score with (default: OFFICIAL_ANSWERS)")
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="Compute the changes without writing them")
+    args = parser.parse_args()
+
+    load_dotenv()
+    url = os.environ.get("SUPABASE_URL")
+    key = os.environ.get("SUPABASE_KEY")
+    if not url or not key:
+        print("SUPABASE_URL and SUPABASE_KEY must be set")
+        sys.exit(1)
+
+    old_answers = load_key_file(args.old_key)
+    new_answers = load_key_file(args.new_key) if args.new_key else OFFICIAL_ANSWERS
+    changed = answer_diff(old_answers, new_answers)
+    print(f"Questions changed: {', '.join(f'Q{q}' for q in changed) or 'none'}")
+
+    start = time.perf_counter()
+    stats = rescore_all(create_client(url, key), old_answers, new_answers,
+                        args.page_size, args.dry_run)
+    elapsed = time.perf_counter() - start
+    print(f"{stats['rows_read']} rows read, {stats['rows_updated']} "
+          f"{'would be ' if args.dry_run else ''}updated, {stats['rows_skipped']} skipped in {elapsed:.1f}s")
+
+if __name__ == "__main__":
+    main()
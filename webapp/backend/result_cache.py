@@ -0,0 +1,149 @@
+"""
+Content-addressed cache for uploaded response sheets.
+
+Entries live in a bounded in-process LRU and, when a directory is
+configured, as JSON files in it as well. The directory tier survives
+restarts and is shared by every gunicorn worker on the host; files are
+written to a temporary name and renamed into place, so a reader never sees
+a partial entry. Files not read or written for `max_age` seconds are
+removed by a sweep that runs in the background at most every
+`sweep_seconds`, along with temporary files left by a crashed writer.
+
+Keys are grouped in namespaces ("parsed", "result") and hit/miss counters
+are kept per namespace. Cached values are shared - callers must copy before
+modifying them.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+class ResultCache:
+    def __init__(self, max_entries=512, directory=None, max_age=7 * 24 * 3600, sweep_seconds=3600):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_age = max_age
+        self.sweep_seconds = sweep_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._last_sweep = time.time()
+        self._swept = 0
+
+    def get(self, namespace, key):
+        """Return the cached value or None, checking memory first, then disk"""
+        entry_key = (namespace, key)
+        with self._lock:
+            if entry_key in self._entries:
+                self._entries.move_to_end(entry_key)
+                self._count(namespace, "memory_hits")
+                return self._entries[entry_key]
+
+        value = self._read_file(namespace, key)
+        with self._lock:
+            if value is None:
+                self._count(namespace, "misses")
+                return None
+            self._count(namespace, "disk_hits")
+            self._remember(entry_key, value)
+        return value
+
+    def put(self, namespace, key, value):
+        """Store a JSON-serialisable value in both tiers"""
+        with self._lock:
+            self._remember((namespace, key), value)
+        self._write_file(namespace, key, value)
+        self._maybe_sweep()
+
+    def sweep(self):
+        """Remove disk entries unused for max_age seconds and stale temporary
+        files; returns how many files were removed"""
+        if not self.directory or not self.max_age:
+            return 0
+        cutoff = time.time() - self.max_age
+        removed = 0
+        for folder, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith((".json", ".tmp")):
+                    continue
+                path = os.path.join(folder, name)
+                try:
+                    if os.stat(path).st_mtime < cutoff:
+                        os.unlink(path)
+                        removed += 1
+                except OSError:
+                    # Removed by another worker's sweep, or replaced meanwhile
+                    pass
+        with self._lock:
+            self._swept += removed
+        return removed
+
+    def _maybe_sweep(self):
+        if not self.directory or not self.max_age:
+            return
+        with self._lock:
+            if time.time() - self._last_sweep < self.sweep_seconds:
+                return
+            self._last_sweep = time.time()
+        threading.Thread(target=self.sweep, name="cache-sweep", daemon=True).start()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "disk_tier": self.directory is not None,
+                "disk_files_swept": self._swept,
+                "namespaces": {namespace: dict(counters) for namespace, counters in self._counters.items()}
+            }
+
+    def _count(self, namespace, counter):
+        counters = self._counters.setdefault(namespace, {"memory_hits": 0, "disk_hits": 0, "misses": 0})
+        counters[counter] += 1
+
+    def _remember(self, entry_key, value):
+        self._entries[entry_key] = value
+        self._entries.move_to_end(entry_key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _path(self, namespace, key):
+        # Fan out on the first two characters so no directory grows too large
+        return os.path.join(self.directory, namespace, key[:2], f"{key}.json")
+
+    def _read_file(self, namespace, key):
+        if not self.directory:
+            return None
+        path = self._path(namespace, key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            # A hit keeps the file from being swept
+            os.utime(path)
+            return value
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Cache read error for {namespace}/{key}: {e}")
+            return None
+
+    def _write_file(self, namespace, key, value):
+        if not self.directory:
+            return
+        path = self._path(namespace, key)
+        tmp_path = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(value, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Cache write error for {namespace}/{key}: {e}")
+            if tmp_path is not None:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
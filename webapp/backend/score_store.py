@@ -0,0 +1,200 @@
+"""
+Where scored results are kept.
+
+SupabaseScores is the scores table in Supabase (see SUPABASE_SETUP.md).
+SqliteScores is the same table in a local SQLite file, for running and
+testing the backend with no network: it has the same columns, keeps
+created_at on update, and answers the same reads. Both stamp updated_at
+when a row is written (a trigger in Supabase), so every writer's rows
+order on the store's clock.
+
+version() is a counter that bulk jobs writing around the servers
+(rescore.py) bump, so servers know to rebuild what they keep in memory.
+"""
+import json
+import sqlite3
+from contextlib import closing
+from datetime import datetime, timezone
+
+from rescore import iter_rows
+
+JSON_COLUMNS = ["section_details", "question_details"]
+COLUMNS = ["id", "student_id", "name", "total_score", "nat_score", "msq_score", "mcq_score",
+           "section_details", "question_details", "created_at", "updated_at"]
+
+def _column_list(columns):
+    names = COLUMNS if columns.strip() == "*" else [c.strip() for c in columns.split(",")]
+    unknown = [c for c in names if c not in COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown score columns: {', '.join(unknown)}")
+    return names
+
+class SupabaseScores:
+    name = "supabase"
+
+    def __init__(self, client):
+        self.client = client
+
+    def upsert(self, rows):
+        # One round trip per batch; the unique student_id makes it insert-or-update
+        self.client.table('scores').upsert(rows, on_conflict='student_id').execute()
+
+    def get(self, student_id, columns="*"):
+        result = self.client.table('scores').select(columns).eq('student_id', student_id).execute()
+        return result.data[0] if result.data else None
+
+    def iter_rows(self, page_size, columns, after=0):
+        return iter_rows(self.client, page_size, columns, after)
+
+    def iter_changed(self, since, page_size, columns):
+        """Rows updated after `since` (seconds since the epoch) in pages
+        ordered by updated_at, then id"""
+        last = (datetime.fromtimestamp(since, timezone.utc).isoformat(), None)
+        while True:
+            query = self.client.table('scores').select(columns)
+            if last[1] is None:
+                query = query.gt('updated_at', last[0])
+            else:
+                query = query.or_(f'updated_at.gt."{last[0]}",and(updated_at.eq."{last[0]}",id.gt.{last[1]})')
+            page = query.order('updated_at').order('id').limit(page_size).execute().data
+            if not page:
+                return
+            yield page
+            last = (page[-1]["updated_at"], page[-1]["id"])
+
+    def page(self, limit, after=None, columns="*"):
+        """Rows by total_score (highest first), then id; `after` is the
+        (total_score, id) of the last row of the previous page"""
+        query = self.client.table('scores').select(columns)
+        if after is not None:
+            score, row_id = after
+            query = query.or_(f"total_score.lt.{score},and(total_score.eq.{score},id.gt.{row_id})")
+        return query.order('total_score', desc=True).order('id').limit(limit).execute().data
+
+    def last_write(self):
+        """(number of rows, latest updated_at) in one query, so that a page of
+        the listing can be revalidated against what every writer stored"""
+        result = (self.client.table('scores').select('updated_at', count='exact')
+                  .order('updated_at', desc=True).limit(1).execute())
+        return result.count or 0, result.data[0]["updated_at"] if result.data else None
+
+    def version(self):
+        result = self.client.table('score_meta').select('value').eq('name', 'version').execute()
+        return result.data[0]["value"] if result.data else 0
+
+    def total_scores(self):
+        result = self.client.table('scores').select('total_score').order('total_score', desc=True).execute()
+        return [item['total_score'] for item in result.data or []]
+
+class SqliteScores:
+    name = "sqlite"
+
+    def __init__(self, path):
+        self.path = path
+        with closing(self._connect()) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""CREATE TABLE IF NOT EXISTS scores (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, student_id TEXT UNIQUE NOT NULL, name TEXT,
+                total_score REAL NOT NULL, nat_score REAL NOT NULL, msq_score REAL NOT NULL, mcq_score REAL NOT NULL,
+                section_details TEXT, question_details TEXT, created_at TEXT NOT NULL, updated_at TEXT)""")
+            db.execute("CREATE INDEX IF NOT EXISTS idx_scores_total_score_id ON scores (total_score DESC, id)")
+            db.execute("CREATE INDEX IF NOT EXISTS idx_scores_updated_at ON scores (updated_at DESC)")
+            db.execute("CREATE TABLE IF NOT EXISTS score_meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def _connect(self):
+        # One connection per call: connections cannot be shared across threads
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def _row(self, names, values):
+        row = dict(zip(names, values))
+        for column in JSON_COLUMNS:
+            if row.get(column) is not None:
+                row[column] = json.loads(row[column])
+        return row
+
+    def upsert(self, rows):
+        if not rows:
+            return
+        names = [c for c in rows[0] if c in COLUMNS and c not in ["id", "created_at", "updated_at"]]
+        updates = ", ".join(f"{c} = excluded.{c}" for c in names + ["updated_at"] if c != "student_id")
+        now = datetime.utcnow().isoformat()
+        values = [
+            [json.dumps(row[c]) if c in JSON_COLUMNS else row[c] for c in names] + [now, now]
+            for row in rows
+        ]
+        with closing(self._connect()) as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.executemany(
+                f"INSERT INTO scores ({', '.join(names)}, created_at, updated_at) "
+                f"VALUES ({', '.join('?' * (len(names) + 2))}) "
+                f"ON CONFLICT (student_id) DO UPDATE SET {updates}", values)
+            db.execute("COMMIT")
+
+    def get(self, student_id, columns="*"):
+        names = _column_list(columns)
+        with closing(self._connect()) as db:
+            values = db.execute(f"SELECT {', '.join(names)} FROM scores WHERE student_id = ?", (student_id,)).fetchone()
+        return self._row(names, values) if values else None
+
+    def iter_rows(self, page_size, columns, after=0):
+        """Stored rows in pages ordered by id (keyset paging - no OFFSET scans),
+        starting after the row with id `after`"""
+        names = _column_list(columns)
+        if "id" not in names:
+            names = ["id"] + names
+        last_id = after
+        while True:
+            with closing(self._connect()) as db:
+                page = db.execute(f"SELECT {', '.join(names)} FROM scores WHERE id > ? ORDER BY id LIMIT ?",
+                                  (last_id, page_size)).fetchall()
+            if not page:
+                return
+            yield [self._row(names, values) for values in page]
+            last_id = page[-1][names.index("id")]
+
+    def iter_changed(self, since, page_size, columns):
+        names = _column_list(columns)
+        for column in ["id", "updated_at"]:
+            if column not in names:
+                names = [column] + names
+        last = (datetime.utcfromtimestamp(since).isoformat(), None)
+        while True:
+            where, params = "updated_at > ?", [last[0]]
+            if last[1] is not None:
+                where, params = "updated_at > ? OR (updated_at = ? AND id > ?)", [last[0], last[0], last[1]]
+            with closing(self._connect()) as db:
+                page = db.execute(f"SELECT {', '.join(names)} FROM scores WHERE {where} "
+                                  f"ORDER BY updated_at, id LIMIT ?", params + [page_size]).fetchall()
+            if not page:
+                return
+            yield [self._row(names, values) for values in page]
+            last = (page[-1][names.index("updated_at")], page[-1][names.index("id")])
+
+    def page(self, limit, after=None, columns="*"):
+        names = _column_list(columns)
+        where, params = "", []
+        if after is not None:
+            where = "WHERE total_score < ? OR (total_score = ? AND id > ?)"
+            params = [after[0], after[0], after[1]]
+        with closing(self._connect()) as db:
+            page = db.execute(f"SELECT {', '.join(names)} FROM scores {where} "
+                              f"ORDER BY total_score DESC, id LIMIT ?", params + [limit]).fetchall()
+        return [self._row(names, values) for values in page]
+
+    def last_write(self):
+        with closing(self._connect()) as db:
+            return tuple(db.execute("SELECT COUNT(*), MAX(updated_at) FROM scores").fetchone())
+
+    def version(self):
+        with closing(self._connect()) as db:
+            found = db.execute("SELECT value FROM score_meta WHERE name = 'version'").fetchone()
+        return found[0] if found else 0
+
+    def bump_version(self):
+        with closing(self._connect()) as db:
+            db.execute("INSERT INTO score_meta (name, value) VALUES ('version', 1) "
+                       "ON CONFLICT (name) DO UPDATE SET value = value + 1")
+
+    def total_scores(self):
+        with closing(self._connect()) as db:
+            return [score for (score,) in db.execute("SELECT total_score FROM scores ORDER BY total_score DESC")]
@@ -0,0 +1,128 @@
+"""
+Turning an uploaded response sheet into a cacheable record: extract the
+pages, read the candidate's details, and parse and map their responses.
+
+Kept apart from app.py because bulk and job uploads run it in worker
+processes (see parse_member). Those are started fresh rather than forked
+(pdf_extraction.POOL_CONTEXT), so they import only this module, not the
+app with its clients and background threads.
+"""
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+
+root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(root_dir)
+from calculate_score import (
+    EXAM_PROFILE,
+    QUESTION_PATTERNS,
+    extract_student_info_from_pages,
+    map_questions,
+    mapped_responses,
+    parse_response_content,
+    read_needed_pages
+)
+from pdf_extraction import format_pages, open_pages
+
+logger = logging.getLogger(__name__)
+
+# Stop extracting pages once every question is located and its answer fields
+# are complete (set EARLY_EXIT_EXTRACTION=0 to always read every page)
+EARLY_EXIT_EXTRACTION = os.environ.get("EARLY_EXIT_EXTRACTION", "1") != "0"
+
+# Bump whenever parsing or the shape of a parsed record changes, so cached
+# parses made by the old code are not served (see sheet_cache_key)
+PARSE_VERSION = 2
+
+# The mapping tables feed every parsed record too: a changed pattern or a new
+# Question ID table gives new keys without a PARSE_VERSION bump
+PARSE_TABLES = hashlib.sha256(json.dumps(
+    [EXAM_PROFILE["name"], QUESTION_PATTERNS, EXAM_PROFILE["question_ids"]], sort_keys=True
+).encode("utf-8")).hexdigest()[:8]
+
+def sheet_cache_key(pdf_bytes, backend):
+    """Cache key of a sheet's parsed record: its bytes, the extraction
+    backend (backends read the same bytes differently) and the parser"""
+    return f"{hashlib.sha256(pdf_bytes).hexdigest()}-{backend}-p{PARSE_VERSION}.{PARSE_TABLES}"
+
+def elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 2)
+
+def extract_needed_pages(pdf_file, workers=None):
+    """Extract pages only until the sheet can be scored.
+
+    Returns (page_texts, pages_skipped).
+    """
+    page_count, pages = open_pages(pdf_file, workers=workers)
+    if not EARLY_EXIT_EXTRACTION:
+        return list(pages), 0
+    page_texts = read_needed_pages(pages)
+    # Stops any page ranges still queued in the extraction pool
+    pages.close()
+    return page_texts, page_count - len(page_texts)
+
+def parse_sheet(content, timings=None):
+    """Parse and map extracted response-sheet text.
+
+    Returns the compact per-question responses and the mapping stats; stage
+    durations in milliseconds are added to `timings` when given.
+    """
+    if timings is None:
+        timings = {}
+    
+    # Parse using existing logic
+    start = time.perf_counter()
+    sections = parse_response_content(content)
+    all_questions = []
+    for section in sections:
+        all_questions.extend(section)
+    timings["parse_ms"] = elapsed_ms(start)
+    
+    # Map questions - by Question ID where known, by text pattern otherwise
+    start = time.perf_counter()
+    mapping, mapping_stats = map_questions(all_questions)
+    timings["map_ms"] = elapsed_ms(start)
+    logger.debug("Question mapping: %d blocks by Question ID, %d by pattern fallback",
+                 mapping_stats["by_id"], mapping_stats["by_pattern"])
+    
+    return mapped_responses(mapping), mapping_stats
+
+def parse_upload(pdf_bytes, timings, workers=None):
+    """Extract, parse and map an uploaded PDF into a cacheable record"""
+    # Extract pages once, straight from the uploaded bytes, stopping as soon
+    # as every question has been found
+    start = time.perf_counter()
+    page_texts, pages_skipped = extract_needed_pages(pdf_bytes, workers)
+    timings["extract_ms"] = elapsed_ms(start)
+    if pages_skipped:
+        logger.debug("Early exit: skipped %d trailing page(s) after page %d", pages_skipped, len(page_texts))
+    
+    # Extract student info
+    start = time.perf_counter()
+    name, student_id = extract_student_info_from_pages(page_texts)
+    timings["student_info_ms"] = elapsed_ms(start)
+    
+    # Use default values if extraction fails - score can still be calculated
+    if not student_id:
+        student_id = "Unknown"
+    if not name or name == "Unknown":
+        name = "Anonymous"
+    
+    responses, mapping_stats = parse_sheet(format_pages(page_texts), timings)
+    return {
+        "name": name,
+        "student_id": student_id,
+        "pages": len(page_texts),
+        "pages_skipped": pages_skipped,
+        # JSON object keys are strings; callers convert back with int()
+        "responses": {str(q): r for q, r in responses.items()},
+        "mapping_stats": mapping_stats
+    }
+
+def parse_member(pdf_bytes):
+    """Bulk worker: parse one sheet from an archive, without a nested extraction pool"""
+    timings = {}
+    return parse_upload(pdf_bytes, timings, workers=1), timings
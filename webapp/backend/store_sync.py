@@ -0,0 +1,93 @@
+"""
+Keeping an in-memory view of the scores table (the score distribution, the
+question statistics) in step with the store.
+
+The view is built from the store in one streaming pass when the server
+starts. After that every worker only reads what changed: every
+`poll_seconds` it asks for the rows whose updated_at is past the latest one
+it has seen (one query on the updated_at index, usually returning nothing)
+and applies them. updated_at is stamped by the store when a row is written
+(a trigger in Supabase, see SUPABASE_SETUP.md), so it orders writes by
+every worker on one clock; each poll reaches back SYNC_OVERLAP_SECONDS to
+catch a write whose transaction committed after a later one, and applying
+a row twice changes nothing. The whole view is rebuilt only when the store
+version (score_store.version()) changes - bulk jobs that write around the
+servers, like rescore.py, bump it - and, if `refresh_seconds` is set, that
+often as well.
+"""
+import threading
+import time
+from datetime import datetime, timezone
+
+SYNC_OVERLAP_SECONDS = 5
+
+def store_timestamp(value):
+    """Seconds since the epoch of a stored ISO timestamp (naive = UTC)"""
+    if not value:
+        return 0
+    stamp = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if stamp.tzinfo is None:
+        stamp = stamp.replace(tzinfo=timezone.utc)
+    return stamp.timestamp()
+
+def keep_in_sync(name, view, load_pages, load_changes=None, version=None, poll_seconds=10,
+                 refresh_seconds=None, stop=None):
+    """Keep `view` in step with the store from a background thread, until the
+    `stop` event (if given) is set.
+
+    view.rebuild(pages, store version) builds it from load_pages() - pages of
+    every stored row - now and whenever version() changes or refresh_seconds
+    have passed; in between, view.record(rows) applies the pages
+    load_changes(since) returns, the rows updated after `since` (seconds
+    since the epoch). Both loads must include updated_at.
+    """
+    stop = stop or threading.Event()
+    errors = {}
+    def log_once(stage, e):
+        # Polled often, so a lasting failure is logged once
+        if errors.get(stage) != str(e):
+            print(f"{name} {stage} failed: {e}")
+        errors[stage] = str(e)
+
+    def tracked(pages, latest):
+        # Passes the pages on, noting the latest updated_at in them
+        for rows in pages:
+            for row in rows:
+                latest[0] = max(latest[0], store_timestamp(row.get("updated_at")))
+            yield rows
+
+    def run():
+        seen = None
+        rebuilt = None
+        checkpoint = None
+        while not stop.is_set():
+            current = seen
+            if version:
+                try:
+                    current = version()
+                    errors.pop("version check", None)
+                except Exception as e:
+                    # Without a readable version, reading changes still works
+                    log_once("version check", e)
+            if rebuilt is None or current != seen or (
+                    refresh_seconds and time.monotonic() - rebuilt >= refresh_seconds):
+                try:
+                    latest = [0]
+                    view.rebuild(tracked(load_pages(), latest), current)
+                    seen, rebuilt, checkpoint = current, time.monotonic(), latest[0]
+                    errors.pop("rebuild", None)
+                except Exception as e:
+                    log_once("rebuild", e)
+            elif load_changes and checkpoint is not None:
+                try:
+                    latest = [checkpoint]
+                    for rows in tracked(load_changes(checkpoint - SYNC_OVERLAP_SECONDS), latest):
+                        view.record(rows)
+                    checkpoint = latest[0]
+                    errors.pop("update", None)
+                except Exception as e:
+                    log_once("update", e)
+            stop.wait(poll_seconds if version or load_changes else refresh_seconds)
+    thread = threading.Thread(target=run, name=name.lower().replace(" ", "-"), daemon=True)
+    thread.start()
+    return thread
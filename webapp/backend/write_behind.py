@@ -0,0 +1,386 @@
+"""
+Write-behind queue for score rows.
+
+Requests hand their row to put() and return without waiting on the
+database. Rows are keyed (by student_id): a newer row for the same key
+replaces one still waiting, so a student who uploads three times in a
+second costs one write. A background thread flushes pending rows in
+batches - when `batch_size` rows are waiting, or every `flush_seconds` -
+through the flush function, which writes a whole batch at once (one upsert).
+
+Pending rows live in a spool. MemorySpool keeps them in this process only,
+so they are lost if it dies. SqliteSpool records every row in a local
+SQLite file before put() returns: rows survive a crash or a restart and are
+replayed by the next process, and every gunicorn worker on the host shares
+one spool. A row is removed from the spool only once it has been written,
+and only if no newer row for its key arrived meanwhile; a key is taken by
+one writer at a time, so an older row is never written after a newer one.
+
+When a batch fails, its first and last rows are tried on their own. If both
+fail the way the batch did, the database is taken to be down: the batch is
+released, its first row moves to the back of the spool, and the writer
+backs off. Until the backoff runs out put() does not wake it, so an outage
+costs a batch and two probes per round however fast rows arrive. Otherwise
+the rest of the batch is retried one row at a time, so a row the database
+rejects does not hold back the others; a row that fails on
+its own `max_attempts` times is moved to a dead-letter list (the `dead`
+table of a SqliteSpool) and counted in stats(). When `max_pending` rows are
+waiting, put() waits up to `put_timeout` seconds for the writer to catch up,
+then drops the row with a log line rather than letting the spool grow or
+blocking the request. flush() drains the spool and is called at interpreter
+exit; stop() ends the writer thread.
+
+A SqliteSpool also counts the rows written through it (write_mark()), so
+every worker on the host can tell whether anything was written since it
+last looked without asking the database.
+"""
+import atexit
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import closing
+
+DEAD_LETTERS_KEPT = 1000
+
+class MemorySpool:
+    def __init__(self):
+        self._rows = OrderedDict()
+        self._dead = deque(maxlen=DEAD_LETTERS_KEPT)
+        self._lock = threading.Lock()
+
+    def put(self, key, row):
+        """Add or replace the row of a key; True when it replaced one"""
+        with self._lock:
+            replaced = key in self._rows
+            seq = self._rows[key][0] + 1 if replaced else 0
+            self._rows[key] = (seq, row, 0)
+            return replaced
+
+    def take(self, limit, lease_seconds):
+        # A process flushes one batch at a time, so nothing is leased here
+        with self._lock:
+            return [(key, seq, row) for key, (seq, row, _) in list(self._rows.items())[:limit]]
+
+    def done(self, entries):
+        with self._lock:
+            for key, seq, _ in entries:
+                if key in self._rows and self._rows[key][0] == seq:
+                    del self._rows[key]
+
+    def release(self, entries):
+        pass
+
+    def defer(self, entries):
+        """Release entries and move them behind every other pending row"""
+        with self._lock:
+            for key, seq, _ in entries:
+                if key in self._rows and self._rows[key][0] == seq:
+                    self._rows.move_to_end(key)
+
+    def fail(self, entries):
+        """Count a failed attempt for each entry; returns the attempts so far
+        (0 for an entry a newer row of its key has replaced)"""
+        attempts = []
+        with self._lock:
+            for key, seq, row in entries:
+                if key in self._rows and self._rows[key][0] == seq:
+                    self._rows[key] = (seq, row, self._rows[key][2] + 1)
+                    attempts.append(self._rows[key][2])
+                else:
+                    attempts.append(0)
+        return attempts
+
+    def bury(self, entries, error):
+        """Move entries to the dead letters, unless a newer row replaced them"""
+        with self._lock:
+            for key, seq, row in entries:
+                if key in self._rows and self._rows[key][0] == seq:
+                    del self._rows[key]
+                    self._dead.append((key, row, error, time.time()))
+
+    def count(self):
+        with self._lock:
+            return len(self._rows)
+
+    def write_mark(self):
+        # Other processes write behind spools of their own: only the
+        # database knows what they wrote
+        return None
+
+    def dead_count(self):
+        with self._lock:
+            return len(self._dead)
+
+class SqliteSpool:
+    def __init__(self, path):
+        self.path = path
+        with closing(self._connect()) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""CREATE TABLE IF NOT EXISTS spool (
+                key TEXT PRIMARY KEY, seq INTEGER NOT NULL, row TEXT NOT NULL,
+                queued REAL NOT NULL, leased REAL, attempts INTEGER NOT NULL DEFAULT 0)""")
+            db.execute("CREATE INDEX IF NOT EXISTS spool_queued ON spool (queued)")
+            db.execute("""CREATE TABLE IF NOT EXISTS dead (
+                key TEXT NOT NULL, seq INTEGER NOT NULL, row TEXT NOT NULL, error TEXT, failed REAL NOT NULL)""")
+            # One row: rows written through this spool, and when last
+            db.execute("""CREATE TABLE IF NOT EXISTS writes (
+                id INTEGER PRIMARY KEY CHECK (id = 0), created REAL NOT NULL,
+                seq INTEGER NOT NULL, written REAL)""")
+            db.execute("INSERT OR IGNORE INTO writes (id, created, seq) VALUES (0, ?, 0)", (time.time(),))
+
+    def _connect(self):
+        # One connection per call: connections cannot be shared across threads
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def put(self, key, row):
+        with closing(self._connect()) as db:
+            db.execute("BEGIN IMMEDIATE")
+            replaced = db.execute("UPDATE spool SET seq = seq + 1, row = ?, attempts = 0 WHERE key = ?",
+                                  (json.dumps(row), key)).rowcount > 0
+            if not replaced:
+                db.execute("INSERT INTO spool (key, seq, row, queued) VALUES (?, 0, ?, ?)",
+                           (key, json.dumps(row), time.time()))
+            db.execute("COMMIT")
+        return replaced
+
+    def take(self, limit, lease_seconds):
+        now = time.time()
+        with closing(self._connect()) as db:
+            # Leased under a write lock, so two writers never take the same key;
+            # a lease left by a writer that died runs out after lease_seconds
+            db.execute("BEGIN IMMEDIATE")
+            entries = db.execute(
+                "SELECT key, seq, row FROM spool WHERE leased IS NULL OR leased < ? ORDER BY queued LIMIT ?",
+                (now - lease_seconds, limit)).fetchall()
+            db.executemany("UPDATE spool SET leased = ? WHERE key = ?", [(now, key) for key, _, _ in entries])
+            db.execute("COMMIT")
+        return [(key, seq, json.loads(row)) for key, seq, row in entries]
+
+    def done(self, entries):
+        with closing(self._connect()) as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.executemany("DELETE FROM spool WHERE key = ? AND seq = ?", [(key, seq) for key, seq, _ in entries])
+            db.executemany("UPDATE spool SET leased = NULL WHERE key = ?", [(key,) for key, _, _ in entries])
+            db.execute("UPDATE writes SET seq = seq + ?, written = ?", (len(entries), time.time()))
+            db.execute("COMMIT")
+
+    def release(self, entries):
+        with closing(self._connect()) as db:
+            db.executemany("UPDATE spool SET leased = NULL WHERE key = ?", [(key,) for key, _, _ in entries])
+
+    def defer(self, entries):
+        with closing(self._connect()) as db:
+            db.executemany("UPDATE spool SET leased = NULL, queued = ? WHERE key = ?",
+                           [(time.time(), key) for key, _, _ in entries])
+
+    def fail(self, entries):
+        attempts = []
+        with closing(self._connect()) as db:
+            db.execute("BEGIN IMMEDIATE")
+            for key, seq, _ in entries:
+                db.execute("UPDATE spool SET attempts = attempts + 1 WHERE key = ? AND seq = ?", (key, seq))
+                found = db.execute("SELECT attempts FROM spool WHERE key = ? AND seq = ?", (key, seq)).fetchone()
+                attempts.append(found[0] if found else 0)
+            db.executemany("UPDATE spool SET leased = NULL WHERE key = ?", [(key,) for key, _, _ in entries])
+            db.execute("COMMIT")
+        return attempts
+
+    def bury(self, entries, error):
+        now = time.time()
+        with closing(self._connect()) as db:
+            db.execute("BEGIN IMMEDIATE")
+            for key, seq, _ in entries:
+                db.execute("INSERT INTO dead (key, seq, row, error, failed) "
+                           "SELECT key, seq, row, ?, ? FROM spool WHERE key = ? AND seq = ?", (error, now, key, seq))
+                db.execute("DELETE FROM spool WHERE key = ? AND seq = ?", (key, seq))
+            db.executemany("UPDATE spool SET leased = NULL WHERE key = ?", [(key,) for key, _, _ in entries])
+            db.execute("COMMIT")
+
+    def count(self):
+        with closing(self._connect()) as db:
+            return db.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+    def dead_count(self):
+        with closing(self._connect()) as db:
+            return db.execute("SELECT COUNT(*) FROM dead").fetchone()[0]
+
+    def write_mark(self):
+        """(spool created, rows written through it, time of the last write);
+        changes with every write by any process sharing the file"""
+        with closing(self._connect()) as db:
+            return db.execute("SELECT created, seq, written FROM writes").fetchone()
+
+class WriteBehindQueue:
+    def __init__(self, flush_fn, spool=None, key="student_id", batch_size=200, flush_seconds=1.0,
+                 max_pending=10000, max_backoff=30.0, lease_seconds=120, max_attempts=5, put_timeout=2.0):
+        self.flush_fn = flush_fn
+        self.spool = spool or MemorySpool()
+        self.key = key
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self.max_backoff = max_backoff
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.put_timeout = put_timeout
+        self._wakeup = threading.Condition()
+        # One flush at a time, so an older row of a key is never written last
+        self._flushing = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        # While the database is down the writer is not woken before this
+        # (time.monotonic()), whatever put() sees
+        self._retry_at = 0.0
+        self._counters = {"queued": 0, "coalesced": 0, "written": 0, "batches": 0, "failures": 0,
+                          "dropped": 0, "dead_lettered": 0}
+        self._counters_lock = threading.Lock()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="score-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def stop(self, timeout=None):
+        """End the writer thread (pending rows stay in the spool)"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        self._thread.join(timeout)
+        self._thread = None
+        self._stop.clear()
+
+    def put(self, row):
+        """Queue a row; False when the spool stayed full for put_timeout
+        seconds and the row was dropped"""
+        pending = self.spool.count()
+        deadline = time.monotonic() + self.put_timeout
+        while pending >= self.max_pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                print(f"Write-behind spool full ({pending} rows pending); row {row[self.key]} not saved")
+                self._count(dropped=1)
+                return False
+            with self._wakeup:
+                self._notify()
+                self._wakeup.wait(min(1.0, remaining))
+            pending = self.spool.count()
+        replaced = self.spool.put(row[self.key], row)
+        self._count(queued=1, coalesced=int(replaced))
+        if pending + 1 >= self.batch_size:
+            with self._wakeup:
+                self._notify()
+        return True
+
+    def flush(self):
+        """Write everything pending now, in batches. Returns False if a batch
+        failed because the database is down."""
+        with self._flushing:
+            while True:
+                entries = self.spool.take(self.batch_size, self.lease_seconds)
+                if not entries:
+                    return True
+                try:
+                    self.flush_fn([row for _, _, row in entries])
+                except Exception as e:
+                    print(f"Write-behind flush of {len(entries)} rows failed: {e}")
+                    self._count(failures=1)
+                    # The rest is left for the next round, so a bad row is
+                    # retried with later batches until it is dead-lettered
+                    return self._write_each(entries, e)
+                self.spool.done(entries)
+                self._count(written=len(entries), batches=1)
+                with self._wakeup:
+                    self._wakeup.notify_all()
+
+    def _write_each(self, entries, batch_error):
+        """Retry a failed batch one row at a time; False when the database is down.
+
+        The first row goes alone, then (if it failed the way the batch did)
+        the last: both failing like the batch means an outage, told apart
+        from a bad row without sending every row of the batch again.
+        """
+        failed = []
+        tried = set()
+        probes = [entries[0], entries[-1]] if len(entries) > 1 else [entries[0]]
+        for entry in probes:
+            tried.add(entry[0])
+            try:
+                if len(entries) == 1:
+                    # The batch was this row alone
+                    raise batch_error
+                self.flush_fn([entry[2]])
+            except Exception as e:
+                failed.append((entry, e))
+                if type(e) is type(batch_error) and str(e) == str(batch_error):
+                    continue
+            else:
+                self.spool.done([entry])
+                self._count(written=1, batches=1)
+            break
+        else:
+            # Every probe failed like the batch: the database is down, not
+            # these rows. The first moves back, so the next round probes another.
+            self.spool.defer(entries[:1])
+            self.spool.release(entries[1:])
+            return False
+        for entry in entries:
+            if entry[0] in tried:
+                continue
+            try:
+                self.flush_fn([entry[2]])
+            except Exception as e:
+                failed.append((entry, e))
+            else:
+                self.spool.done([entry])
+                self._count(written=1, batches=1)
+        if failed:
+            attempts = self.spool.fail([entry for entry, _ in failed])
+            for (entry, error), tries in zip(failed, attempts):
+                if tries >= self.max_attempts:
+                    print(f"Write-behind gave up on row {entry[0]} after {tries} attempts: {error}")
+                    self.spool.bury([entry], str(error))
+                    self._count(dead_lettered=1)
+        with self._wakeup:
+            self._wakeup.notify_all()
+        return True
+
+    def stats(self):
+        with self._counters_lock:
+            counters = dict(self._counters)
+        return dict(counters, pending=self.spool.count(), dead_letters=self.spool.dead_count())
+
+    def _count(self, **deltas):
+        with self._counters_lock:
+            for name, delta in deltas.items():
+                self._counters[name] += delta
+
+    def _notify(self):
+        """Wake the writer, unless it is backing off; call holding _wakeup"""
+        if time.monotonic() >= self._retry_at:
+            self._wakeup.notify_all()
+
+    def _run(self):
+        backoff = 0
+        while not self._stop.is_set():
+            with self._wakeup:
+                if backoff:
+                    # Sleep out the whole backoff, however often put() is called
+                    while not self._stop.is_set() and time.monotonic() < self._retry_at:
+                        self._wakeup.wait(self._retry_at - time.monotonic())
+                elif self.spool.count() < self.batch_size:
+                    # A full batch goes out at once
+                    self._wakeup.wait(self.flush_seconds)
+            if self._stop.is_set():
+                return
+            if self.flush():
+                backoff = 0
+                self._retry_at = 0.0
+            else:
+                backoff = min(self.max_backoff, max(1.0, backoff * 2))
+                self._retry_at = time.monotonic() + backoff
@@ -4,6 +4,9 @@ import axios from 'axios';
 
 const ScoreChart = ({ userScore }) => {
   const [allScores, setAllScores] = useState([]);
+  const [ranks, setRanks] = useState([]);
+  const [totalScores, setTotalScores] = useState(0);
+  const [rank, setRank] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
 
@@ -11,10 +14,20 @@ const ScoreChart = ({ userScore }) => {
     const fetchScores = async () => {
       try {
         const apiUrl = import.meta.env.VITE_API_URL || 'http://localhost:5000';
-        const response = await axios.get(`${apiUrl}/api/scores`);
+        // At most `points` scores sampled evenly over the ranking, with their
+        // ranks, and the exact rank of the user's score
+        const [response, rankResponse] = await Promise.all([
+          axios.get(`${apiUrl}/api/scores`, { params: { points: 300 } }),
+          axios.get(`${apiUrl}/api/rank`, { params: { score: userScore } }).catch(() => null)
+        ]);
+        if (rankResponse && rankResponse.data.rank) {
+          setRank(rankResponse.data);
+        }
         
         if (response.data.scores && response.data.scores.length > 0) {
           setAllScores(response.data.scores);
+          setRanks(response.data.ranks || response.data.scores.map((_, i) => i + 1));
+          setTotalScores(response.data.count || response.data.scores.length);
         } else {
           // No scores available yet
           setAllScores([]);
@@ -29,7 +42,7 @@ const ScoreChart = ({ userScore }) => {
     };
 
     fetchScores();
-  }, []);
+  }, [userScore]);
 
   if (loading) {
     return (
@@ -65,14 +78,15 @@ const ScoreChart = ({ userScore }) => {
 
   // Prepare data for chart
   const chartData = allScores.map((score, index) => ({
-    index: index + 1,
+    index: ranks[index],
     score: score,
     isUser: Math.abs(score - userScore) < 0.01 // Check if this is user's score
   }));
 
-  // Find user's position
-  const userPosition = allScores.findIndex(score => Math.abs(score - userScore) < 0.01) + 1;
-  const totalScores = allScores.length;
+  // Find user's position: from the rank index, or else the rank of the first
+  // sampled score not above theirs
+  const userIndex = allScores.findIndex(score => score <= userScore + 0.001);
+  const userPosition = rank ? rank.rank : (userIndex >= 0 ? ranks[userIndex] : 0);
   const percentile = userPosition ? Math.round((userPosition / totalScores) * 100) : null;
 
   // Custom dot renderer to highlight user's score
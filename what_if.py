@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+"""
+What-if scores for disputed questions during the objection window.
+
+A dispute names a question and the answers it might end up with instead of
+the official one: another key (Q42 B -> C), a wider NAT range, or "bonus"
+(the question is dropped and everyone gets full marks). Every combination
+of outcomes is a scenario - 2^k of them for k disputes with one alternative
+each, the official key being the one where no challenge is accepted.
+
+Responses are encoded once with batch_scoring, and each disputed question
+gets an N x outcomes matrix of scores. A scenario's totals are then the
+official totals plus, for every disputed question, the difference between
+its chosen and official column. Scenarios are visited in odometer order
+and each is built from the previous one, so it usually costs one column
+update per candidate.
+
+Usage: python what_if.py [sheet.pdf | response_text.txt] 42=B|C 3=23.5:25.5 17=bonus
+Dispute syntax: NAT "value" or "low:high", MSQ "A,B", MCQ "C", alternatives
+separated by "|", "bonus" for full marks to everyone.
+"""
+import itertools
+import sys
+
+import numpy as np
+
+from batch_scoring import encode_responses, question_layout, score_encoded
+from calculate_score import (
+    MCQ_MARKS,
+    MSQ_MARKS,
+    OFFICIAL_ANSWERS,
+    answer_display,
+    map_questions,
+    mapped_responses,
+    nat_bounds,
+    option_mask,
+    parse_response_content
+)
+
+BONUS = "bonus"
+FULL_MARKS = {"NAT": 4, "MSQ": 4, "MCQ": 3}
+MAX_SCENARIOS = 4096
+
+def parse_dispute(spec, answers=OFFICIAL_ANSWERS):
+    """Parse "42=B|C" into (42, [alternative answer-key entries])"""
+    q_text, _, alt_text = spec.partition("=")
+    q_num = int(q_text.strip().lstrip("Qq"))
+    if q_num not in answers:
+        raise ValueError(f"Q{q_num} is not in the answer key")
+    q_type = answers[q_num]["type"]
+
+    alternatives = []
+    for alt in alt_text.split("|"):
+        alt = alt.strip()
+        if alt.lower() == BONUS:
+            alternatives.append({"type": q_type, BONUS: True})
+        elif q_type == "NAT" and ":" in alt:
+            low, high = alt.split(":")
+            alternatives.append({"type": "NAT", "range": [float(low), float(high)]})
+        elif q_type == "NAT":
+            alternatives.append({"type": "NAT", "value": float(alt)})
+        elif q_type == "MSQ":
+            alternatives.append({"type": "MSQ", "keys": sorted(k.strip().upper() for k in alt.split(","))})
+        else:
+            alternatives.append({"type": "MCQ", "key": alt.upper()})
+    check_dispute(q_num, alternatives, answers)
+    return q_num, alternatives
+
+def check_dispute(q_num, alternatives, answers=OFFICIAL_ANSWERS):
+    """Raise ValueError unless every alternative is a valid answer for the question"""
+    official = answers[q_num]
+    for alt in alternatives:
+        if alt["type"] != official["type"]:
+            raise ValueError(f"Q{q_num} is {official['type']}; an alternative cannot be {alt['type']}")
+        if alt.get(BONUS):
+            continue
+        if alt["type"] == "NAT":
+            nat_bounds(alt)
+        elif alt["type"] == "MSQ":
+            if not alt["keys"] or any(k not in "ABCD" or len(k) != 1 for k in alt["keys"]):
+                raise ValueError(f"Q{q_num}: MSQ alternative must be options A-D, got {alt['keys']}")
+        elif alt["key"] not in ["A", "B", "C", "D"]:
+            raise ValueError(f"Q{q_num}: MCQ alternative must be one of A-D, got {alt['key']!r}")
+
+def merge_disputes(disputes):
+    """One dispute per question: the alternatives of disputes naming the same
+    question are combined, each kept once"""
+    merged = {}
+    for q_num, alternatives in disputes:
+        known = merged.setdefault(q_num, [])
+        known.extend(alt for alt in alternatives if alt not in known)
+    return list(merged.items())
+
+def outcome_label(rule):
+    return BONUS if rule.get(BONUS) else answer_display(rule)
+
+def disputed_score_vectors(encoded, disputes, answers=OFFICIAL_ANSWERS):
+    """For each dispute, an N x outcomes array of scores; column 0 is the official answer"""
+    _, nat_q, choice_q = question_layout(answers)
+    n = encoded["nat"].shape[0]
+    vectors = []
+    for q_num, alternatives in disputes:
+        official = answers[q_num]
+        rules = [official] + alternatives
+        if official["type"] == "NAT":
+            values = encoded["nat"][:, nat_q.index(q_num)]
+            columns = []
+            for rule in rules:
+                if rule.get(BONUS):
+                    columns.append(np.full(n, FULL_MARKS["NAT"], dtype=np.float64))
+                    continue
+                low, high = nat_bounds(rule)
+                with np.errstate(invalid="ignore"):
+                    columns.append(np.where((values >= low) & (values <= high), 4.0, 0.0))
+            vectors.append(np.stack(columns, axis=1))
+        else:
+            marks = MSQ_MARKS if official["type"] == "MSQ" else MCQ_MARKS
+            tables = np.array([
+                [FULL_MARKS[official["type"]]] * 16 if rule.get(BONUS)
+                else marks[option_mask(rule["keys"] if official["type"] == "MSQ" else rule["key"])]
+                for rule in rules
+            ], dtype=np.float64)
+            masks = encoded["masks"][:, choice_q.index(q_num)]
+            vectors.append(tables[:, masks].T)
+    return vectors
+
+def iter_scenarios(official_totals, vectors):
+    """Yield (outcome index per dispute, totals) for every scenario, official first"""
+    if np.prod([v.shape[1] for v in vectors], dtype=np.int64) > MAX_SCENARIOS:
+        raise ValueError(f"more than {MAX_SCENARIOS} scenarios; dispute fewer questions")
+    previous = (0,) * len(vectors)
+    totals = official_totals
+    for choice in itertools.product(*[range(v.shape[1]) for v in vectors]):
+        # Odometer order: usually only the last dispute changed
+        for i, (old, new) in enumerate(zip(previous, choice)):
+            if old != new:
+                totals = totals + (vectors[i][:, new] - vectors[i][:, old])
+        previous = choice
+        yield choice, totals
+
+def _choices(disputes, answers, choice):
+    rules = {q_num: [answers[q_num]] + alternatives for q_num, alternatives in disputes}
+    return {f"Q{q_num}": outcome_label(rules[q_num][c]) for (q_num, _), c in zip(disputes, choice)}
+
+def candidate_scenarios(responses, disputes, answers=OFFICIAL_ANSWERS):
+    """Every scenario's total for one candidate's mapped responses.
+
+    Returns [{"choices": {"Q42": "C", ...}, "total_score", "delta"}, ...],
+    the official key first.
+    """
+    disputes = merge_disputes(disputes)
+    encoded = encode_responses([responses], answers)
+    official = score_encoded(encoded, answers)["total_score"]
+    vectors = disputed_score_vectors(encoded, disputes, answers)
+    return [
+        {
+            "choices": _choices(disputes, answers, choice),
+            "total_score": float(totals[0]),
+            "delta": float(totals[0] - official[0])
+        }
+        for choice, totals in iter_scenarios(official, vectors)
+    ]
+
+def population_scenarios(encoded, disputes, answers=OFFICIAL_ANSWERS, quantiles=(0.5, 0.9, 0.99)):
+    """How each scenario shifts the score distribution of many encoded candidates.
+
+    Returns [{"choices", "mean", "max", "quantiles": {"p50", ...},
+    "mean_delta", "changed"}, ...], the official key first; "changed" counts
+    the candidates whose total differs from the official one.
+    """
+    disputes = merge_disputes(disputes)
+    official = score_encoded(encoded, answers)["total_score"]
+    vectors = disputed_score_vectors(encoded, disputes, answers)
+    summaries = []
+    for choice, totals in iter_scenarios(official, vectors):
+        summary = {"choices": _choices(disputes, answers, choice), "candidates": int(totals.size)}
+        if totals.size:
+            delta = totals - official
+            summary.update({
+                "mean": float(totals.mean()),
+                "max": float(totals.max()),
+                "quantiles": {f"p{round(q * 100)}": float(v) for q, v in zip(quantiles, np.quantile(totals, quantiles))},
+                "mean_delta": float(delta.mean()),
+                "changed": int(np.count_nonzero(delta))
+            })
+        summaries.append(summary)
+    return summaries
+
+def main():
+    args = sys.argv[1:]
+    sheet = "response_text.txt"
+    if args and "=" not in args[0]:
+        sheet = args.pop(0)
+    if not args:
+        print(__doc__)
+        return
+    disputes = merge_disputes([parse_dispute(spec) for spec in args])
+
+    if sheet.lower().endswith(".pdf"):
+        from pdf_extraction import extract_pages, format_pages
+        content = format_pages(extract_pages(sheet))
+    else:
+        with open(sheet, "r", encoding="utf-8") as f:
+            content = f.read()
+    questions = [q for section in parse_response_content(content) for q in section]
+    mapping, _ = map_questions(questions)
+    scenarios = candidate_scenarios(mapped_responses(mapping), disputes)
+
+    print("="*80)
+    print(f"WHAT-IF SCORES: {sheet} ({len(scenarios)} scenarios)")
+    print("="*80)
+    labels = [f"Q{q_num}" for q_num, _ in disputes]
+    print("  ".join(f"{label:<12}" for label in labels) + f"{'Total':>8} {'Delta':>7}")
+    print("-"*80)
+    for scenario in scenarios:
+        print("  ".join(f"{scenario['choices'][label]:<12}" for label in labels)
+              + f"{scenario['total_score']:>8.1f} {scenario['delta']:>+7.1f}")
+    print("="*80)
+
+if __name__ == "__main__":
+    main()